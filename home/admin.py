@@ -1,13 +1,21 @@
 from django.contrib import admin
-from .models import Unidade, CentroCusto, Solicitante, OrdemCompra, NotaFiscal
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+from .models import Unidade, CentroCusto, Solicitante, OrdemCompra, NotaFiscal, TarefaPdf, HistoricoStatus, ArquivoBlob, ConsumoOrcamento
+from . import transicoes
+from .tarefas import enfileirar_lote
 
 @admin.register(OrdemCompra)
 class OrdemCompraAdmin(admin.ModelAdmin):
     list_display = ('id', 'numero_os', 'unidade', 'fornecedor', 'valor_estimado', 'status', 'prioridade')
     list_filter = ('status', 'prioridade', 'classificacao', 'unidade')
     search_fields = ('numero_os', 'fornecedor', 'descricao_servico')
-    readonly_fields = ('data_criacao', 'data_atualizacao', 'data_aprovacao', 'aprovado_por')
-    
+    # O status só muda pelas ações abaixo (máquina de estados em transicoes.py)
+    readonly_fields = ('status', 'motivo_reprovacao', 'data_criacao', 'data_atualizacao', 'data_aprovacao', 'aprovado_por')
+    actions = ('acao_solicitar', 'acao_aprovar')
+
     fieldsets = (
         ('Identificação', {
             'fields': ('numero_os', 'data_os', 'solicitante', 'setor_execucao', 'unidade', 'centro_custo')
@@ -26,6 +34,24 @@ class OrdemCompraAdmin(admin.ModelAdmin):
         }),
     )
 
+    def _transicionar(self, request, queryset, para, **campos):
+        ids = list(queryset.values_list('pk', flat=True))
+        movidos = transicoes.transicionar_em_lote(ids, para, request.user, **campos)
+        self.message_user(request, f"{len(movidos)} ordem(ns) movida(s) para {para}; "
+                                   f"{len(ids) - len(movidos)} ignorada(s) por estarem em outro status.")
+        return movidos
+
+    @admin.action(description="Enviar para aprovação (RASCUNHO -> SOLICITADO)")
+    def acao_solicitar(self, request, queryset):
+        self._transicionar(request, queryset, 'SOLICITADO')
+
+    @admin.action(description="Aprovar (SOLICITADO -> APROVADO)")
+    def acao_aprovar(self, request, queryset):
+        with transaction.atomic():
+            movidos = self._transicionar(request, queryset, 'APROVADO', aprovado_por=request.user,
+                                         data_aprovacao=timezone.now(), motivo_reprovacao=None)
+            enfileirar_lote(movidos, uuid.uuid4())
+
 @admin.register(Solicitante)
 class SolicitanteAdmin(admin.ModelAdmin):
     list_display = ('nome', 'email', 'telefone', 'cargo')
@@ -45,5 +71,48 @@ class NotaFiscalAdmin(admin.ModelAdmin):
         return obj.ordem_compra.valor_estimado
     valor_total.short_description = 'Valor (OC)'
 
-# Registros simples
-admin.site.register(CentroCusto)
\ No newline at end of file
+@admin.register(TarefaPdf)
+class TarefaPdfAdmin(admin.ModelAdmin):
+    list_display = ('id', 'ordem_compra', 'status', 'tentativas', 'tempo_render_ms', 'tamanho_bytes', 'criado_em', 'concluido_em')
+    list_filter = ('status',)
+    readonly_fields = ('erro', 'nome_arquivo', 'tamanho_bytes', 'tempo_render_ms', 'criado_em', 'iniciado_em', 'concluido_em')
+
+@admin.register(HistoricoStatus)
+class HistoricoStatusAdmin(admin.ModelAdmin):
+    list_display = ('momento', 'ordem_compra', 'de', 'para', 'usuario')
+    list_filter = ('para',)
+    date_hierarchy = 'momento'
+    list_select_related = ('ordem_compra', 'usuario')
+
+    # Somente inclusão: os eventos são gravados pelas transições, nunca editados
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArquivoBlob)
+class ArquivoBlobAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'tamanho', 'referencias', 'criado_em')
+    search_fields = ('sha256',)
+    readonly_fields = ('nome', 'sha256', 'tamanho', 'referencias', 'criado_em')
+
+@admin.register(CentroCusto)
+class CentroCustoAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'descricao', 'orcamento_mensal', 'orcamento_anual', 'bloquear_acima_orcamento')
+    search_fields = ('codigo', 'descricao')
+
+@admin.register(ConsumoOrcamento)
+class ConsumoOrcamentoAdmin(admin.ModelAdmin):
+    # Totais mantidos pelas transições; corrija com `manage.py reconstruir_orcamento`
+    list_display = ('centro_custo', 'tipo', 'inicio', 'comprometido', 'consumido')
+    list_filter = ('tipo', 'centro_custo')
+    readonly_fields = ('centro_custo', 'tipo', 'inicio', 'comprometido', 'consumido')
+
+    def has_add_permission(self, request):
+        return False
+
+# Registros simples
\ No newline at end of file
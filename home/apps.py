@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class HomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'home'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+        if getattr(settings, 'METRICAS_ATIVAS', False):
+            from django.db.backends.signals import connection_created
+
+            from .metricas import instalar_medidor, instrumentar_templates
+            connection_created.connect(instalar_medidor, dispatch_uid='metricas_medidor')
+            instrumentar_templates()
+        if settings.INICIALIZACAO_RAPIDA:
+            from django.core.signals import request_finished
+
+            from .inicializacao import agendar_aquecimento
+            request_finished.connect(agendar_aquecimento, dispatch_uid='inicializacao_aquecer_pdf')
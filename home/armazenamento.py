@@ -0,0 +1,148 @@
+"""
+Armazenamento deduplicado (endereçado por conteúdo) para orçamentos e NFs.
+
+O upload é lido em pedaços, calculando o SHA-256 enquanto é copiado para um
+arquivo temporário; o nome final é `blobs/ab/cd/<sha256><ext>`. Se o blob já
+existe (o fornecedor mandou o mesmo PDF para várias OCs), nada é regravado:
+só a contagem de referências em ArquivoBlob sobe. Apagar um arquivo tira uma
+referência; o blob físico some depois do commit que tirou a última.
+
+Conferir se o blob existe, gravá-lo e somar a referência acontecem com a linha
+de ArquivoBlob travada (ArquivoBlob.travar), e o arquivo físico só é apagado
+sob a mesma trava, revendo a contagem: um upload e um delete simultâneos do
+mesmo conteúdo nunca deixam uma referência para um blob apagado. Um rollback
+depois do upload deixa o blob sem linha; varrer_blobs_orfaos() (chamado pelo
+comando deduplicar_arquivos) apaga esses arquivos.
+
+Backends (settings.STORAGES['default']['BACKEND']):
+  home.armazenamento.ArmazenamentoLocalDeduplicado    disco local (MEDIA_ROOT)
+  home.armazenamento_s3.ArmazenamentoS3Deduplicado    S3 ou compatível (MinIO)
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+PREFIXO_BLOBS = 'blobs'
+TAMANHO_PEDACO = 64 * 1024
+# Até este tamanho o upload fica em memória; acima, vai para o disco temporário
+LIMITE_MEMORIA = 1024 * 1024
+
+
+def calcular_hash(conteudo):
+    """
+    Lê `conteudo` em pedaços. Devolve (sha256, tamanho, cópia), onde a cópia é
+    um arquivo temporário posicionado no início com os mesmos bytes.
+    """
+    sha = hashlib.sha256()
+    copia = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA)
+    tamanho = 0
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    pedacos = conteudo.chunks(TAMANHO_PEDACO) if hasattr(conteudo, 'chunks') else iter(lambda: conteudo.read(TAMANHO_PEDACO), b'')
+    for pedaco in pedacos:
+        if isinstance(pedaco, str):
+            pedaco = pedaco.encode()
+        sha.update(pedaco)
+        copia.write(pedaco)
+        tamanho += len(pedaco)
+    copia.seek(0)
+    return sha.hexdigest(), tamanho, copia
+
+
+def nome_blob(sha256, nome_original):
+    extensao = os.path.splitext(nome_original)[1].lower()[:10]
+    return posixpath.join(PREFIXO_BLOBS, sha256[:2], sha256[2:4], f"{sha256}{extensao}")
+
+
+def eh_blob(nome):
+    return bool(nome) and nome.startswith(PREFIXO_BLOBS + '/')
+
+
+class DeduplicacaoMixin:
+    """Mistura com qualquer Storage do Django; o backend concreto só grava e apaga bytes."""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo sai do hash em _save(); conteúdo igual = mesmo nome
+        return name
+
+    def _save(self, name, content):
+        from .models import ArquivoBlob
+
+        sha256, tamanho, copia = calcular_hash(content)
+        nome = nome_blob(sha256, name)
+        with copia, transaction.atomic():
+            blob = ArquivoBlob.travar(nome, sha256, tamanho)
+            if not self.exists(nome):
+                self._gravar_blob(nome, copia)
+            ArquivoBlob.objects.filter(pk=blob.pk).update(referencias=F('referencias') + 1)
+        return nome
+
+    def _gravar_blob(self, nome, arquivo):
+        return super()._save(nome, File(arquivo, name=nome))
+
+    def delete(self, name):
+        from .models import ArquivoBlob
+
+        if not eh_blob(name):
+            super().delete(name)
+        elif ArquivoBlob.liberar(name):
+            # Um rollback devolveria a referência: o arquivo só sai depois do commit
+            transaction.on_commit(lambda: self._apagar_sem_referencias(name))
+
+    def _apagar_sem_referencias(self, name):
+        """Apaga o blob se, com a linha travada, ninguém mais o referencia. Devolve True se apagou."""
+        from .models import ArquivoBlob
+
+        with transaction.atomic():
+            blob = ArquivoBlob.travar(name)
+            if blob.referencias:
+                # Um upload do mesmo conteúdo chegou entre o liberar() e o commit
+                return False
+            super().delete(name)
+            blob.delete()
+        return True
+
+    def varrer_blobs_orfaos(self):
+        """Apaga os arquivos sob blobs/ sem nenhuma referência (ex.: upload desfeito por rollback)."""
+        removidos = 0
+        pastas = [PREFIXO_BLOBS]
+        while pastas:
+            pasta = pastas.pop()
+            try:
+                subpastas, arquivos = self.listdir(pasta)
+            except FileNotFoundError:
+                continue
+            pastas.extend(posixpath.join(pasta, p) for p in subpastas)
+            for arquivo in arquivos:
+                # .tmp: gravação em andamento (ArmazenamentoLocalDeduplicado._gravar_blob)
+                if not arquivo.endswith('.tmp'):
+                    removidos += self._apagar_sem_referencias(posixpath.join(pasta, arquivo))
+        return removidos
+
+
+class ArmazenamentoLocalDeduplicado(DeduplicacaoMixin, FileSystemStorage):
+
+    def _gravar_blob(self, nome, arquivo):
+        destino = self.path(nome)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # Temporário no mesmo diretório + rename: dois uploads simultâneos do
+        # mesmo conteúdo gravam bytes idênticos e o último rename vence sem erro
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for pedaco in iter(lambda: arquivo.read(TAMANHO_PEDACO), b''):
+                    f.write(pedaco)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, destino)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return nome
@@ -0,0 +1,19 @@
+"""
+Backend deduplicado sobre S3 (ou compatível: MinIO, LocalStack) via
+django-storages. Este módulo só é importado quando configurado em
+settings.STORAGES, então o pacote `django-storages[s3]` (boto3) é opcional.
+
+Para testar localmente com MinIO:
+  ARMAZENAMENTO_BACKEND=home.armazenamento_s3.ArmazenamentoS3Deduplicado
+  ARMAZENAMENTO_S3_BUCKET=gestao-adm
+  ARMAZENAMENTO_S3_ENDPOINT=http://localhost:9000
+  AWS_ACCESS_KEY_ID=minioadmin AWS_SECRET_ACCESS_KEY=minioadmin
+"""
+from storages.backends.s3 import S3Storage
+
+from .armazenamento import DeduplicacaoMixin
+
+
+class ArmazenamentoS3Deduplicado(DeduplicacaoMixin, S3Storage):
+    # O nome é o hash do conteúdo: sobrescrever um blob grava os mesmos bytes
+    file_overwrite = True
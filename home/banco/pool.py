@@ -0,0 +1,289 @@
+"""
+Pool de conexões no próprio processo, para o Postgres serverless da Vercel.
+
+Sem pool, cada requisição abre uma conexão SSL nova quando a anterior foi
+fechada (CONN_MAX_AGE vencido, erro, outra thread) e o handshake custa mais
+que a consulta. Com settings_dict['POOL'] o DatabaseWrapper (PoolMixin) pega
+a conexão do pool e, no close() do fim da requisição, devolve em vez de
+fechar: a próxima requisição do processo reaproveita a conexão aberta.
+
+Opções de POOL (settings: BANCO_POOL_*):
+- MIN: conexões mantidas abertas mesmo ociosas (abertas em segundo plano);
+- MAX: teto de conexões do processo; quem passar dele espera na fila;
+- TIMEOUT: segundos de espera por uma conexão antes de PoolEsgotado;
+- MAX_VIDA: segundos até uma conexão ser fechada e trocada por uma nova;
+- OCIOSA: segundos ociosa até fechar uma conexão acima de MIN;
+- VERIFICAR: `SELECT 1` em toda retirada; conexão que falhar é trocada (reconexão).
+
+O Django 5.1 traz pool próprio para o psycopg 3; este serve ao 5.0 e ao psycopg2.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+PADROES = {'MIN': 1, 'MAX': 5, 'TIMEOUT': 10, 'MAX_VIDA': 600, 'OCIOSA': 300, 'VERIFICAR': True}
+CONTADORES = ('aquisicoes', 'reutilizadas', 'criadas', 'esperas', 'timeouts', 'reconexoes', 'recicladas')
+
+
+class PoolEsgotado(OperationalError):
+    """Nenhuma conexão livre dentro de TIMEOUT segundos (todas as MAX em uso)."""
+
+
+def _fechar(conexao):
+    try:
+        conexao.close()
+    except Exception:
+        pass
+
+
+def verificar_conexao(conexao):
+    """Verificação na retirada: qualquer driver DB-API."""
+    cursor = conexao.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+class PoolConexoes:
+    """
+    `criar()` abre uma conexão do driver; `verificar(conexao)` levanta se ela
+    não serve mais. Retirada LIFO: a conexão usada por último é a mais
+    provavelmente viva, e as do fundo ficam ociosas e são fechadas acima de MIN.
+    """
+
+    def __init__(self, criar, verificar=None, minimo=0, maximo=5, timeout=10, max_vida=600, ociosa=300):
+        if maximo < 1 or minimo > maximo:
+            raise ValueError("POOL precisa de 0 <= MIN <= MAX e MAX >= 1")
+        self.criar = criar
+        self.verificar = verificar
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_vida = max_vida
+        self.ociosa = ociosa
+        self._cond = threading.Condition()
+        self._livres = deque()  # (conexao, criada_em, devolvida_em)
+        self._criadas_em = {}   # id(conexao) -> criada_em, para as que estão em uso
+        self._total = 0
+        self.contadores = dict.fromkeys(CONTADORES, 0)
+        self.segundos_espera = 0.0
+
+    def obter(self):
+        inicio = time.monotonic()
+        esperou = False
+        vencidas = []
+        with self._cond:
+            self.contadores['aquisicoes'] += 1
+            while True:
+                item = self._retirar_livre(vencidas)
+                if item is not None or self._total < self.maximo:
+                    break
+                restante = inicio + self.timeout - time.monotonic()
+                if restante <= 0:
+                    self.contadores['timeouts'] += 1
+                    raise PoolEsgotado(
+                        f"Pool de conexões esgotado: {self.maximo} em uso há mais de {self.timeout}s")
+                if not esperou:
+                    esperou = True
+                    self.contadores['esperas'] += 1
+                self._cond.wait(restante)
+            if esperou:
+                self.segundos_espera += time.monotonic() - inicio
+            if item is None:
+                self._total += 1  # vaga reservada antes de abrir, fora do lock
+        for conexao in vencidas:
+            _fechar(conexao)
+
+        if item is not None:
+            conexao, criada_em = item
+            if self._saudavel(conexao):
+                with self._cond:
+                    self.contadores['reutilizadas'] += 1
+                    self._criadas_em[id(conexao)] = criada_em
+                return conexao
+            _fechar(conexao)
+            with self._cond:
+                self.contadores['reconexoes'] += 1
+        return self._abrir()
+
+    def _retirar_livre(self, vencidas):
+        agora = time.monotonic()
+        while self._livres:
+            conexao, criada_em, _ = self._livres.pop()
+            if agora - criada_em < self.max_vida:
+                return conexao, criada_em
+            # Passou de MAX_VIDA ociosa: fecha e libera a vaga
+            vencidas.append(conexao)
+            self._total -= 1
+            self.contadores['recicladas'] += 1
+        return None
+
+    def _saudavel(self, conexao):
+        if not self.verificar:
+            return True
+        try:
+            self.verificar(conexao)
+        except Exception:
+            logger.info("Conexão do pool falhou na verificação; abrindo outra", exc_info=True)
+            return False
+        return True
+
+    def _abrir(self):
+        """Abre uma conexão numa vaga já reservada (_total já contado)."""
+        try:
+            conexao = self.criar()
+        except BaseException:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.contadores['criadas'] += 1
+            self._criadas_em[id(conexao)] = time.monotonic()
+        return conexao
+
+    def devolver(self, conexao):
+        agora = time.monotonic()
+        fechar = []
+        with self._cond:
+            criada_em = self._criadas_em.pop(id(conexao), agora)
+            if agora - criada_em >= self.max_vida:
+                fechar.append(conexao)
+                self._total -= 1
+                self.contadores['recicladas'] += 1
+            else:
+                self._livres.append((conexao, criada_em, agora))
+            # As do fundo da fila são as ociosas há mais tempo
+            while len(self._livres) > self.minimo and agora - self._livres[0][2] >= self.ociosa:
+                fechar.append(self._livres.popleft()[0])
+                self._total -= 1
+            self._cond.notify()
+        for c in fechar:
+            _fechar(c)
+
+    def descartar(self, conexao):
+        """Conexão quebrada ou fechada no meio de uma transação: fecha e libera a vaga."""
+        with self._cond:
+            self._criadas_em.pop(id(conexao), None)
+            self._total -= 1
+            self._cond.notify()
+        _fechar(conexao)
+
+    def abastecer(self):
+        """Abre conexões até MIN (chamado em segundo plano quando o pool é criado)."""
+        while True:
+            with self._cond:
+                if self._total >= self.minimo:
+                    return
+                self._total += 1
+            try:
+                conexao = self._abrir()
+            except Exception:
+                logger.warning("Não foi possível abrir as conexões mínimas do pool", exc_info=True)
+                return
+            self.devolver(conexao)
+
+    def fechar_todas(self):
+        """Fecha as conexões livres (as em uso são fechadas ao voltar, se o pool for descartado)."""
+        with self._cond:
+            livres, self._livres = list(self._livres), deque()
+            self._total -= len(livres)
+        for conexao, _, _ in livres:
+            _fechar(conexao)
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                **self.contadores,
+                'segundos_espera': self.segundos_espera,
+                'livres': len(self._livres),
+                'em_uso': self._total - len(self._livres),
+                'maximo': self.maximo,
+            }
+
+
+# --- Um pool por alias e por processo (depois de um fork o pool do pai não serve) ---
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(alias, opcoes, criar):
+    chave = (alias, os.getpid())
+    pool = _pools.get(chave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(chave)
+            if pool is None:
+                opcoes = {**PADROES, **opcoes}
+                pool = _pools[chave] = PoolConexoes(
+                    criar, verificar_conexao if opcoes['VERIFICAR'] else None,
+                    minimo=opcoes['MIN'], maximo=opcoes['MAX'], timeout=opcoes['TIMEOUT'],
+                    max_vida=opcoes['MAX_VIDA'], ociosa=opcoes['OCIOSA'],
+                )
+                if pool.minimo > 1:
+                    # A primeira conexão é a da requisição atual; as demais não a atrasam
+                    threading.Thread(target=pool.abastecer, name=f'pool-{alias}', daemon=True).start()
+    return pool
+
+
+def fechar_pools():
+    """Fecha as conexões livres e esquece os pools deste processo (testes, benchmark_pool)."""
+    with _pools_lock:
+        pools = [p for (_, pid), p in _pools.items() if pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.fechar_todas()
+
+
+def estatisticas_pools():
+    """[(alias, estatisticas)] dos pools deste processo, para o /metrics."""
+    return sorted((alias, pool.estatisticas()) for (alias, pid), pool in list(_pools.items())
+                  if pid == os.getpid())
+
+
+class PoolMixin:
+    """
+    Mistura para o DatabaseWrapper de um backend (ver home/banco/postgresql e
+    sqlite3). Sem settings_dict['POOL'] se comporta como o backend original.
+    """
+
+    def _pool(self, criar=None):
+        opcoes = self.settings_dict.get('POOL')
+        if not opcoes:
+            return None
+        return obter_pool(self.alias, opcoes, criar)
+
+    def _abrir_conexao(self, conn_params):
+        return super().get_new_connection(conn_params)
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool(lambda: self._abrir_conexao(conn_params))
+        if pool is None:
+            return self._abrir_conexao(conn_params)
+        return pool.obter()
+
+    def _close(self):
+        pool = self._pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        conexao = self.connection
+        if self.in_atomic_block:
+            # O Django continua segurando esta conexão (closed_in_transaction): não pode voltar ao pool
+            pool.descartar(conexao)
+            return
+        try:
+            # Transação aberta (autocommit desligado) não passa para a próxima requisição
+            conexao.rollback()
+        except Exception:
+            pool.descartar(conexao)
+            return
+        pool.devolver(conexao)
@@ -0,0 +1,8 @@
+"""Backend PostgreSQL do Django com o pool de conexões de home/banco/pool.py (ENGINE 'home.banco.postgresql')."""
+from django.db.backends.postgresql import base
+
+from ..pool import PoolMixin
+
+
+class DatabaseWrapper(PoolMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,8 @@
+"""Backend SQLite com o pool de home/banco/pool.py: usado localmente e pelo benchmark_pool no lugar do Postgres."""
+from django.db.backends.sqlite3 import base
+
+from ..pool import PoolMixin
+
+
+class DatabaseWrapper(PoolMixin, base.DatabaseWrapper):
+    pass
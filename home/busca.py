@@ -0,0 +1,93 @@
+"""
+Busca textual sobre Ordens de Compra e Notas Fiscais.
+
+Consulta o índice mantido em IndiceBusca: tsvector + GIN no PostgreSQL,
+FTS5 no SQLite. Outros bancos caem em um LIKE sobre o texto normalizado.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import IndiceBusca, OrdemCompra
+
+MAX_TERMOS = 8
+
+
+def _termos(consulta):
+    return re.findall(r'[^\W_]+', IndiceBusca.normalizar(consulta))[:MAX_TERMOS]
+
+
+def _tsquery(termos):
+    return ' & '.join(f"{termo}:*" for termo in termos)
+
+
+def _match_fts5(termos):
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def _ids_ranqueados(termos, limite, deslocamento):
+    """Ids das OCs que contêm todos os termos (por prefixo), da mais relevante para a menos."""
+    # SQL cru não passa pelo roteador: o banco é o que ele escolheria para o índice (réplica nos relatórios)
+    connection = connections[router.db_for_read(IndiceBusca)]
+    if connection.vendor == 'postgresql':
+        sql = (
+            "SELECT ordem_compra_id FROM home_indicebusca, to_tsquery('simple', %s) q "
+            "WHERE vetor @@ q ORDER BY ts_rank(vetor, q) DESC, ordem_compra_id DESC "
+            "LIMIT %s OFFSET %s"
+        )
+        parametros = [_tsquery(termos), limite, deslocamento]
+    elif connection.vendor == 'sqlite':
+        sql = (
+            "SELECT rowid FROM home_indicebusca_fts WHERE home_indicebusca_fts MATCH %s "
+            "ORDER BY rank, rowid DESC LIMIT %s OFFSET %s"
+        )
+        parametros = [_match_fts5(termos), limite, deslocamento]
+    else:
+        consulta = IndiceBusca.objects.all()
+        for termo in termos:
+            consulta = consulta.filter(texto__contains=termo)
+        return list(consulta.order_by('-ordem_compra_id')
+                    .values_list('ordem_compra_id', flat=True)[deslocamento:deslocamento + limite])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def filtro_indice(consulta):
+    """
+    Q das OCs cujo documento contém todos os termos (por prefixo), para compor
+    com outros filtros de OrdemCompra num único SELECT; None se não há termos.
+    """
+    termos = _termos(consulta)
+    if not termos:
+        return None
+    # A subconsulta roda no banco da consulta externa de OrdemCompra
+    connection = connections[router.db_for_read(OrdemCompra)]
+    if connection.vendor == 'postgresql':
+        return Q(pk__in=RawSQL("SELECT ordem_compra_id FROM home_indicebusca "
+                               "WHERE vetor @@ to_tsquery('simple', %s)", [_tsquery(termos)]))
+    if connection.vendor == 'sqlite':
+        return Q(pk__in=RawSQL("SELECT rowid FROM home_indicebusca_fts WHERE home_indicebusca_fts MATCH %s",
+                               [_match_fts5(termos)]))
+    consulta = IndiceBusca.objects.all()
+    for termo in termos:
+        consulta = consulta.filter(texto__contains=termo)
+    return Q(pk__in=consulta.values('ordem_compra_id'))
+
+
+def buscar(consulta, pagina=1, tamanho=20):
+    """
+    Devolve (ordens, tem_proxima) para a página pedida, na ordem de relevância.
+    As OCs vêm com unidade e nota fiscal carregadas numa única consulta.
+    """
+    termos = _termos(consulta)
+    if not termos:
+        return [], False
+    ids = _ids_ranqueados(termos, tamanho + 1, (pagina - 1) * tamanho)
+    tem_proxima = len(ids) > tamanho
+    ids = ids[:tamanho]
+    ordens = OrdemCompra.objects.select_related('unidade', 'nota_fiscal').in_bulk(ids)
+    return [ordens[i] for i in ids if i in ordens], tem_proxima
@@ -0,0 +1,139 @@
+"""
+Cache das páginas renderizadas (pendências, notas fiscais, detalhe da OC).
+
+Cada página depende de contadores de geração em VersaoCache: um por status de
+OC ('paginas:oc:SOLICITADO', ...), um para as NFs e o 'referencias' dos
+cadastros. Toda gravação de OC/NF incrementa os contadores afetados (signals
+de home/signals.py para save/delete; transicoes e importacao chamam
+invalidar() porque usam UPDATE/bulk_create); o incremento acontece no commit.
+A chave do HTML leva essas versões, a URL completa e o usuário: uma página
+velha nunca é apagada, só deixa de ser encontrada e expira pelo TIMEOUT.
+Ler todas as versões custa uma consulta; a página em si, nenhuma.
+
+O detalhe de uma OC depende só do contador do status em que ela está. O
+status fica num ponteiro no cache; se ele estiver velho é porque a OC mudou
+de status, o que já incrementou o contador antigo: a chave não bate e a
+página é refeita (e o ponteiro corrigido).
+
+O HTML traz o token CSRF do usuário, então a chave inclui um hash do cookie
+CSRF e da sessão. Respostas com mensagens pendentes, sem cookie CSRF ainda
+ou que gravam cookies não entram no cache.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+
+from . import metricas
+from .models import OrdemCompra, VersaoCache
+
+CHAVE_NF = 'paginas:nf'
+CHAVE_REFERENCIAS = 'referencias'
+
+
+def chave_status(status):
+    return f'paginas:oc:{status}'
+
+
+def _cache():
+    return caches[getattr(settings, 'CACHE_PAGINAS', 'default')]
+
+
+def invalidar(status=(), nf=False):
+    """Incrementa os contadores das páginas que mostram OCs nesses status (e/ou NFs), no commit."""
+    chaves = sorted({chave_status(s) for s in status if s} | ({CHAVE_NF} if nf else set()))
+    if not chaves:
+        return
+
+    def incrementar():
+        for chave in chaves:
+            VersaoCache.incrementar(chave)
+    transaction.on_commit(incrementar)
+
+
+def invalidar_tudo():
+    invalidar([s for s, _ in OrdemCompra.STATUS_PEDIDO], nf=True)
+
+
+def _identidade(request):
+    """Usuário + hash do cookie CSRF e da sessão: o HTML cacheado só volta para o mesmo navegador logado."""
+    cookie_csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not cookie_csrf:
+        return None
+    sessao = getattr(request, 'session', None)
+    bruto = f"{cookie_csrf}|{sessao.session_key if sessao else ''}"
+    return f"{request.user.pk or 'anonimo'}:{hashlib.sha256(bruto.encode()).hexdigest()[:16]}"
+
+
+def _chave(request, pagina, identidade, versoes, dependencias):
+    assinatura = ','.join(f"{c}={versoes[c]}" for c in sorted(dependencias))
+    bruto = f"{pagina}|{request.get_full_path()}|{identidade}|{assinatura}"
+    return 'pagina:' + hashlib.sha256(bruto.encode()).hexdigest()
+
+
+# Dependência que só se conhece depois de renderizar (o status da OC no detalhe):
+# `chave` guarda o último valor no cache, `candidatas` são os valores possíveis
+# e `calcular()` lê o valor real da view já renderizada
+Ponteiro = namedtuple('Ponteiro', 'chave candidatas calcular')
+
+
+def responder(request, pagina, dependencias, renderizar, ponteiro=None):
+    """
+    Devolve a página `pagina` do cache ou chama `renderizar()` (a resposta da
+    view) e guarda o resultado. `dependencias`: chaves de VersaoCache.
+    """
+    identidade = _identidade(request)
+    if identidade is None or len(get_messages(request)):
+        metricas.registrar_cache(pagina, 'ignorado')
+        return renderizar()
+
+    cache = _cache()
+    dependencias = list(dependencias)
+    # Versões lidas ANTES de renderizar: se algo mudar durante a renderização,
+    # a página fica guardada sob a versão antiga e nunca é servida
+    versoes = VersaoCache.atuais(dependencias + list(ponteiro.candidatas if ponteiro else []))
+    extra = cache.get(ponteiro.chave) if ponteiro else None
+    if not ponteiro or extra in versoes:
+        guardado = cache.get(_chave(request, pagina, identidade, versoes, dependencias + ([extra] if extra else [])))
+        if guardado is not None:
+            metricas.registrar_cache(pagina, 'acerto')
+            conteudo, content_type = guardado
+            response = HttpResponse(conteudo, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+    metricas.registrar_cache(pagina, 'falha')
+    response = renderizar()
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200 or response.cookies or response.streaming:
+        return response
+    if ponteiro:
+        extra = ponteiro.calcular()
+        cache.set(ponteiro.chave, extra)
+        dependencias.append(extra)
+    cache.set(_chave(request, pagina, identidade, versoes, dependencias), (response.content, response['Content-Type']))
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+class CachePaginaMixin:
+    """
+    Para views de GET: `cache_pagina` nomeia a página (nas estatísticas) e
+    `cache_dependencias` lista as chaves de VersaoCache de que ela depende.
+    """
+    cache_pagina = None
+    cache_dependencias = ()
+
+    def ponteiro_cache(self):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        renderizar = lambda: super(CachePaginaMixin, self).get(request, *args, **kwargs)
+        if not getattr(settings, 'CACHE_PAGINAS_ATIVO', True):
+            return renderizar()
+        return responder(request, self.cache_pagina, self.cache_dependencias, renderizar, self.ponteiro_cache())
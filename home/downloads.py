@@ -0,0 +1,185 @@
+"""
+Download controlado de anexos (orçamento, NF) e dos PDFs gerados.
+
+- ETag forte: o SHA-256 do blob (armazenamento deduplicado) ou, para arquivos
+  antigos, um hash de nome + tamanho + data de modificação. If-None-Match que
+  bate responde 304 sem abrir o arquivo.
+- Range: um intervalo `bytes=início-fim` responde 206 só com aquele pedaço
+  (retomada de download, visualizador de PDF do navegador). If-Range com ETag
+  diferente ignora o Range e manda o arquivo inteiro.
+- O arquivo é lido em pedaços (StreamingHttpResponse), nunca inteiro na memória.
+  Servido por ASGI (pweb/asgi.py) o corpo é um iterador assíncrono e cada
+  leitura roda numa thread do executor, sem segurar o event loop; sob WSGI o
+  iterador é síncrono (um assíncrono seria lido inteiro antes do envio).
+- settings.DOWNLOAD_MODO = 'x-accel-redirect' (nginx) ou 'x-sendfile'
+  (Apache/lighttpd): o Django só autoriza e o proxy entrega os bytes, sem
+  segurar um worker Python. Em storages sem caminho local (S3) o modo proxy
+  redireciona para a URL assinada do próprio storage.
+"""
+import hashlib
+import mimetypes
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+
+from .armazenamento import eh_blob
+
+TAMANHO_PEDACO = 64 * 1024
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def etag_arquivo(storage, nome, tamanho):
+    if eh_blob(nome):
+        # O nome do blob é o hash do conteúdo
+        return '"%s"' % nome.rsplit('/', 1)[-1].split('.', 1)[0]
+    try:
+        modificado = storage.get_modified_time(nome).timestamp()
+    except (NotImplementedError, OSError):
+        modificado = ''
+    return '"%s"' % hashlib.sha256(f"{nome}|{tamanho}|{modificado}".encode()).hexdigest()[:32]
+
+
+def _etag_confere(cabecalho, etag):
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == '*':
+        return True
+    # If-None-Match usa comparação fraca: W/"x" confere com "x"
+    return etag in (e.strip().removeprefix('W/') for e in cabecalho.split(','))
+
+
+def _intervalo(request, tamanho, etag):
+    """(início, fim) inclusivo do Range pedido, None para o arquivo inteiro ou 'invalido'."""
+    cabecalho = request.headers.get('Range')
+    if not cabecalho or request.method != 'GET':
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range.strip() != etag:
+        return None
+    encontrado = _RANGE.match(cabecalho.strip())
+    if not encontrado:
+        # Vários intervalos ou unidade desconhecida: o RFC permite ignorar
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # bytes=-N: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0:
+            return 'invalido'
+        return max(0, tamanho - sufixo), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return 'invalido'
+    return inicio, fim
+
+
+def _ler_pedacos(abrir, inicio, quantidade):
+    with abrir() as arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            pedaco = arquivo.read(min(TAMANHO_PEDACO, quantidade))
+            if not pedaco:
+                break
+            quantidade -= len(pedaco)
+            yield pedaco
+
+
+async def _aler_pedacos(abrir, inicio, quantidade):
+    # abrir() pode consultar o banco (PDF em TarefaPdf): roda na thread do ORM assíncrono
+    arquivo = await sync_to_async(abrir)()
+    ler = sync_to_async(arquivo.read, thread_sensitive=False)
+    try:
+        await sync_to_async(arquivo.seek, thread_sensitive=False)(inicio)
+        while quantidade > 0:
+            pedaco = await ler(min(TAMANHO_PEDACO, quantidade))
+            if not pedaco:
+                break
+            quantidade -= len(pedaco)
+            yield pedaco
+    finally:
+        await sync_to_async(arquivo.close, thread_sensitive=False)()
+
+
+def _cabecalhos(response, etag, nome_download, anexo):
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    # Sempre revalida, mas com o ETag a revalidação custa um 304
+    response['Cache-Control'] = 'private, no-cache'
+    tipo = 'attachment' if anexo else 'inline'
+    response['Content-Disposition'] = f"{tipo}; filename*=UTF-8''{quote(nome_download)}"
+    return response
+
+
+def responder_arquivo(request, abrir, tamanho, etag, nome_download, content_type='application/octet-stream',
+                      anexo=False):
+    """
+    Resposta de download para um conteúdo de `tamanho` bytes. `abrir()` devolve
+    um arquivo binário com seek(); só é chamada se os bytes forem mesmo enviados.
+    """
+    if _etag_confere(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    intervalo = _intervalo(request, tamanho, etag)
+    if intervalo == 'invalido':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamanho}'
+        return _cabecalhos(response, etag, nome_download, anexo)
+
+    inicio, fim = intervalo or (0, tamanho - 1)
+    quantidade = max(0, fim - inicio + 1)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=206 if intervalo else 200)
+    else:
+        ler = _aler_pedacos if isinstance(request, ASGIRequest) else _ler_pedacos
+        response = StreamingHttpResponse(ler(abrir, inicio, quantidade),
+                                         content_type=content_type, status=206 if intervalo else 200)
+    response['Content-Length'] = str(quantidade)
+    if intervalo:
+        response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    return _cabecalhos(response, etag, nome_download, anexo)
+
+
+def responder_campo_arquivo(request, arquivo, nome_download, anexo=False):
+    """Download de um FieldFile (anexo_orcamento, arquivo_nf) respeitando settings.DOWNLOAD_MODO."""
+    if not arquivo:
+        raise Http404("Arquivo não anexado.")
+    storage, nome = arquivo.storage, arquivo.name
+    content_type = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+    try:
+        tamanho = storage.size(nome)
+    except OSError:
+        raise Http404("Arquivo não encontrado no armazenamento.")
+    etag = etag_arquivo(storage, nome, tamanho)
+
+    modo = getattr(settings, 'DOWNLOAD_MODO', 'python')
+    if modo != 'python' and not _etag_confere(request.headers.get('If-None-Match'), etag):
+        try:
+            caminho = storage.path(nome)
+        except NotImplementedError:
+            # Sem caminho local (S3): o próprio storage entrega por URL assinada
+            return HttpResponseRedirect(storage.url(nome))
+        response = HttpResponse(content_type=content_type)
+        if modo == 'x-accel-redirect':
+            # location "internal" do nginx apontando para MEDIA_ROOT; Range fica com o nginx
+            response['X-Accel-Redirect'] = settings.DOWNLOAD_ACCEL_PREFIXO.rstrip('/') + '/' + quote(nome)
+        else:
+            response['X-Sendfile'] = caminho
+        return _cabecalhos(response, etag, nome_download, anexo)
+
+    return responder_arquivo(request, lambda: storage.open(nome, 'rb'), tamanho, etag, nome_download,
+                             content_type, anexo)
+
+
+async def aresponder_campo_arquivo(request, arquivo, nome_download, anexo=False):
+    """Versão para views async: o stat/ETag (disco ou S3) roda numa thread, fora do event loop."""
+    return await sync_to_async(responder_campo_arquivo, thread_sensitive=False)(
+        request, arquivo, nome_download, anexo)
@@ -0,0 +1,188 @@
+"""
+Pipeline dos arquivos estáticos próprios (static/css, static/js).
+
+Build (collectstatic, rodado pelo build_files.sh):
+  1. PacotesFinder junta e minifica os fontes de PACOTES em css/app.css e
+     js/app.js (um pedido por tipo em vez de um por arquivo).
+  2. ArmazenamentoEstaticos (WhiteNoise) grava cada arquivo com o hash do
+     conteúdo no nome (app.3f2a9c1b7d4e.js), escreve staticfiles.json (o
+     manifesto que o {% static %} consulta) e pré-comprime cada um em .br
+     (brotli) e .gz (zopfli, ~5% menor que o gzip -9, mesmo formato). As
+     cópias sem hash ficam ao lado: onde o manifesto não chega (o lambda da
+     Vercel é empacotado sem o resultado do build estático) as páginas
+     apontam para elas.
+
+Execução: o WhiteNoiseMiddleware responde antes do Django montar a requisição
+e escolhe o .br/.gz conforme o Accept-Encoding; nomes com hash saem com
+`Cache-Control: max-age=315360000, public, immutable`. Na Vercel, /static/
+é servido direto pelo CDN (vercel.json), sem passar pelo Python. Atrás de um
+nginx: `location /static/ { alias <STATIC_ROOT>/; gzip_static on;
+brotli_static on; expires max; }`.
+
+Em desenvolvimento (DEBUG) o runserver pede os pacotes ao PacotesFinder, que
+os remonta sempre que um fonte muda.
+"""
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+from whitenoise.compress import Compressor
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+logger = logging.getLogger(__name__)
+
+# Pacote -> fontes, na ordem em que entram (funcoes.js só declara funções:
+# vem antes para que um erro no menu.js não deixe as funções indefinidas)
+PACOTES = {
+    'css/app.css': ['css/style.css'],
+    'js/app.js': ['js/funcoes.js', 'js/menu.js'],
+}
+
+
+# --- Minificação conservadora (só comentários e espaços) ---
+
+def minificar_css(texto):
+    texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.S)
+    texto = re.sub(r'\s+', ' ', texto)
+    # Espaço em volta de { } ; , e > não muda o significado; em volta de ':' muda (a :hover)
+    texto = re.sub(r'\s*([{};,>])\s*', r'\1', texto)
+    return texto.replace(';}', '}').strip() + '\n'
+
+
+# Depois destes caracteres uma '/' abre uma expressão regular, não uma divisão
+_ANTES_DE_REGEX = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+
+def minificar_js(texto):
+    """
+    Remove comentários, indentação e linhas vazias, respeitando strings,
+    template literals e expressões regulares. As quebras de linha ficam (a
+    inserção automática de ponto e vírgula depende delas).
+    """
+    saida = []
+    i, n = 0, len(texto)
+    ultimo = ''  # último caractere significativo emitido
+    while i < n:
+        c = texto[i]
+        if c in '\'"`':
+            fim = i + 1
+            while fim < n and texto[fim] != c:
+                fim += 2 if texto[fim] == '\\' else 1
+            saida.append(texto[i:fim + 1])
+            i, ultimo = fim + 1, c
+        elif texto.startswith('//', i):
+            fim = texto.find('\n', i)
+            i = n if fim == -1 else fim
+        elif texto.startswith('/*', i):
+            fim = texto.find('*/', i + 2)
+            i = n if fim == -1 else fim + 2
+            saida.append(' ')
+        elif c == '/' and ultimo in _ANTES_DE_REGEX:
+            fim, classe = i + 1, False
+            while fim < n and (texto[fim] != '/' or classe) and texto[fim] != '\n':
+                if texto[fim] == '\\':
+                    fim += 1
+                elif texto[fim] in '[]':
+                    classe = texto[fim] == '['
+                fim += 1
+            saida.append(texto[i:fim + 1])
+            i, ultimo = fim + 1, '/'
+        else:
+            saida.append(c)
+            if not c.isspace():
+                ultimo = c
+            i += 1
+    linhas = (linha.strip() for linha in ''.join(saida).splitlines())
+    return '\n'.join(linha for linha in linhas if linha) + '\n'
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js}
+
+
+def montar_pacote(nome):
+    """Conteúdo minificado do pacote `nome`, a partir dos fontes achados pelos outros finders."""
+    partes = []
+    for origem in PACOTES[nome]:
+        caminho = finders.find(origem)
+        if not caminho:
+            raise FileNotFoundError(f"Fonte do pacote {nome} não encontrado: {origem}")
+        with open(caminho, encoding='utf-8') as f:
+            partes.append(f"/* {origem} */\n" + MINIFICADORES[os.path.splitext(nome)[1]](f.read()))
+    # ';' entre os scripts: um arquivo sem ';' final não emenda no próximo
+    return ('\n' if nome.endswith('.css') else ';\n').join(partes)
+
+
+class PacotesFinder(BaseFinder):
+    """Expõe os pacotes de PACOTES como se fossem arquivos de static/ (para o collectstatic e o runserver)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.storage = FileSystemStorage(location=settings.ESTATICOS_PACOTES_DIR)
+
+    def check(self, **kwargs):
+        return []
+
+    def _gravar(self, nome):
+        conteudo = montar_pacote(nome).encode()
+        destino = self.storage.path(nome)
+        try:
+            with open(destino, 'rb') as f:
+                if f.read() == conteudo:
+                    return destino
+        except OSError:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+        tmp = destino + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(conteudo)
+        os.replace(tmp, destino)
+        return destino
+
+    def find(self, path, all=False):
+        if path not in PACOTES:
+            return []
+        destino = self._gravar(path)
+        return [destino] if all else destino
+
+    def list(self, ignore_patterns):
+        for nome in PACOTES:
+            self._gravar(nome)
+            yield nome, self.storage
+
+
+# --- Armazenamento com hash + pré-compressão ---
+
+class CompressorZopfli(Compressor):
+    @staticmethod
+    def compress_gzip(data):
+        try:
+            import zopfli.gzip
+        except ImportError:
+            return Compressor.compress_gzip(data)
+        return zopfli.gzip.compress(data)
+
+
+class ArmazenamentoEstaticos(CompressedManifestStaticFilesStorage):
+
+    def create_compressor(self, **kwargs):
+        return CompressorZopfli(**kwargs)
+
+    _avisado = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Sem collectstatic (testes, desenvolvimento) ou sem o staticfiles.json no
+            # pacote do lambda: usa o nome original, que o collectstatic também mantém
+            # (WHITENOISE_KEEP_ONLY_HASHED_FILES=False) e os finders servem em DEBUG
+            if self.manifest_strict:
+                raise
+            if not settings.DEBUG and not ArmazenamentoEstaticos._avisado:
+                ArmazenamentoEstaticos._avisado = True
+                logger.warning("staticfiles.json não encontrado: estáticos servidos pelos nomes sem hash "
+                               "(sem cache imutável)")
+            return name
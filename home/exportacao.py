@@ -0,0 +1,111 @@
+"""
+Exportação de Ordens de Compra + Notas Fiscais para conciliação financeira.
+
+As linhas saem de um cursor no servidor (iterator(chunk_size=...)) já com os
+JOINs de unidade, centro de custo e NF, e são escritas conforme chegam: o uso
+de memória não depende da quantidade de linhas exportadas.
+"""
+import csv
+from datetime import datetime
+
+from .models import OrdemCompra
+from .roteador import para_relatorio
+
+TAMANHO_BLOCO = 2000
+
+COLUNAS = [
+    ('id', 'ID OC'),
+    ('numero_os', 'Nº OS'),
+    ('data_os', 'Data OS'),
+    ('unidade__abreviacao', 'Unidade'),
+    ('centro_custo__codigo', 'Centro de Custo'),
+    ('conta_contabil', 'Conta Contábil'),
+    ('classificacao', 'CAPEX/OPEX'),
+    ('status', 'Status'),
+    ('fornecedor', 'Fornecedor'),
+    ('valor_estimado', 'Valor Estimado'),
+    ('nota_fiscal__numero_nf', 'Nº NF'),
+    ('nota_fiscal__data_emissao', 'Emissão NF'),
+    ('nota_fiscal__data_vencimento', 'Vencimento'),
+    ('nota_fiscal__valor_final', 'Valor Final'),
+]
+
+
+def _data_filtro(valor):
+    if not valor:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: {valor}")
+
+
+def filtrar_ordens(inicio=None, fim=None, unidade=None, status=None, manager=None):
+    """Filtra por período (data_os), unidade (id ou sigla) e status (separados por vírgula)."""
+    consulta = (manager or OrdemCompra.objects).all()
+    inicio, fim = _data_filtro(inicio), _data_filtro(fim)
+    if inicio:
+        consulta = consulta.filter(data_os__gte=inicio)
+    if fim:
+        consulta = consulta.filter(data_os__lte=fim)
+    if unidade:
+        consulta = consulta.filter(unidade_id=unidade) if str(unidade).isdigit() else consulta.filter(unidade__abreviacao__iexact=unidade)
+    if status:
+        consulta = consulta.filter(status__in=[s.strip().upper() for s in status.split(',')])
+    return consulta
+
+
+def consulta_exportacao(inicio=None, fim=None, unidade=None, status=None):
+    # O CSV é lido depois que a view retornou, fora do leitura_relatorio: a dica vai no queryset
+    consulta = filtrar_ordens(inicio, fim, unidade, status, manager=para_relatorio(OrdemCompra))
+    # values_list percorre os JOINs (unidade, centro_custo, nota_fiscal) sem instanciar modelos
+    return consulta.order_by('data_os', 'id').values_list(*[campo for campo, _ in COLUNAS])
+
+
+def _formatar(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%d/%m/%Y')
+    if hasattr(valor, 'quantize'):
+        return f"{valor:.2f}".replace('.', ',')
+    return valor
+
+
+class _Eco:
+    """Pseudo-buffer: csv.writer devolve a linha formatada em vez de guardá-la."""
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(consulta):
+    """Gera o CSV (separador ';', padrão do Excel pt-BR) em pedaços de bytes."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff'.encode()  # BOM: o Excel reconhece o UTF-8
+    yield escritor.writerow([titulo for _, titulo in COLUNAS]).encode()
+    bloco = []
+    for linha in consulta.iterator(chunk_size=TAMANHO_BLOCO):
+        bloco.append(escritor.writerow([_formatar(v) for v in linha]))
+        if len(bloco) >= 500:
+            yield ''.join(bloco).encode()
+            bloco = []
+    if bloco:
+        yield ''.join(bloco).encode()
+
+
+def gravar_xlsx(consulta, destino):
+    """
+    Grava a planilha em `destino` (caminho ou arquivo) no modo write-only do
+    openpyxl, que descarrega as linhas em disco em vez de mantê-las na memória.
+    """
+    # IMPORTAÇÃO TARDIA: openpyxl só é necessário para planilhas
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet('Conciliação')
+    planilha.append([titulo for _, titulo in COLUNAS])
+    for linha in consulta.iterator(chunk_size=TAMANHO_BLOCO):
+        planilha.append(list(linha))
+    livro.save(destino)
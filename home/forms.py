@@ -1,4 +1,5 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import OrdemCompra, Unidade, NotaFiscal
 
 class OrdemCompraForm(forms.ModelForm):
@@ -64,12 +65,41 @@ class NotaFiscalForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Filtro de OCs
+        # Filtro de OCs: só valida o id escolhido (um SELECT por pk), nunca renderiza a lista inteira
         self.fields['ordem_compra'].queryset = OrdemCompra.objects.filter(status='APROVADO', nota_fiscal__isnull=True)
         self.fields['ordem_compra'].label = "Buscar por Ordem de Compra / Fluig"
+        self.fields['ordem_compra'].widget = forms.HiddenInput()
+
+        # Campo de busca (autocomplete via ajax_busca_oc), preenche o hidden acima
+        self.fields['ordem_compra_busca'] = forms.CharField(
+            label="Buscar por Ordem de Compra / Fluig", required=False,
+            widget=forms.TextInput(attrs={
+                'class': 'autocomplete', 'data-url': reverse_lazy('ajax_busca_oc'),
+                'data-hidden': '#id_ordem_compra', 'placeholder': 'Digite o nº da OS, fornecedor ou ID...',
+            }))
+        oc_id = self['ordem_compra'].value()
+        if oc_id:
+            oc = OrdemCompra.objects.filter(pk=oc_id).only('numero_os', 'fornecedor').first() if str(oc_id).isdigit() else None
+            self.initial['ordem_compra_busca'] = str(oc) if oc else ''
         
         for field in self.fields.values():
             # Preserva classes existentes e adiciona form-control
             existing_class = field.widget.attrs.get('class', '')
             if 'form-control' not in existing_class:
-                field.widget.attrs['class'] = existing_class + ' form-control'
\ No newline at end of file
+                field.widget.attrs['class'] = existing_class + ' form-control'
+
+# --- IMPORTAÇÃO EM MASSA (CSV/XLSX) ---
+
+class ImportacaoForm(forms.Form):
+    TIPO_CHOICES = [
+        ('ordens', 'Ordens de Compra (histórico Fluig)'),
+        ('notas', 'Notas Fiscais de Fornecedores'),
+    ]
+    tipo = forms.ChoiceField(choices=TIPO_CHOICES, label="Tipo de Arquivo", widget=forms.Select(attrs={'class': 'form-control'}))
+    arquivo = forms.FileField(label="Arquivo (.csv ou .xlsx)", widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}))
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return arquivo
@@ -0,0 +1,330 @@
+"""
+Importação em massa de Ordens de Compra e Notas Fiscais a partir de CSV/XLSX.
+
+As linhas são lidas uma a uma (o arquivo nunca é carregado inteiro), os
+cadastros são resolvidos por mapas em memória e a gravação é feita em lotes
+de bulk_create, cada lote em sua transação. Erros são reportados por linha:
+cada registro é validado (clean_fields, sem consultas) antes de entrar no
+lote, e se ainda assim o banco recusar o lote, ele é regravado linha a linha
+para que só a linha com problema fique de fora.
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache_paginas
+from .models import CentroCusto, ConsumoOrcamento, HistoricoStatus, IndiceBusca, NotaFiscal, OrdemCompra, ResumoDashboard, Solicitante, Unidade
+
+TAMANHO_LOTE = 1000
+
+STATUS_IMPORTAVEIS = {'RASCUNHO', 'SOLICITADO', 'APROVADO', 'REPROVADO'}
+# Fora do clean_fields: FKs já resolvidas pelos mapas (validá-las consultaria o
+# banco a cada linha) e anexos, que a planilha pode deixar em branco
+EXCLUIR_VALIDACAO_OC = ['solicitante', 'unidade', 'centro_custo', 'aprovado_por', 'anexo_orcamento']
+EXCLUIR_VALIDACAO_NF = ['ordem_compra', 'responsavel_lancamento', 'arquivo_nf']
+
+
+class ErroLinha(ValueError):
+    pass
+
+
+# --- Leitura do arquivo ---
+
+def ler_linhas(arquivo, nome):
+    """Gera (numero_linha, dict) a partir de um arquivo CSV ou XLSX aberto em modo binário."""
+    if nome.lower().endswith('.xlsx'):
+        yield from _ler_xlsx(arquivo)
+    else:
+        yield from _ler_csv(arquivo)
+
+
+def _ler_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(texto, dialect=dialeto)
+    leitor.fieldnames = [_normalizar_coluna(c) for c in leitor.fieldnames or []]
+    for numero, linha in enumerate(leitor, start=2):
+        yield numero, linha
+    texto.detach()
+
+
+def _ler_xlsx(arquivo):
+    try:
+        # IMPORTAÇÃO TARDIA: openpyxl só é necessário para planilhas
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroLinha("Suporte a XLSX indisponível: instale o pacote 'openpyxl' ou envie um CSV.")
+    planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = [_normalizar_coluna(c) for c in next(linhas, [])]
+    for numero, valores in enumerate(linhas, start=2):
+        if any(v not in (None, '') for v in valores):
+            yield numero, dict(zip(cabecalho, valores))
+
+
+def _normalizar_coluna(nome):
+    return IndiceBusca.normalizar(str(nome or '')).strip().replace(' ', '_')
+
+
+# --- Conversões ---
+
+def _texto(linha, campo, obrigatorio=True):
+    valor = linha.get(campo)
+    valor = '' if valor is None else str(valor).strip()
+    if obrigatorio and not valor:
+        raise ErroLinha(f"'{campo}' é obrigatório")
+    return valor
+
+
+def _data(linha, campo, obrigatorio=True):
+    valor = linha.get(campo)
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    valor = _texto(linha, campo, obrigatorio)
+    if not valor:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ErroLinha(f"'{campo}' inválido: {valor}")
+
+
+def _decimal(linha, campo, obrigatorio=True):
+    valor = linha.get(campo)
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor)).quantize(Decimal('0.01'))
+    valor = _texto(linha, campo, obrigatorio).replace('R$', '').strip()
+    if not valor:
+        return None
+    if ',' in valor:  # formato brasileiro: 1.234,56
+        valor = valor.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(valor).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ErroLinha(f"'{campo}' inválido: {valor}")
+
+
+def _validar(registro, exclude):
+    """Tamanhos, casas decimais, escolhas e e-mail do modelo, sem consultar o banco."""
+    try:
+        registro.clean_fields(exclude=exclude)
+    except ValidationError as e:
+        raise ErroLinha('; '.join(f"'{campo}' {' '.join(msgs)}" for campo, msgs in e.message_dict.items()))
+    return registro
+
+
+def _escolha(linha, campo, choices, padrao=None):
+    valor = _texto(linha, campo, obrigatorio=padrao is None).upper() or padrao
+    if valor not in {c for c, _ in choices}:
+        raise ErroLinha(f"'{campo}' inválido: {valor}")
+    return valor
+
+
+# --- Mapas de cadastros ---
+
+def _mapas_cadastros():
+    """Resolve unidade/solicitante/centro de custo sem consultar o banco a cada linha."""
+    unidades = {}
+    for id_, abreviacao, cnpj in Unidade.objects.values_list('id', 'abreviacao', 'cnpj'):
+        unidades[abreviacao.upper()] = id_
+        unidades[cnpj] = id_
+    solicitantes = {}
+    for id_, nome, email in Solicitante.objects.values_list('id', 'nome', 'email'):
+        solicitantes[email.lower()] = id_
+        solicitantes.setdefault(nome.lower(), id_)
+    centros = dict(CentroCusto.objects.values_list('codigo', 'id'))
+    return unidades, solicitantes, centros
+
+
+def _resolver(mapa, chave, campo):
+    try:
+        return mapa[chave]
+    except KeyError:
+        raise ErroLinha(f"'{campo}' não cadastrado: {chave}")
+
+
+# --- Ordens de Compra ---
+
+def importar_ordens(arquivo, nome, tamanho_lote=TAMANHO_LOTE):
+    unidades, solicitantes, centros = _mapas_cadastros()
+    resultado = {'importadas': 0, 'erros': []}
+    lote = []
+    for numero, linha in ler_linhas(arquivo, nome):
+        try:
+            conta = _escolha(linha, 'conta_contabil', OrdemCompra.CONTA_CONTABIL_CHOICES)
+            status = _texto(linha, 'status', obrigatorio=False).upper() or 'SOLICITADO'
+            if status not in STATUS_IMPORTAVEIS:
+                raise ErroLinha(f"'status' inválido: {status}")
+            lote.append((numero, _validar(OrdemCompra(
+                numero_os=_texto(linha, 'numero_os'),
+                data_os=_data(linha, 'data_os'),
+                solicitante_id=_resolver(solicitantes, _texto(linha, 'solicitante').lower(), 'solicitante'),
+                setor_execucao=_texto(linha, 'setor_execucao'),
+                unidade_id=_resolver(unidades, _texto(linha, 'unidade').upper(), 'unidade'),
+                centro_custo_id=_resolver(centros, _texto(linha, 'centro_custo'), 'centro_custo'),
+                objetivo_compra=_escolha(linha, 'objetivo_compra', OrdemCompra.OBJETIVO_COMPRA_CHOICES),
+                especialidade=_escolha(linha, 'especialidade', OrdemCompra.ESPECIALIDADE_CHOICES),
+                conta_contabil=conta,
+                # bulk_create não chama save(): aplica a regra CAPEX/OPEX aqui
+                classificacao=OrdemCompra.classificar(conta),
+                tipo_contrato=_escolha(linha, 'tipo_contrato', OrdemCompra.TIPO_CONTRATO_CHOICES, 'SPOT'),
+                descricao_servico=_texto(linha, 'descricao_servico'),
+                justificativa=_texto(linha, 'justificativa'),
+                prioridade=_escolha(linha, 'prioridade', OrdemCompra.PRIORIDADE_CHOICES, 'MEDIA'),
+                fornecedor=_texto(linha, 'fornecedor'),
+                email_fornecedor=_texto(linha, 'email_fornecedor', obrigatorio=False) or None,
+                condicao_pagamento=_texto(linha, 'condicao_pagamento'),
+                valor_estimado=_decimal(linha, 'valor_estimado'),
+                anexo_orcamento=_texto(linha, 'anexo_orcamento', obrigatorio=False),
+                status=status,
+            ), EXCLUIR_VALIDACAO_OC)))
+        except ErroLinha as e:
+            resultado['erros'].append((numero, str(e)))
+        if len(lote) >= tamanho_lote:
+            _gravar_ordens(lote, resultado)
+            lote = []
+    _gravar_ordens(lote, resultado)
+    return resultado
+
+
+def _gravar_ordens(lote, resultado):
+    if not lote:
+        return
+    ordens = [oc for _, oc in lote]
+    try:
+        with transaction.atomic():
+            OrdemCompra.objects.bulk_create(ordens)
+            for status in {oc.status for oc in ordens}:
+                ResumoDashboard.mover_em_lote(
+                    [{'unidade_id': oc.unidade_id, 'data_criacao': oc.data_criacao, 'valor_estimado': oc.valor_estimado}
+                     for oc in ordens if oc.status == status],
+                    None, status)
+                HistoricoStatus.registrar([oc.pk for oc in ordens if oc.status == status], None, status,
+                                          observacao='Importação de planilha')
+            # Carga de histórico: compromete o orçamento sem bloquear as linhas acima do limite
+            ConsumoOrcamento.ajustar((oc.centro_custo_id, oc.data_os,
+                                      oc.valor_estimado if oc.status in ConsumoOrcamento.STATUS_ABERTOS else 0, 0)
+                                     for oc in ordens)
+            IndiceBusca.indexar_em_lote([oc.pk for oc in ordens])
+            cache_paginas.invalidar({oc.status for oc in ordens})
+    except Exception as e:
+        if len(lote) == 1:
+            resultado['erros'].append((lote[0][0], f"Linha não gravada: {e}"))
+            return
+        # Uma linha recusada pelo banco não leva as outras junto: regrava uma a uma
+        for numero, oc in lote:
+            oc.pk = None
+            _gravar_ordens([(numero, oc)], resultado)
+        return
+    resultado['importadas'] += len(ordens)
+
+
+# --- Notas Fiscais ---
+
+def importar_notas(arquivo, nome, usuario=None, tamanho_lote=TAMANHO_LOTE):
+    resultado = {'importadas': 0, 'erros': []}
+    lote = []
+    for numero, linha in ler_linhas(arquivo, nome):
+        try:
+            referencia = _texto(linha, 'ordem_compra', obrigatorio=False)
+            numero_os = _texto(linha, 'numero_os', obrigatorio=False)
+            if not (referencia or numero_os):
+                raise ErroLinha("informe 'ordem_compra' (id) ou 'numero_os'")
+            lote.append((numero, referencia, numero_os, _validar(NotaFiscal(
+                numero_nf=_texto(linha, 'numero_nf'),
+                numero_fluig=_texto(linha, 'numero_fluig', obrigatorio=False) or None,
+                data_emissao=_data(linha, 'data_emissao'),
+                data_vencimento=_data(linha, 'data_vencimento', obrigatorio=False),
+                valor_final=_decimal(linha, 'valor_final', obrigatorio=False),
+                tipo_lancamento=_escolha(linha, 'tipo_lancamento', NotaFiscal.TIPO_LANCAMENTO_CHOICES, 'FLUIG'),
+                plaqueta=_texto(linha, 'plaqueta', obrigatorio=False) or None,
+                arquivo_nf=_texto(linha, 'arquivo_nf', obrigatorio=False),
+                responsavel_lancamento=usuario,
+            ), EXCLUIR_VALIDACAO_NF)))
+        except ErroLinha as e:
+            resultado['erros'].append((numero, str(e)))
+        if len(lote) >= tamanho_lote:
+            _gravar_notas(lote, resultado)
+            lote = []
+    _gravar_notas(lote, resultado)
+    return resultado
+
+
+def _gravar_notas(lote, resultado):
+    if not lote:
+        return
+    erros = []
+    try:
+        with transaction.atomic():
+            # Uma consulta por lote para achar as OCs, travando as linhas
+            ids = [int(r) for _, r, _, _ in lote if r.isdigit()]
+            numeros = [n for _, r, n, _ in lote if not r]
+            candidatas = list(OrdemCompra.objects.select_for_update(of=('self',))
+                              .filter(Q(pk__in=ids) | Q(numero_os__in=numeros),
+                                      status='APROVADO', nota_fiscal__isnull=True)
+                              .values('id', 'numero_os', 'unidade_id', 'data_criacao', 'valor_estimado',
+                                      'centro_custo_id', 'data_os'))
+            por_id = {oc['id']: oc for oc in candidatas}
+            # numero_os não é único: mais de uma OC aprovada sem NF com o mesmo número é ambígua
+            por_numero = {}
+            for oc in candidatas:
+                por_numero.setdefault(oc['numero_os'], []).append(oc)
+
+            notas, usadas = [], {}
+            for numero, referencia, numero_os, nf in lote:
+                if referencia.isdigit():
+                    mesmo_numero, oc = [], por_id.get(int(referencia))
+                else:
+                    mesmo_numero = por_numero.get(numero_os, [])
+                    oc = mesmo_numero[0] if mesmo_numero else None
+                if len(mesmo_numero) > 1:
+                    erros.append((numero, f"numero_os '{numero_os}' ambíguo: {len(mesmo_numero)} OCs aprovadas "
+                                          f"sem NF (ids {', '.join(str(o['id']) for o in mesmo_numero)}); "
+                                          f"informe 'ordem_compra' (id)"))
+                elif not oc:
+                    erros.append((numero, f"OC '{referencia or numero_os}' não encontrada, não aprovada ou já com NF"))
+                elif oc['id'] in usadas:
+                    erros.append((numero, f"OC '{referencia or numero_os}' repetida no arquivo (linha {usadas[oc['id']]})"))
+                else:
+                    usadas[oc['id']] = numero
+                    nf.ordem_compra_id = oc['id']
+                    notas.append(nf)
+                    oc['valor_realizado'] = nf.valor_final
+
+            NotaFiscal.objects.bulk_create(notas)
+            # Um único UPDATE no lugar do OrdemCompra.save() por NF feito por NotaFiscal.save()
+            ids_oc = list(usadas)
+            OrdemCompra.objects.filter(pk__in=ids_oc).update(status='CONCLUIDO', data_atualizacao=timezone.now())
+            concluidas = [oc for oc in candidatas if oc['id'] in usadas]
+            ResumoDashboard.mover_em_lote(concluidas, 'APROVADO', 'CONCLUIDO')
+            ConsumoOrcamento.mover(concluidas, 'APROVADO', 'CONCLUIDO')
+            HistoricoStatus.registrar(ids_oc, 'APROVADO', 'CONCLUIDO', lote[0][3].responsavel_lancamento,
+                                      'Importação de NF')
+            IndiceBusca.indexar_em_lote(ids_oc)
+            cache_paginas.invalidar(['APROVADO', 'CONCLUIDO'], nf=True)
+    except Exception as e:
+        if len(lote) == 1:
+            resultado['erros'].append((lote[0][0], f"Linha não gravada: {e}"))
+            return
+        # Uma linha recusada pelo banco não leva as outras junto: regrava uma a uma
+        for item in lote:
+            item[3].pk = None
+            _gravar_notas([item], resultado)
+        return
+    resultado['erros'] += erros
+    resultado['importadas'] += len(notas)
@@ -0,0 +1,199 @@
+"""
+Inicialização a frio do lambda da Vercel (pweb/wsgi.py): cada instância nova
+importa Django, apps, middlewares e URLs antes de responder a primeira
+requisição.
+
+Com settings.INICIALIZACAO_RAPIDA:
+- o admin entra como SimpleAdminConfig (sem autodiscover no setup) e as rotas
+  de /admin/ só são montadas no primeiro acesso a elas (AdminSobDemanda);
+- depois da primeira resposta uma thread importa o WeasyPrint e renderiza um
+  documento mínimo com as fontes do PDF da OC: a configuração de fontes
+  (fontconfig) e a folha de estilos padrão já estão carregadas quando o
+  primeiro PDF de verdade for pedido. Entre invocações a Vercel congela o
+  processo; a thread continua quando ele volta.
+
+`python -X importtime -m home.inicializacao <caminho>` mede uma inicialização
+num interpretador novo (usado pelo comando perfil_inicializacao e pelo teste
+de regressão). Por isso este módulo só importa a biblioteca padrão no topo.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Módulos que o modo rápido deixa fora da inicialização
+ADIADOS = ('home.admin', 'django.contrib.auth.admin', 'weasyprint')
+# Escrito no stderr quando a primeira resposta termina: o que o -X importtime
+# mostrar depois disso (aquecimento em segundo plano) não conta
+MARCA_FIM = 'perfil-inicializacao:fim'
+
+
+class AdminSobDemanda:
+    """
+    Usado no lugar de admin.site.urls em pweb/urls.py. O reverse() de rotas
+    fora do admin não desce em namespaces, então `urlpatterns` só é lido
+    quando uma URL /admin/ é resolvida ou um reverse('admin:...') é feito.
+    """
+    _lock = threading.Lock()
+    _rotas = None
+
+    @property
+    def urlpatterns(self):
+        with self._lock:
+            if self._rotas is None:
+                from django.contrib import admin
+                admin.autodiscover()
+                type(self)._rotas = admin.site.get_urls()
+        return self._rotas
+
+
+# --- Aquecimento do WeasyPrint ---
+
+HTML_AQUECIMENTO = (
+    "<html><body style=\"font-family: 'Helvetica', sans-serif\"><p>.</p>"
+    "<p style=\"font-family: 'Courier New', monospace\">.</p></body></html>"
+)
+
+_aquecimento_iniciado = threading.Event()
+
+
+def aquecer_pdf():
+    inicio = time.perf_counter()
+    try:
+        from weasyprint import HTML
+        HTML(string=HTML_AQUECIMENTO).write_pdf()
+    except (ImportError, OSError):
+        # Sem WeasyPrint (ou sem as bibliotecas nativas) o PDF já cai no tratamento de gerar_pdf_ordem_compra
+        logger.info("Aquecimento do WeasyPrint ignorado: biblioteca indisponível")
+        return
+    logger.info("WeasyPrint aquecido em %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+
+def agendar_aquecimento(sender=None, **kwargs):
+    """Receptor de request_finished: dispara o aquecimento uma vez, depois da primeira resposta."""
+    if _aquecimento_iniciado.is_set():
+        return
+    _aquecimento_iniciado.set()
+    from django.core.signals import request_finished
+    request_finished.disconnect(dispatch_uid='inicializacao_aquecer_pdf')
+    threading.Thread(target=aquecer_pdf, name='aquecer-pdf', daemon=True).start()
+
+
+# --- Medição (roda num interpretador novo) ---
+
+def _medir(caminho):
+    """Sobe o Django como o pweb/wsgi.py, responde `caminho` e devolve os tempos de cada fase."""
+    relogio = time.perf_counter
+    fases = {}
+    por_app = {}
+    inicio = relogio()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pweb.settings')
+    from django.apps.config import AppConfig
+    from django.conf import settings
+    fases['django'] = relogio() - inicio
+
+    t = relogio()
+    settings.INSTALLED_APPS
+    fases['settings'] = relogio() - t
+
+    # Fase 1 do apps.populate: create() importa o módulo de cada app; fase 2:
+    # import_models(); fase 3: ready(), medido por um wrapper na instância
+    criar_original = AppConfig.create.__func__
+    importar_modelos_original = AppConfig.import_models
+
+    def create(cls, entrada):
+        t = relogio()
+        config = criar_original(cls, entrada)
+        por_app[entrada] = {'app': config.name, 'importacao': relogio() - t}
+        config._entrada_perfil = entrada
+        return config
+
+    def import_models(self):
+        t = relogio()
+        importar_modelos_original(self)
+        medida = por_app[self._entrada_perfil]
+        medida['modelos'] = relogio() - t
+        ready_original = self.ready
+
+        def ready():
+            t = relogio()
+            ready_original()
+            medida['ready'] = relogio() - t
+        self.ready = ready
+
+    AppConfig.create = classmethod(create)
+    AppConfig.import_models = import_models
+    # O mesmo que django.setup(set_prefix=False), em duas fases
+    from django.apps import apps
+    from django.utils.log import configure_logging
+    t = relogio()
+    configure_logging(settings.LOGGING_CONFIG, settings.LOGGING)
+    fases['logging'] = relogio() - t
+    t = relogio()
+    apps.populate(settings.INSTALLED_APPS)
+    fases['apps'] = relogio() - t
+
+    from django.core.handlers.wsgi import WSGIHandler
+    t = relogio()
+    aplicacao = WSGIHandler()
+    fases['middlewares'] = relogio() - t
+
+    import io
+    status = []
+    t = relogio()
+    resposta = aplicacao({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': caminho, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+    }, lambda s, cabecalhos, exc_info=None: status.append(s))
+    b''.join(resposta)
+    fases['primeira_requisicao'] = relogio() - t
+    total = relogio() - inicio
+    carregados = [m for m in ADIADOS if m in sys.modules]
+    print(MARCA_FIM, file=sys.stderr, flush=True)
+    resposta.close()
+    return {
+        'rapida': settings.INICIALIZACAO_RAPIDA,
+        'caminho': caminho,
+        'status': status[0] if status else None,
+        'total': total,
+        'fases': fases,
+        'apps': por_app,
+        'adiados_carregados': carregados,
+    }
+
+
+def executar_medicao(caminho, rapida, importtime=False):
+    """
+    Mede a inicialização num subprocesso. Devolve (resultado, linhas do
+    -X importtime até o fim da primeira resposta).
+    """
+    import subprocess
+
+    from django.conf import settings
+
+    ambiente = dict(os.environ, INICIALIZACAO_RAPIDA='1' if rapida else '0')
+    comando = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-m', __name__, caminho]
+    processo = subprocess.run(comando, cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True)
+    if processo.returncode != 0:
+        raise RuntimeError(f"Medição da inicialização falhou:\n{processo.stderr[-3000:]}")
+    linhas = []
+    for linha in processo.stderr.splitlines():
+        if linha == MARCA_FIM:
+            break
+        linhas.append(linha)
+    return json.loads(processo.stdout.strip().splitlines()[-1]), linhas
+
+
+if __name__ == '__main__':
+    resultado = _medir(sys.argv[1] if len(sys.argv) > 1 else '/')
+    print(json.dumps(resultado))
+    sys.stdout.flush()
+    # Sem esperar o aquecimento em segundo plano nem os finalizadores
+    os._exit(0)
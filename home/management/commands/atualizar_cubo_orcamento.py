@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.models import CuboOrcamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza o cubo Orçado x Realizado com as OCs alteradas desde a última execução "
+        "(agendar no cron). Use --reconstruir para recalcular tudo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help="Recalcula o cubo do zero.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reconstruir']:
+            lidas = CuboOrcamento.reconstruir()
+        else:
+            lidas = CuboOrcamento.atualizar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cubo atualizado: {lidas} OC(s) processada(s) em {time.perf_counter() - inicio:.2f}s."
+        ))
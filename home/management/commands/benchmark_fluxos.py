@@ -0,0 +1,139 @@
+import json
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from home.models import CentroCusto, NotaFiscal, OrdemCompra, Solicitante, Unidade
+from home.utils import gerar_pdf_ordem_compra
+
+
+def percentil(amostras, p):
+    ordenadas = sorted(amostras)
+    indice = min(len(ordenadas) - 1, max(0, round(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p95/p99) e número de consultas dos fluxos principais "
+        "com o Django test client e compara com uma baseline gravada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o resultado.")
+        parser.add_argument('--baseline', help="JSON de uma execução anterior para comparação.")
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help="Aumento relativo do p95 aceito antes de acusar regressão.")
+        parser.add_argument('--sem-pdf', action='store_true', help="Não mede a geração de PDF.")
+
+    def handle(self, *args, **options):
+        oc_pendente = OrdemCompra.objects.filter(status='SOLICITADO').order_by('-id').first()
+        # O PDF imprime o aprovador: precisa de uma OC aprovada de fato
+        oc_aprovada = (OrdemCompra.objects.select_related('unidade', 'solicitante', 'centro_custo', 'aprovado_por')
+                       .filter(status__in=['APROVADO', 'CONCLUIDO'], aprovado_por__isnull=False)
+                       .order_by('-id').first())
+        unidade = Unidade.objects.first()
+        solicitante = Solicitante.objects.first()
+        centro = CentroCusto.objects.first()
+        if not (oc_pendente and oc_aprovada and unidade and solicitante and centro):
+            raise CommandError("Base sem dados suficientes. Rode antes: manage.py gerar_dados_sinteticos")
+
+        self.client = Client(HTTP_HOST='localhost')
+        self.repeticoes = options['repeticoes']
+
+        cenarios = {
+            'index': lambda: self.client.get(reverse('index')),
+            'lista_pendencias': lambda: self.client.get(reverse('lista_pendencias')),
+            'lista_notasfiscais': lambda: self.client.get(reverse('lista_notasfiscais')),
+            'ajax_get_cnpj': lambda: self.client.get(reverse('ajax_get_cnpj'), {'unidade_id': unidade.id}),
+            'ajax_get_solicitante': lambda: self.client.get(reverse('ajax_get_solicitante'), {'solicitante_id': solicitante.id}),
+            'ajax_get_oc_detalhes': lambda: self.client.get(reverse('ajax_get_oc_detalhes'), {'oc_id': oc_aprovada.id}),
+            'solicitacao_nova': lambda: self.client.post(reverse('solicitacao_nova'), {
+                'numero_os': 'BENCH-1', 'data_os': '2025-01-15', 'solicitante': solicitante.id,
+                'setor_execucao': 'Manutenção', 'unidade': unidade.id, 'centro_custo': centro.id,
+                'objetivo_compra': 'MATERIAL', 'especialidade': 'ELETRICA', 'conta_contabil': 'MANUT_PREDIAL',
+                'descricao_servico': 'Benchmark', 'justificativa': 'Benchmark', 'prioridade': 'MEDIA',
+                'fornecedor': 'Fornecedor Benchmark', 'condicao_pagamento': '30 dias',
+                'valor_estimado': '100.00', 'tipo_contrato': 'SPOT',
+                'anexo_orcamento': SimpleUploadedFile('orcamento.pdf', b'%PDF-1.4 benchmark'),
+            }),
+            'aprovacao': lambda: self.client.post(
+                reverse('detalhe_aprovacao', args=[oc_pendente.id]), {'acao': 'aprovar'}),
+        }
+        if not options['sem_pdf']:
+            cenarios['gerar_pdf'] = lambda: gerar_pdf_ordem_compra(oc_aprovada, usar_cache=False)
+
+        resultado = {}
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with transaction.atomic():
+                usuario = User.objects.create_superuser('benchmark_fluxos', 'benchmark@exemplo.com', None)
+                self.client.force_login(usuario)
+                for nome, cenario in cenarios.items():
+                    resultado[nome] = self.medir(cenario)
+                    self.stdout.write(
+                        f"{nome:<24} p50={resultado[nome]['p50_ms']:>8.1f}ms "
+                        f"p95={resultado[nome]['p95_ms']:>8.1f}ms consultas={resultado[nome]['consultas']}"
+                    )
+                # Nada do que o benchmark gravou fica na base
+                transaction.set_rollback(True)
+
+        dados = {
+            'ordens': OrdemCompra.objects.count(),
+            'notas_fiscais': NotaFiscal.objects.count(),
+            'repeticoes': self.repeticoes,
+            'cenarios': resultado,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w') as f:
+                json.dump(dados, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['cenarios']
+            regressoes = self.comparar(resultado, baseline, options['tolerancia'])
+            if regressoes:
+                raise CommandError("Regressões de desempenho:\n" + "\n".join(regressoes))
+            self.stdout.write(self.style.SUCCESS("Nenhuma regressão em relação à baseline."))
+
+    def medir(self, cenario):
+        """Executa o cenário N vezes, cada uma dentro de um savepoint desfeito ao final."""
+        tempos, consultas, status = [], [], None
+        for _ in range(self.repeticoes):
+            sid = transaction.savepoint()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                resposta = cenario()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            transaction.savepoint_rollback(sid)
+            consultas.append(len(capturadas))
+            status = getattr(resposta, 'status_code', status)
+        return {
+            'p50_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(percentil(tempos, 95), 2),
+            'p99_ms': round(percentil(tempos, 99), 2),
+            'max_ms': round(max(tempos), 2),
+            'consultas': max(consultas),
+            'status_http': status,
+        }
+
+    def comparar(self, atual, baseline, tolerancia):
+        regressoes = []
+        for nome, medida in atual.items():
+            anterior = baseline.get(nome)
+            if not anterior:
+                continue
+            if medida['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+                regressoes.append(f"  {nome}: p95 {anterior['p95_ms']}ms -> {medida['p95_ms']}ms")
+            if medida['consultas'] > anterior['consultas']:
+                regressoes.append(f"  {nome}: consultas {anterior['consultas']} -> {medida['consultas']}")
+        return regressoes
@@ -0,0 +1,105 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from home.banco.pool import PADROES, PoolMixin, estatisticas_pools, fechar_pools
+
+from .benchmark_fluxos import percentil
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a latência da lista de pendências (ListaPendenciasView) com e sem o pool de "
+        "conexões. Como em produção, a conexão é fechada no fim de cada requisição (CONN_MAX_AGE=0). "
+        "Com o SQLite local, --latencia-conexao-ms simula o handshake SSL do Postgres remoto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=200)
+        parser.add_argument('--latencia-conexao-ms', type=float, default=None,
+                            help="Espera somada a cada conexão aberta (padrão: 30 no SQLite, 0 no Postgres).")
+        parser.add_argument('--pool-max', type=int, default=PADROES['MAX'])
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o resultado.")
+
+    def handle(self, *args, **options):
+        if not isinstance(connections[DEFAULT_DB_ALIAS], PoolMixin):
+            raise CommandError("ENGINE do banco 'default' não é um backend de home.banco (ver pweb/settings.py).")
+        latencia = options['latencia_conexao_ms']
+        if latencia is None:
+            latencia = 30 if connection.vendor == 'sqlite' else 0
+        self.latencia = latencia / 1000
+        self.aberturas = 0
+        self.repeticoes = options['repeticoes']
+        self.client = Client(HTTP_HOST='localhost')
+        self.url = reverse('lista_pendencias')
+
+        pool_configurado = connection.settings_dict.get('POOL')
+        idade_configurada = connection.settings_dict['CONN_MAX_AGE']
+        abrir_original = PoolMixin._abrir_conexao
+        comando = self
+
+        def abrir_com_latencia(self, conn_params):
+            comando.aberturas += 1
+            time.sleep(comando.latencia)
+            return abrir_original(self, conn_params)
+
+        resultado = {}
+        PoolMixin._abrir_conexao = abrir_com_latencia
+        try:
+            # Cada requisição precisa ir ao banco: sem o cache de páginas
+            with override_settings(CACHE_PAGINAS_ATIVO=False):
+                for modo, pool in (('sem_pool', None),
+                                   ('pool', {**PADROES, **(pool_configurado or {}), 'MAX': options['pool_max']})):
+                    resultado[modo] = self.medir(pool)
+                    medida = resultado[modo]
+                    self.stdout.write(
+                        f"{modo:<9} p50={medida['p50_ms']:>7.1f}ms  p95={medida['p95_ms']:>7.1f}ms  "
+                        f"p99={medida['p99_ms']:>7.1f}ms  conexões abertas={medida['conexoes_abertas']}"
+                        + (f"  pool={medida['pool']}" if medida.get('pool') else ''))
+        finally:
+            PoolMixin._abrir_conexao = abrir_original
+            connection.close()
+            fechar_pools()
+            connection.settings_dict.update(POOL=pool_configurado, CONN_MAX_AGE=idade_configurada)
+
+        ganho = 1 - resultado['pool']['p95_ms'] / resultado['sem_pool']['p95_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f"p95 com pool: {ganho * 100:.0f}% menor (latência de conexão simulada: {latencia:.0f} ms)"))
+        if options['saida']:
+            with open(options['saida'], 'w') as f:
+                json.dump({'latencia_conexao_ms': latencia, 'repeticoes': self.repeticoes, **resultado}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+    def medir(self, pool):
+        connection.close()
+        fechar_pools()
+        connection.settings_dict.update(POOL=pool, CONN_MAX_AGE=0)
+        self.aberturas = 0
+        tempos = []
+        for _ in range(self.repeticoes + 1):
+            inicio = time.perf_counter()
+            resposta = self.client.get(self.url)
+            # O test client não dispara o close_old_connections do request_finished; o servidor dispara
+            close_old_connections()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            if resposta.status_code != 200:
+                raise CommandError(f"{self.url} respondeu {resposta.status_code}")
+        # A primeira requisição abre o pool: o que interessa é o regime
+        tempos = tempos[1:]
+        medida = {
+            'p50_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(percentil(tempos, 95), 2),
+            'p99_ms': round(percentil(tempos, 99), 2),
+            'conexoes_abertas': self.aberturas,
+        }
+        if pool:
+            estatisticas = dict(estatisticas_pools()).get(connection.alias, {})
+            medida['pool'] = {k: estatisticas[k] for k in ('aquisicoes', 'reutilizadas', 'criadas', 'esperas',
+                                                             'reconexoes')}
+        return medida
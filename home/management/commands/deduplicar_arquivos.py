@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from home.armazenamento import DeduplicacaoMixin, PREFIXO_BLOBS, eh_blob
+from home.models import ArquivoBlob, NotaFiscal, OrdemCompra
+
+CAMPOS = [(OrdemCompra, 'anexo_orcamento'), (NotaFiscal, 'arquivo_nf')]
+
+
+class Command(BaseCommand):
+    help = (
+        "Migra orçamentos e NFs já gravados para o armazenamento deduplicado: "
+        "recalcula o SHA-256 de cada arquivo, grava cada conteúdo uma vez e "
+        "recalcula a contagem de referências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Só mostra o que seria feito.")
+        parser.add_argument('--manter-originais', action='store_true',
+                            help="Não apaga os arquivos antigos depois de migrados.")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, DeduplicacaoMixin):
+            raise CommandError("O storage padrão não é deduplicado: ajuste ARMAZENAMENTO_BACKEND.")
+
+        antigos = set()
+        for modelo, campo in CAMPOS:
+            antigos.update(modelo.objects.exclude(**{f'{campo}__startswith': PREFIXO_BLOBS + '/'})
+                           .exclude(**{campo: ''}).values_list(campo, flat=True).distinct())
+        self.stdout.write(f"{len(antigos)} arquivo(s) fora do armazenamento deduplicado.")
+
+        migrados = ausentes = 0
+        for nome in sorted(antigos):
+            if not default_storage.exists(nome):
+                ausentes += 1
+                self.stderr.write(f"  ausente: {nome}")
+                continue
+            if options['simular']:
+                migrados += 1
+                continue
+            with transaction.atomic():
+                with default_storage.open(nome, 'rb') as arquivo:
+                    novo = default_storage.save(nome, arquivo)
+                for modelo, campo in CAMPOS:
+                    modelo.objects.filter(**{campo: nome}).update(**{campo: novo})
+            if not options['manter_originais']:
+                # Não é blob: o delete do storage apaga direto
+                default_storage.delete(nome)
+            migrados += 1
+
+        if options['simular']:
+            self.stdout.write(f"Seriam migrados {migrados} arquivo(s); {ausentes} ausente(s).")
+            return
+        corrigidos, removidos = self.recontar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrados: {migrados}; ausentes: {ausentes}; contagens corrigidas: {corrigidos}; "
+            f"blobs órfãos removidos: {removidos}."
+        ))
+
+    def recontar(self):
+        """Refaz ArquivoBlob.referencias a partir das colunas e apaga os blobs sem uso, com ou sem linha."""
+        usos = Counter()
+        for modelo, campo in CAMPOS:
+            nomes = (modelo.objects.filter(**{f'{campo}__startswith': PREFIXO_BLOBS + '/'})
+                     .values_list(campo, flat=True).iterator(chunk_size=5000))
+            usos.update(nomes)
+
+        corrigidos = removidos = 0
+        for blob in ArquivoBlob.objects.iterator(chunk_size=2000):
+            total = usos.pop(blob.nome, 0)
+            if total == 0:
+                # Última referência: o storage apaga a linha e o arquivo
+                ArquivoBlob.objects.filter(pk=blob.pk).update(referencias=1)
+                default_storage.delete(blob.nome)
+                removidos += 1
+            elif total != blob.referencias:
+                ArquivoBlob.objects.filter(pk=blob.pk).update(referencias=total)
+                corrigidos += 1
+        # Blob referenciado mas sem linha (ex.: gravado por fora): recria a contagem
+        for nome, total in usos.items():
+            if eh_blob(nome) and default_storage.exists(nome):
+                sha256 = nome.rsplit('/', 1)[-1].split('.', 1)[0]
+                ArquivoBlob.objects.create(nome=nome, sha256=sha256, tamanho=default_storage.size(nome),
+                                           referencias=total)
+                corrigidos += 1
+        # Arquivo sem linha nem uso (upload desfeito por rollback): só aparece listando o storage
+        removidos += default_storage.varrer_blobs_orfaos()
+        return corrigidos, removidos
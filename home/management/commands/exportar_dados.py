@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.exportacao import consulta_exportacao, gravar_xlsx, linhas_csv
+
+
+class Command(BaseCommand):
+    help = "Exporta Ordens de Compra + Notas Fiscais (conciliação financeira) em CSV ou XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--saida', help="Arquivo de destino (padrão: saída padrão, só CSV).")
+        parser.add_argument('--inicio', help="Data OS inicial (AAAA-MM-DD).")
+        parser.add_argument('--fim', help="Data OS final (AAAA-MM-DD).")
+        parser.add_argument('--unidade', help="ID ou sigla da unidade.")
+        parser.add_argument('--status', help="Um ou mais status separados por vírgula.")
+
+    def handle(self, *args, **options):
+        try:
+            consulta = consulta_exportacao(options['inicio'], options['fim'], options['unidade'], options['status'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['formato'] == 'xlsx':
+            if not options['saida']:
+                raise CommandError("Informe --saida para exportar XLSX.")
+            try:
+                gravar_xlsx(consulta, options['saida'])
+            except ImportError:
+                raise CommandError("Exportação XLSX indisponível: instale o pacote 'openpyxl'.")
+        elif options['saida']:
+            with open(options['saida'], 'wb') as destino:
+                for pedaco in linhas_csv(consulta):
+                    destino.write(pedaco)
+        else:
+            for pedaco in linhas_csv(consulta):
+                sys.stdout.buffer.write(pedaco)
+            sys.stdout.buffer.flush()
+        if options['saida']:
+            self.stdout.write(self.style.SUCCESS(f"Exportação gravada em {options['saida']}"))
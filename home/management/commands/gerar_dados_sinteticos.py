@@ -0,0 +1,162 @@
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home import cache_paginas
+from home.models import CentroCusto, ConsumoOrcamento, CuboOrcamento, HistoricoStatus, IndiceBusca, NotaFiscal, OrdemCompra, ResumoDashboard, Solicitante, Unidade
+
+FORNECEDORES = [
+    'Eletro Norte Ltda', 'Hidro Serviços', 'Clima Frio Refrigeração', 'Med Gases SA',
+    'Construtora Alvorada', 'Tecno Clínica', 'Manutenção Total', 'Utilidades Ceará',
+    'Ferragens Central', 'Engemed Equipamentos',
+]
+SERVICOS = [
+    'Troca de quadro elétrico', 'Reparo em tubulação', 'Manutenção de chiller',
+    'Recarga de oxigênio', 'Reforma de enfermaria', 'Calibração de monitores',
+    'Pintura de fachada', 'Substituição de bombas', 'Revisão do gerador',
+]
+
+
+class Command(BaseCommand):
+    help = "Gera cadastros, Ordens de Compra e Notas Fiscais sintéticas em massa (bulk_create)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ordens', type=int, default=1000)
+        parser.add_argument('--unidades', type=int, default=10)
+        parser.add_argument('--solicitantes', type=int, default=200)
+        parser.add_argument('--centros-custo', type=int, default=50)
+        parser.add_argument('--proporcao-nf', type=float, default=0.4,
+                            help="Fração das ordens que recebe Nota Fiscal (ficam CONCLUIDO).")
+        parser.add_argument('--meses', type=int, default=24, help="Janela de datas das OS, em meses.")
+        parser.add_argument('--lote', type=int, default=5000, help="Linhas por bulk_create.")
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semente'])
+        lote = options['lote']
+        sufixo = rnd.randrange(10 ** 6)
+
+        with transaction.atomic():
+            unidades = Unidade.objects.bulk_create([
+                Unidade(abreviacao=f"U{sufixo % 1000}{i}", nome=f"Unidade {i} ({sufixo})",
+                        razao_social=f"Unidade {i} Serviços de Saúde SA",
+                        cnpj=f"{rnd.randrange(10**8):08d}/0001-{i % 100:02d}")
+                for i in range(options['unidades'])
+            ])
+            centros = CentroCusto.objects.bulk_create([
+                CentroCusto(codigo=f"S{sufixo}-{i}", descricao=f"Centro de Custo {i}")
+                for i in range(options['centros_custo'])
+            ])
+            solicitantes = Solicitante.objects.bulk_create([
+                Solicitante(nome=f"Solicitante {i}", cargo='Técnico', email=f"solicitante{i}@exemplo.com",
+                            telefone=f"(85) 9{rnd.randrange(10**8):08d}")
+                for i in range(options['solicitantes'])
+            ])
+        # Aprovador e responsável pelas NFs sintéticas (o PDF da OC imprime o aprovador)
+        usuario, criado = User.objects.get_or_create(
+            username='aprovador_sintetico', defaults={'first_name': 'Aprovador', 'last_name': 'Sintético'})
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+
+        contas = [c for c, _ in OrdemCompra.CONTA_CONTABIL_CHOICES]
+        objetivos = [c for c, _ in OrdemCompra.OBJETIVO_COMPRA_CHOICES]
+        especialidades = [c for c, _ in OrdemCompra.ESPECIALIDADE_CHOICES]
+        prioridades = [c for c, _ in OrdemCompra.PRIORIDADE_CHOICES]
+        inicio = date.today() - timedelta(days=30 * options['meses'])
+
+        criadas = notas = 0
+        restantes = options['ordens']
+        while restantes > 0:
+            tamanho = min(lote, restantes)
+            ordens, com_nf = [], []
+            for _ in range(tamanho):
+                conta = rnd.choice(contas)
+                recebe_nf = rnd.random() < options['proporcao_nf']
+                status = 'CONCLUIDO' if recebe_nf else rnd.choices(
+                    ['RASCUNHO', 'SOLICITADO', 'APROVADO', 'REPROVADO'], weights=[1, 4, 4, 1])[0]
+                aprovada = status in ('APROVADO', 'CONCLUIDO')
+                data_os = inicio + timedelta(days=rnd.randrange(30 * options['meses']))
+                ordens.append(OrdemCompra(
+                    numero_os=f"OS-{data_os:%Y%m}-{criadas + len(ordens):07d}",
+                    data_os=data_os,
+                    solicitante=rnd.choice(solicitantes),
+                    setor_execucao='Manutenção',
+                    unidade=rnd.choice(unidades),
+                    centro_custo=rnd.choice(centros),
+                    objetivo_compra=rnd.choice(objetivos),
+                    especialidade=rnd.choice(especialidades),
+                    conta_contabil=conta,
+                    # bulk_create não chama save(): aplica a regra CAPEX/OPEX aqui
+                    classificacao=OrdemCompra.classificar(conta),
+                    descricao_servico=rnd.choice(SERVICOS),
+                    justificativa='Carga sintética para testes de desempenho.',
+                    prioridade=rnd.choice(prioridades),
+                    fornecedor=rnd.choice(FORNECEDORES),
+                    condicao_pagamento='30 dias',
+                    valor_estimado=Decimal(rnd.randrange(5000, 5000000)) / 100,
+                    anexo_orcamento='orcamentos/sintetico.pdf',
+                    status=status,
+                    aprovado_por=usuario if aprovada else None,
+                    data_aprovacao=data_os if aprovada else None,
+                ))
+                com_nf.append(recebe_nf)
+
+            with transaction.atomic():
+                OrdemCompra.objects.bulk_create(ordens, batch_size=1000)
+                nfs = [
+                    NotaFiscal(
+                        ordem_compra=oc,
+                        numero_nf=f"{rnd.randrange(10**6):06d}",
+                        data_emissao=oc.data_os + timedelta(days=rnd.randrange(1, 30)),
+                        data_vencimento=oc.data_os + timedelta(days=rnd.randrange(30, 60)),
+                        valor_final=(oc.valor_estimado * Decimal(rnd.uniform(0.9, 1.1))).quantize(Decimal('0.01')),
+                        arquivo_nf='notas_fiscais/sintetico.pdf',
+                        responsavel_lancamento=usuario,
+                    )
+                    for oc, recebe_nf in zip(ordens, com_nf) if recebe_nf
+                ]
+                NotaFiscal.objects.bulk_create(nfs, batch_size=1000)
+                HistoricoStatus.objects.bulk_create(self.historico(rnd, ordens, usuario), batch_size=5000)
+
+            criadas += tamanho
+            notas += len(nfs)
+            restantes -= tamanho
+            self.stdout.write(f"  {criadas} ordens / {notas} notas...")
+
+        # bulk_create não passa pelo save(): recalcula o Dashboard, o índice de busca, o cubo e o orçamento
+        ResumoDashboard.reconstruir()
+        IndiceBusca.reconstruir()
+        CuboOrcamento.reconstruir()
+        ConsumoOrcamento.reconstruir()
+        cache_paginas.invalidar_tudo()
+        self.stdout.write(self.style.SUCCESS(
+            f"Gerados: {len(unidades)} unidades, {len(centros)} centros de custo, "
+            f"{len(solicitantes)} solicitantes, {criadas} ordens, {notas} notas fiscais."
+        ))
+
+    def historico(self, rnd, ordens, usuario):
+        """Eventos de status coerentes com o status final de cada OC sintética."""
+        caminhos = {
+            'RASCUNHO': ['RASCUNHO'],
+            'SOLICITADO': ['SOLICITADO'],
+            'APROVADO': ['SOLICITADO', 'APROVADO'],
+            'REPROVADO': ['SOLICITADO', 'REPROVADO'],
+            'CONCLUIDO': ['SOLICITADO', 'APROVADO', 'CONCLUIDO'],
+        }
+        eventos = []
+        for oc in ordens:
+            momento = datetime.combine(oc.data_os, time(8))
+            de = None
+            for para in caminhos[oc.status]:
+                eventos.append(HistoricoStatus(
+                    ordem_compra_id=oc.pk, de=HistoricoStatus.CODIGOS.get(de), para=HistoricoStatus.CODIGOS[para],
+                    usuario=usuario if de else None, momento=momento,
+                ))
+                de = para
+                momento += timedelta(hours=rnd.randrange(1, 24 * 10))
+        return eventos
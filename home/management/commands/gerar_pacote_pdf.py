@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.pacote_pdf import PROCESSOS_PADRAO, gerar_zip, ids_pacote
+
+
+class Command(BaseCommand):
+    help = "Gera um ZIP com os PDFs das Ordens de Compra filtradas e um manifesto (id, hash_audit, SHA-256)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('saida', help="Arquivo .zip de destino.")
+        parser.add_argument('--inicio', help="Data OS inicial (AAAA-MM-DD).")
+        parser.add_argument('--fim', help="Data OS final (AAAA-MM-DD).")
+        parser.add_argument('--unidade', help="ID ou sigla da unidade.")
+        parser.add_argument('--status', help="Status separados por vírgula (padrão: APROVADO,CONCLUIDO).")
+        parser.add_argument('--processos', type=int, default=PROCESSOS_PADRAO,
+                            help="Processos renderizando em paralelo.")
+
+    def handle(self, *args, **options):
+        try:
+            ids = ids_pacote(options['inicio'], options['fim'], options['unidade'], options['status'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not ids:
+            raise CommandError("Nenhuma Ordem de Compra encontrada para os filtros informados.")
+
+        self.stdout.write(f"Gerando {len(ids)} PDF(s) com {options['processos']} processo(s)...")
+        inicio = time.perf_counter()
+        tamanho = 0
+        with open(options['saida'], 'wb') as destino:
+            for pedaco in gerar_zip(ids, options['processos']):
+                destino.write(pedaco)
+                tamanho += len(pedaco)
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['saida']}: {tamanho / 1024 / 1024:.1f} MB em {time.perf_counter() - inicio:.1f}s "
+            f"(veja manifesto.csv para as OCs com erro)."
+        ))
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from home.importacao import ErroLinha, TAMANHO_LOTE, importar_notas, importar_ordens
+
+
+class Command(BaseCommand):
+    help = "Importa Ordens de Compra ou Notas Fiscais de um arquivo CSV/XLSX, em lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=['ordens', 'notas'])
+        parser.add_argument('arquivo')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Linhas por bulk_create.")
+        parser.add_argument('--usuario', help="Username gravado como responsável pelas NFs.")
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if not usuario:
+                raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                if options['tipo'] == 'ordens':
+                    resultado = importar_ordens(arquivo, options['arquivo'], tamanho_lote=options['lote'])
+                else:
+                    resultado = importar_notas(arquivo, options['arquivo'], usuario=usuario, tamanho_lote=options['lote'])
+        except (OSError, ErroLinha) as e:
+            raise CommandError(str(e))
+
+        for linha, erro in resultado['erros']:
+            self.stderr.write(f"Linha {linha}: {erro}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['importadas']} registro(s) importado(s), {len(resultado['erros'])} erro(s)."
+        ))
@@ -0,0 +1,108 @@
+import json
+import re
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.inicializacao import executar_medicao
+
+# "import time:   self [us] | cumulative | imported package"
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def ler_importtime(linhas):
+    """[(modulo, segundos_proprios, segundos_acumulados, profundidade)] na ordem do -X importtime."""
+    modulos = []
+    for linha in linhas:
+        casamento = LINHA_IMPORTTIME.match(linha)
+        if casamento:
+            proprio, acumulado, recuo, nome = casamento.groups()
+            modulos.append((nome, int(proprio) / 1e6, int(acumulado) / 1e6, len(recuo) // 2))
+    return modulos
+
+
+def agrupar(modulos, pacotes_apps):
+    """Soma o tempo próprio de importação por app instalado (pelo pacote) ou por pacote de topo."""
+    pacotes = sorted(pacotes_apps, key=len, reverse=True)
+    grupos = {}
+    for nome, proprio, _, _ in modulos:
+        grupo = next((p for p in pacotes if nome == p or nome.startswith(p + '.')), None)
+        if grupo is None:
+            partes = nome.split('.')
+            grupo = '.'.join(partes[:2]) if partes[0] == 'django' else partes[0]
+        grupos[grupo] = grupos.get(grupo, 0) + proprio
+    return grupos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a inicialização a frio (como um lambda novo da Vercel): tempo de cada fase até a "
+        "primeira resposta, importação/modelos/ready() por entrada de INSTALLED_APPS e os "
+        "módulos mais caros de importar. Cada medição roda num interpretador novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--caminho', default='/', help="URL da primeira requisição.")
+        parser.add_argument('--modo', choices=['padrao', 'rapido', 'ambos'], default='ambos',
+                            help="Com ou sem settings.INICIALIZACAO_RAPIDA.")
+        parser.add_argument('--repeticoes', type=int, default=3,
+                            help="Medições por modo; o relatório usa a de tempo total mediano.")
+        parser.add_argument('--top', type=int, default=15, help="Quantos módulos/pacotes listar.")
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o resultado.")
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError("--repeticoes deve ser pelo menos 1.")
+        modos = {'padrao': [False], 'rapido': [True], 'ambos': [False, True]}[options['modo']]
+
+        resultado = {}
+        for rapida in modos:
+            nome = 'rapido' if rapida else 'padrao'
+            medicoes = [executar_medicao(options['caminho'], rapida, importtime=True)
+                        for _ in range(options['repeticoes'])]
+            medicoes.sort(key=lambda m: m[0]['total'])
+            dados, linhas = medicoes[len(medicoes) // 2]
+            modulos = ler_importtime(linhas)
+            dados['totais'] = [round(m[0]['total'], 4) for m in medicoes]
+            dados['pacotes'] = agrupar(modulos, {m['app'] for m in dados['apps'].values()})
+            dados['modulos'] = sorted(((n, p) for n, p, _, _ in modulos), key=lambda m: -m[1])[:options['top']]
+            resultado[nome] = dados
+            self.relatorio(nome, dados, options['top'])
+
+        if len(resultado) == 2:
+            antes, depois = resultado['padrao']['total'], resultado['rapido']['total']
+            self.stdout.write(self.style.SUCCESS(
+                f"\nInicialização até a primeira resposta: {antes * 1000:.0f} ms -> {depois * 1000:.0f} ms "
+                f"({(1 - depois / antes) * 100:.0f}% de redução)"))
+
+        if options['saida']:
+            with open(options['saida'], 'w') as f:
+                json.dump(resultado, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+    def relatorio(self, nome, dados, top):
+        ms = lambda s: f"{s * 1000:>8.1f} ms"
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n== Modo {nome} (GET {dados['caminho']} -> {dados['status']}) =="))
+        self.stdout.write(f"total {ms(dados['total'])}   medições: "
+                          + ', '.join(f"{t * 1000:.0f}" for t in dados['totais'])
+                          + f" ms (mediana {statistics.median(dados['totais']) * 1000:.0f} ms)")
+        for fase, segundos in dados['fases'].items():
+            self.stdout.write(f"  {fase:<22}{ms(segundos)}")
+
+        largura = max(len(entrada) for entrada in dados['apps']) + 2
+        self.stdout.write(f"\n{'INSTALLED_APPS':<{largura + 2}} importação     modelos     ready()  imports próprios")
+        for entrada, medida in dados['apps'].items():
+            self.stdout.write(
+                f"  {entrada:<{largura}}{ms(medida['importacao'])} {ms(medida.get('modelos', 0))} "
+                f"{ms(medida.get('ready', 0))} {ms(dados['pacotes'].get(medida['app'], 0))}")
+
+        self.stdout.write(f"\nPacotes (tempo próprio de importação, top {top}):")
+        for pacote, segundos in sorted(dados['pacotes'].items(), key=lambda p: -p[1])[:top]:
+            self.stdout.write(f"  {pacote:<40}{ms(segundos)}")
+        self.stdout.write(f"\nMódulos (top {top}):")
+        for modulo, segundos in dados['modulos']:
+            self.stdout.write(f"  {modulo:<50}{ms(segundos)}")
+        if dados['adiados_carregados']:
+            self.stdout.write(self.style.WARNING(
+                "Carregados antes da primeira resposta: " + ', '.join(dados['adiados_carregados'])))
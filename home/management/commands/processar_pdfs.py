@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from home.tarefas import processar_tarefa, reivindicar_tarefas
+
+
+def _inicializar_processo():
+    # Necessário quando o start method é 'spawn'/'forkserver'; inofensivo com 'fork'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pweb.settings')
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Consome a fila de PDFs das Ordens de Compra com um pool de processos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 2,
+                            help="Quantidade de processos renderizando em paralelo.")
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help="Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--uma-vez', action='store_true',
+                            help="Esvazia a fila e termina, em vez de ficar escutando.")
+
+    def handle(self, *args, **options):
+        processos = max(1, options['processos'])
+        self.stdout.write(f"Worker de PDFs iniciado com {processos} processo(s).")
+
+        # Conexões abertas não podem ser herdadas pelos filhos do fork
+        connections.close_all()
+        with multiprocessing.Pool(processos, initializer=_inicializar_processo) as pool:
+            while True:
+                ids = reivindicar_tarefas(limite=processos * 2)
+                if not ids:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                for tarefa_id, status in pool.imap_unordered(processar_tarefa, ids):
+                    estilo = self.style.SUCCESS if status == 'CONCLUIDA' else self.style.WARNING
+                    self.stdout.write(estilo(f"Tarefa {tarefa_id}: {status}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.models import ResumoDashboard
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero os contadores do Dashboard (ResumoDashboard)."
+
+    def handle(self, *args, **options):
+        total = ResumoDashboard.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Dashboard reconstruído: {total} baldes."))
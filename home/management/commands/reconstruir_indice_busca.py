@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.models import IndiceBusca
+
+
+class Command(BaseCommand):
+    help = "Reindexa todas as Ordens de Compra e Notas Fiscais na busca textual."
+
+    def handle(self, *args, **options):
+        total = IndiceBusca.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Índice de busca reconstruído: {total} ordens."))
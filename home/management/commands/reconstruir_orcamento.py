@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.models import ConsumoOrcamento
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero o orçamento comprometido e consumido por centro de custo (ConsumoOrcamento)."
+
+    def handle(self, *args, **options):
+        total = ConsumoOrcamento.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"Orçamento reconstruído: {total} períodos."))
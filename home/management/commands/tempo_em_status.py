@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import HistoricoStatus
+
+
+class Command(BaseCommand):
+    help = "Tempo médio que as OCs ficaram em um status, por unidade, a partir do histórico de status."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', default='SOLICITADO', choices=list(HistoricoStatus.CODIGOS))
+        parser.add_argument('--inicio', help="Entradas no status a partir de (AAAA-MM-DD). Padrão: 90 dias atrás.")
+        parser.add_argument('--fim', help="Entradas no status até (AAAA-MM-DD, exclusivo). Padrão: hoje.")
+
+    def handle(self, *args, **options):
+        try:
+            fim = datetime.strptime(options['fim'], '%Y-%m-%d') if options['fim'] else datetime.now()
+            inicio = datetime.strptime(options['inicio'], '%Y-%m-%d') if options['inicio'] else fim - timedelta(days=90)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        resultado = HistoricoStatus.tempo_em_status(options['status'], inicio, fim)
+        self.stdout.write(f"{'Unidade':<12} {'OCs':>8} {'Média (h)':>12} {'Total (h)':>14}")
+        for sigla, linha in sorted(resultado.items()):
+            self.stdout.write(f"{sigla:<12} {linha['quantidade']:>8} {linha['media_horas']:>12.2f} {linha['total_horas']:>14.2f}")
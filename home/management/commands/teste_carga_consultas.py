@@ -0,0 +1,201 @@
+import asyncio
+import io
+import itertools
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from home.models import OrdemCompra, Solicitante, Unidade
+
+from .benchmark_fluxos import percentil
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga das consultas AJAX do formulário (CNPJ da unidade, dados do "
+        "solicitante, detalhes da OC) num único processo: ASGI (um event loop) contra "
+        "WSGI (N threads, como um worker gthread). Mede vazão e p50/p95 por nível de concorrência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', default='1,10,50,100',
+                            help="Clientes simultâneos, separados por vírgula.")
+        parser.add_argument('--requisicoes', type=int, default=300, help="Requisições por nível.")
+        parser.add_argument('--threads-wsgi', type=int, default=4,
+                            help="Threads do worker WSGI (gunicorn --threads).")
+        parser.add_argument('--latencia-ms', type=float, default=20,
+                            help="Espera somada a cada consulta, simulando um banco remoto (0 desliga).")
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o resultado.")
+
+    def handle(self, *args, **options):
+        unidade = Unidade.objects.first()
+        solicitante = Solicitante.objects.first()
+        oc = OrdemCompra.objects.order_by('-id').first()
+        if not (unidade and solicitante and oc):
+            raise CommandError("Base sem dados suficientes. Rode antes: manage.py gerar_dados_sinteticos")
+        try:
+            niveis = [int(n) for n in options['concorrencia'].split(',')]
+        except ValueError:
+            raise CommandError("--concorrencia deve ser uma lista de inteiros, ex.: 1,10,50")
+
+        self.consultas = [
+            (reverse('ajax_get_cnpj'), urlencode({'unidade_id': unidade.id})),
+            (reverse('ajax_get_solicitante'), urlencode({'solicitante_id': solicitante.id})),
+            (reverse('ajax_get_oc_detalhes'), urlencode({'oc_id': oc.id})),
+        ]
+        self.requisicoes = options['requisicoes']
+        threads = options['threads_wsgi']
+
+        wsgi = WSGIHandler()
+        # Como em pweb/asgi.py: sem o WhiteNoise, que só tem middleware síncrono
+        with override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if not m.startswith('whitenoise.')]):
+            asgi = ASGIHandler()
+
+        latencia = options['latencia_ms'] / 1000
+
+        def atrasar(execute, sql, params, many, context):
+            time.sleep(latencia)
+            return execute(sql, params, many, context)
+
+        def instalar_atraso(sender, connection, **kwargs):
+            # connection_created dispara a cada reconexão do mesmo objeto de conexão
+            if atrasar not in connection.execute_wrappers:
+                connection.execute_wrappers.append(atrasar)
+
+        if latencia:
+            # Cada requisição abre a própria conexão (CONN_MAX_AGE=0), nas threads do WSGI e do ASGI
+            connection_created.connect(instalar_atraso, dispatch_uid='teste_carga_latencia')
+
+        resultado = []
+        try:
+            for clientes in niveis:
+                for modo, medir in (('wsgi', lambda: self.medir_wsgi(wsgi, clientes, threads)),
+                                    ('asgi', lambda: asyncio.run(self.medir_asgi(asgi, clientes)))):
+                    medida = {'modo': modo, 'clientes': clientes, **medir()}
+                    resultado.append(medida)
+                    self.stdout.write(
+                        f"{modo:<5} clientes={clientes:>4}  {medida['req_s']:>8.1f} req/s  "
+                        f"p50={medida['p50_ms']:>8.1f}ms  p95={medida['p95_ms']:>8.1f}ms  erros={medida['erros']}"
+                    )
+        finally:
+            connection_created.disconnect(dispatch_uid='teste_carga_latencia')
+
+        if options['saida']:
+            with open(options['saida'], 'w') as f:
+                json.dump({'threads_wsgi': threads, 'latencia_ms': options['latencia_ms'],
+                           'requisicoes': self.requisicoes, 'niveis': resultado}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+
+    def _resumo(self, tempos, erros, segundos):
+        return {
+            'req_s': round(len(tempos) / segundos, 1),
+            'p50_ms': round(statistics.median(tempos) * 1000, 2),
+            'p95_ms': round(percentil(tempos, 95) * 1000, 2),
+            'erros': erros,
+        }
+
+    # --- WSGI: cada cliente espera uma das N threads do worker ---
+
+    def medir_wsgi(self, app, clientes, threads):
+        fila = itertools.cycle(self.consultas)
+        restantes = iter(range(self.requisicoes))
+        trava = threading.Lock()
+        tempos, erros = [], [0]
+
+        def chamar(caminho, query):
+            status = []
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': caminho, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            }
+            resposta = app(environ, lambda s, cabecalhos, exc_info=None: status.append(s))
+            try:
+                b''.join(resposta)
+            finally:
+                resposta.close()
+            return status[0].startswith('200')
+
+        def cliente(executor):
+            while True:
+                with trava:
+                    if next(restantes, None) is None:
+                        return
+                    caminho, query = next(fila)
+                inicio = time.perf_counter()
+                ok = executor.submit(chamar, caminho, query).result()
+                with trava:
+                    tempos.append(time.perf_counter() - inicio)
+                    erros[0] += not ok
+
+        with ThreadPoolExecutor(threads, thread_name_prefix='wsgi') as executor:
+            inicio = time.perf_counter()
+            grupo = [threading.Thread(target=cliente, args=(executor,)) for _ in range(clientes)]
+            for t in grupo:
+                t.start()
+            for t in grupo:
+                t.join()
+            return self._resumo(tempos, erros[0], time.perf_counter() - inicio)
+
+    # --- ASGI: todos os clientes no mesmo event loop ---
+
+    async def _chamar_asgi(self, app, caminho, query):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(), 'root_path': '',
+            'query_string': query.encode(), 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        corpo_enviado = False
+        desconectar = asyncio.Event()
+        status = []
+
+        async def receive():
+            nonlocal corpo_enviado
+            if not corpo_enviado:
+                corpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # O Django fica ouvindo a desconexão enquanto a view roda
+            await desconectar.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(mensagem):
+            if mensagem['type'] == 'http.response.start':
+                status.append(mensagem['status'])
+
+        try:
+            await app(scope, receive, send)
+        finally:
+            desconectar.set()
+        return status == [200]
+
+    async def medir_asgi(self, app, clientes):
+        fila = itertools.cycle(self.consultas)
+        restantes = iter(range(self.requisicoes))
+        tempos, erros = [], 0
+
+        async def cliente():
+            nonlocal erros
+            while next(restantes, None) is not None:
+                caminho, query = next(fila)
+                inicio = time.perf_counter()
+                ok = await self._chamar_asgi(app, caminho, query)
+                tempos.append(time.perf_counter() - inicio)
+                erros += not ok
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(clientes)))
+        return self._resumo(tempos, erros, time.perf_counter() - inicio)
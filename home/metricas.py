@@ -0,0 +1,366 @@
+"""
+Métricas de desempenho por requisição, agregadas no próprio processo.
+
+MetricasMiddleware mede cada requisição e soma, por nome de rota (home/urls.py
+e admin): latência (histograma), quantidade e tempo de consultas ao banco
+(wrapper instalado em cada conexão), tempo de renderização de templates e tempo/bytes
+do WeasyPrint em renderizar_pdf_ordem_compra. Cada requisição acumula num
+objeto só dela; o agregado global é atualizado uma vez, no fim, sob um lock.
+
+/metrics devolve o texto do Prometheus. Os números são do processo que
+respondeu: com vários workers, o Prometheus raspa cada instância. Em
+respostas em streaming (ZIPs, downloads) a latência vai até o início do envio.
+
+Requisições acima de settings.METRICAS_LIMITE_LENTO_MS vão para o log
+'home.metricas' com as consultas mais demoradas.
+"""
+import heapq
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BALDES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONSULTAS_NO_LOG = 5
+TAMANHO_SQL_NO_LOG = 500
+
+_coleta_atual = ContextVar('coleta_metricas', default=None)
+
+
+class Histograma:
+    __slots__ = ('baldes', 'soma', 'total')
+
+    def __init__(self):
+        self.baldes = [0] * len(BALDES_SEGUNDOS)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(BALDES_SEGUNDOS):
+            if valor <= limite:
+                self.baldes[i] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+
+class Coleta:
+    """O que uma requisição acumulou até agora."""
+    __slots__ = ('consultas', 'segundos_db', 'segundos_template', 'pdfs', 'segundos_pdf', 'bytes_pdf',
+                 'mais_lentas', '_ordem')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_db = 0.0
+        self.segundos_template = 0.0
+        self.pdfs = 0
+        self.segundos_pdf = 0.0
+        self.bytes_pdf = 0
+        # heap mínimo com as N consultas mais demoradas: (segundos, ordem, sql)
+        self.mais_lentas = []
+        self._ordem = 0
+
+    def registrar_consulta(self, sql, segundos):
+        self.consultas += 1
+        self.segundos_db += segundos
+        self._ordem += 1
+        item = (segundos, self._ordem, sql)
+        if len(self.mais_lentas) < CONSULTAS_NO_LOG:
+            heapq.heappush(self.mais_lentas, item)
+        elif segundos > self.mais_lentas[0][0]:
+            heapq.heapreplace(self.mais_lentas, item)
+
+
+class _Rota:
+    __slots__ = ('latencia', 'respostas', 'consultas', 'segundos_db', 'segundos_template',
+                 'pdfs', 'segundos_pdf', 'bytes_pdf')
+
+    def __init__(self):
+        self.latencia = Histograma()
+        self.respostas = {}
+        self.consultas = 0
+        self.segundos_db = 0.0
+        self.segundos_template = 0.0
+        self.pdfs = 0
+        self.segundos_pdf = 0.0
+        self.bytes_pdf = 0
+
+
+class Agregado:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rotas = {}
+        self.pdf = Histograma()
+        self.bytes_pdf = 0
+        self.lentas = 0
+        self.cache = {}
+
+    def registrar_requisicao(self, rota, metodo, status, segundos, coleta, lenta):
+        with self._lock:
+            r = self.rotas.get((rota, metodo))
+            if r is None:
+                r = self.rotas[(rota, metodo)] = _Rota()
+            r.latencia.observar(segundos)
+            r.respostas[status] = r.respostas.get(status, 0) + 1
+            r.consultas += coleta.consultas
+            r.segundos_db += coleta.segundos_db
+            r.segundos_template += coleta.segundos_template
+            r.pdfs += coleta.pdfs
+            r.segundos_pdf += coleta.segundos_pdf
+            r.bytes_pdf += coleta.bytes_pdf
+            self.lentas += lenta
+
+    def registrar_pdf(self, segundos, tamanho):
+        with self._lock:
+            self.pdf.observar(segundos)
+            self.bytes_pdf += tamanho
+
+    def registrar_cache(self, pagina, resultado):
+        with self._lock:
+            self.cache[(pagina, resultado)] = self.cache.get((pagina, resultado), 0) + 1
+
+    def zerar(self):
+        with self._lock:
+            self.rotas = {}
+            self.pdf = Histograma()
+            self.bytes_pdf = 0
+            self.lentas = 0
+            self.cache = {}
+
+
+agregado = Agregado()
+
+
+# --- Ganchos ---
+
+def _medir_consulta(execute, sql, params, many, context):
+    coleta = _coleta_atual.get()
+    if coleta is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        coleta.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+def instalar_medidor(sender=None, connection=None, **kwargs):
+    """
+    Receptor de connection_created: o wrapper fica na conexão para sempre e
+    atribui cada consulta à requisição do contexto atual (ContextVar). Assim
+    também as consultas do ORM assíncrono, que rodam em outra thread com
+    outra conexão, entram na conta da requisição certa.
+    """
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+def registrar_pdf(segundos, tamanho):
+    """Chamado por renderizar_pdf_ordem_compra após o WeasyPrint (também fora de requisições)."""
+    agregado.registrar_pdf(segundos, tamanho)
+    coleta = _coleta_atual.get()
+    if coleta is not None:
+        coleta.pdfs += 1
+        coleta.segundos_pdf += segundos
+        coleta.bytes_pdf += tamanho
+
+
+def registrar_cache(pagina, resultado):
+    """Acerto/falha/ignorado do cache de páginas (home/cache_paginas.py)."""
+    agregado.registrar_cache(pagina, resultado)
+
+
+def instrumentar_templates():
+    """Mede o render() dos templates do backend do Django (render, TemplateResponse, render_to_string)."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_medido', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        coleta = _coleta_atual.get()
+        if coleta is None:
+            return original(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            coleta.segundos_template += time.perf_counter() - inicio
+
+    render._medido = True
+    Template.render = render
+
+
+class MetricasMiddleware:
+    """Logo depois do WhiteNoise no MIDDLEWARE: mede os demais middlewares, não os estáticos."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limite_lento = getattr(settings, 'METRICAS_LIMITE_LENTO_MS', 1000) / 1000
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self._acall(request)
+        coleta = Coleta()
+        token = _coleta_atual.set(coleta)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _coleta_atual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, coleta)
+        return response
+
+    async def _acall(self, request):
+        coleta = Coleta()
+        token = _coleta_atual.set(coleta)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _coleta_atual.reset(token)
+        self._registrar(request, response, time.perf_counter() - inicio, coleta)
+        return response
+
+    def _registrar(self, request, response, segundos, coleta):
+        rota = request.resolver_match.view_name if request.resolver_match else 'sem_rota'
+        lenta = segundos >= self.limite_lento
+        agregado.registrar_requisicao(rota, request.method, response.status_code, segundos, coleta, lenta)
+        if lenta:
+            self._registrar_lenta(request, rota, response.status_code, segundos, coleta)
+
+    def _registrar_lenta(self, request, rota, status, segundos, coleta):
+        consultas = '\n'.join(
+            f"    {s * 1000:.1f} ms  {sql[:TAMANHO_SQL_NO_LOG]}"
+            for s, _, sql in sorted(coleta.mais_lentas, reverse=True)
+        )
+        logger.warning(
+            "Requisição lenta: %s %s (%s) -> %s em %.0f ms; banco: %d consultas / %.0f ms; "
+            "templates: %.0f ms; PDF: %d / %.0f ms\n  Consultas mais demoradas:\n%s",
+            request.method, request.get_full_path(), rota, status, segundos * 1000,
+            coleta.consultas, coleta.segundos_db * 1000, coleta.segundos_template * 1000,
+            coleta.pdfs, coleta.segundos_pdf * 1000, consultas or '    (nenhuma)',
+        )
+
+
+# --- Exposição (formato texto do Prometheus) ---
+
+def _rotulos(**rotulos):
+    texto = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for k, v in rotulos.items())
+    return '{%s}' % texto if texto else ''
+
+
+def _histograma(linhas, nome, h, **rotulos):
+    acumulado = 0
+    for limite, quantidade in zip(BALDES_SEGUNDOS, h.baldes):
+        acumulado += quantidade
+        linhas.append(f"{nome}_bucket{_rotulos(**rotulos, le=limite)} {acumulado}")
+    linhas.append(f"{nome}_bucket{_rotulos(**rotulos, le='+Inf')} {h.total}")
+    linhas.append(f"{nome}_sum{_rotulos(**rotulos)} {h.soma:.6f}")
+    linhas.append(f"{nome}_count{_rotulos(**rotulos)} {h.total}")
+
+
+def texto_prometheus():
+    with agregado._lock:
+        rotas = sorted(agregado.rotas.items())
+        linhas = [
+            '# HELP gestao_requisicao_segundos Latência das requisições por rota.',
+            '# TYPE gestao_requisicao_segundos histogram',
+        ]
+        for (rota, metodo), r in rotas:
+            _histograma(linhas, 'gestao_requisicao_segundos', r.latencia, rota=rota, metodo=metodo)
+
+        linhas += ['# HELP gestao_requisicoes_total Respostas por rota e status HTTP.',
+                   '# TYPE gestao_requisicoes_total counter']
+        for (rota, metodo), r in rotas:
+            for status, total in sorted(r.respostas.items()):
+                linhas.append(f"gestao_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=status)} {total}")
+
+        for nome, tipo, ajuda, campo in (
+            ('gestao_db_consultas_total', 'counter', 'Consultas SQL executadas.', 'consultas'),
+            ('gestao_db_segundos_total', 'counter', 'Tempo gasto em consultas SQL.', 'segundos_db'),
+            ('gestao_template_segundos_total', 'counter', 'Tempo de renderização de templates.', 'segundos_template'),
+            ('gestao_rota_pdfs_total', 'counter', 'PDFs renderizados pelo WeasyPrint na requisição.', 'pdfs'),
+            ('gestao_rota_pdf_segundos_total', 'counter', 'Tempo do WeasyPrint na requisição.', 'segundos_pdf'),
+            ('gestao_rota_pdf_bytes_total', 'counter', 'Bytes de PDF gerados na requisição.', 'bytes_pdf'),
+        ):
+            linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+            for (rota, metodo), r in rotas:
+                valor = getattr(r, campo)
+                linhas.append(f"{nome}{_rotulos(rota=rota, metodo=metodo)} "
+                              f"{valor if isinstance(valor, int) else f'{valor:.6f}'}")
+
+        linhas += ['# HELP gestao_pdf_segundos Tempo de renderização do WeasyPrint por PDF.',
+                   '# TYPE gestao_pdf_segundos histogram']
+        _histograma(linhas, 'gestao_pdf_segundos', agregado.pdf)
+        linhas += ['# HELP gestao_pdf_bytes_total Bytes de PDF gerados.',
+                   '# TYPE gestao_pdf_bytes_total counter',
+                   f'gestao_pdf_bytes_total {agregado.bytes_pdf}',
+                   '# HELP gestao_requisicoes_lentas_total Requisições acima de METRICAS_LIMITE_LENTO_MS.',
+                   '# TYPE gestao_requisicoes_lentas_total counter',
+                   f'gestao_requisicoes_lentas_total {agregado.lentas}',
+                   '# HELP gestao_cache_paginas_total Consultas ao cache de páginas por resultado.',
+                   '# TYPE gestao_cache_paginas_total counter']
+        for (pagina, resultado), total in sorted(agregado.cache.items()):
+            linhas.append(f"gestao_cache_paginas_total{_rotulos(pagina=pagina, resultado=resultado)} {total}")
+    _texto_pool(linhas)
+    _texto_replica(linhas)
+    return '\n'.join(linhas) + '\n'
+
+
+def _texto_pool(linhas):
+    """Contadores do pool de conexões (home/banco/pool.py), se algum estiver em uso neste processo."""
+    from .banco.pool import estatisticas_pools
+
+    pools = estatisticas_pools()
+    if not pools:
+        return
+    for campo, tipo, ajuda in (
+        ('aquisicoes', 'counter', 'Conexões retiradas do pool.'),
+        ('reutilizadas', 'counter', 'Retiradas atendidas por uma conexão já aberta.'),
+        ('criadas', 'counter', 'Conexões abertas pelo pool.'),
+        ('esperas', 'counter', 'Retiradas que esperaram uma conexão livre (pool no máximo).'),
+        ('timeouts', 'counter', 'Retiradas que desistiram após BANCO_POOL_TIMEOUT.'),
+        ('reconexoes', 'counter', 'Conexões trocadas por falharem na verificação da retirada.'),
+        ('recicladas', 'counter', 'Conexões fechadas por passarem de BANCO_POOL_MAX_VIDA.'),
+        ('segundos_espera', 'counter', 'Tempo total esperando uma conexão livre.'),
+    ):
+        nome = 'gestao_db_pool_espera_segundos_total' if campo == 'segundos_espera' else f'gestao_db_pool_{campo}_total'
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}']
+        for alias, est in pools:
+            valor = est[campo]
+            linhas.append(f"{nome}{_rotulos(alias=alias)} {valor if isinstance(valor, int) else f'{valor:.6f}'}")
+    linhas += ['# HELP gestao_db_pool_conexoes Conexões do pool por estado.',
+               '# TYPE gestao_db_pool_conexoes gauge']
+    for alias, est in pools:
+        for estado in ('em_uso', 'livres'):
+            linhas.append(f"gestao_db_pool_conexoes{_rotulos(alias=alias, estado=estado)} {est[estado]}")
+
+
+def _texto_replica(linhas):
+    """Destino das leituras de relatório e último atraso medido da réplica (home/roteador.py)."""
+    from .roteador import estado_replica
+
+    if not getattr(settings, 'BANCO_REPLICA_ATIVA', False):
+        return
+    linhas += ['# HELP gestao_db_leituras_relatorio_total Leituras de relatório por banco escolhido (e motivo).',
+               '# TYPE gestao_db_leituras_relatorio_total counter']
+    for destino, total in sorted(estado_replica.leituras.items()):
+        linhas.append(f"gestao_db_leituras_relatorio_total{_rotulos(destino=destino)} {total}")
+    if estado_replica.verificada_em is not None:
+        atraso = estado_replica.atraso
+        linhas += ['# HELP gestao_db_replica_atraso_segundos Atraso da réplica na última medição (-1: sem resposta).',
+                   '# TYPE gestao_db_replica_atraso_segundos gauge',
+                   f"gestao_db_replica_atraso_segundos {-1 if atraso is None else f'{atraso:.3f}'}"]
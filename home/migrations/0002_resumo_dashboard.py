@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('RASCUNHO', 'Rascunho'), ('SOLICITADO', 'Aguardando Aprovação'), ('APROVADO', 'Aprovado (Ordem Gerada)'), ('REPROVADO', 'Reprovado'), ('CONCLUIDO', 'Concluído (NF Lançada)')], max_length=20)),
+                ('mes', models.DateField(verbose_name='Mês (1º dia)')),
+                ('quantidade', models.IntegerField(default=0)),
+                ('valor_estimado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('valor_realizado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('unidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_dashboard', to='home.unidade')),
+            ],
+            options={
+                'verbose_name': 'Resumo do Dashboard',
+                'verbose_name_plural': 'Resumos do Dashboard',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumodashboard',
+            constraint=models.UniqueConstraint(fields=('status', 'unidade', 'mes'), name='resumo_dashboard_unico'),
+        ),
+    ]
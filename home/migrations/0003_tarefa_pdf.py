@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_resumo_dashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaPdf',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Na fila'), ('PROCESSANDO', 'Gerando PDF'), ('CONCLUIDA', 'PDF disponível'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=20)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentativas', models.PositiveSmallIntegerField(default=3)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=100)),
+                ('tamanho_bytes', models.PositiveIntegerField(blank=True, null=True)),
+                ('tempo_render_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tempo de Renderização (ms)')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima Tentativa')),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('ordem_compra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_pdf', to='home.ordemcompra')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de PDF',
+                'verbose_name_plural': 'Tarefas de PDF',
+                'indexes': [models.Index(fields=['status', 'disponivel_em'], name='tarefapdf_fila_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0003_tarefa_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefapdf',
+            name='lote',
+            field=models.UUIDField(blank=True, db_index=True, help_text='Aprovação em lote que originou a tarefa', null=True),
+        ),
+    ]
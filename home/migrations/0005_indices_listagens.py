@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0004_tarefapdf_lote'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notafiscal',
+            index=models.Index(fields=['-data_lancamento', '-id'], name='nf_lancamento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemcompra',
+            index=models.Index(fields=['status', '-data_criacao', '-id'], name='oc_status_criacao_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Índice textual específico de cada banco sobre home_indicebusca.texto
+SQL_POSTGRES = [
+    """ALTER TABLE home_indicebusca ADD COLUMN vetor tsvector
+       GENERATED ALWAYS AS (to_tsvector('simple', texto)) STORED""",
+    "CREATE INDEX home_indicebusca_vetor_gin ON home_indicebusca USING GIN (vetor)",
+]
+SQL_POSTGRES_REVERSO = [
+    "DROP INDEX IF EXISTS home_indicebusca_vetor_gin",
+    "ALTER TABLE home_indicebusca DROP COLUMN IF EXISTS vetor",
+]
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE home_indicebusca_fts USING fts5(
+       texto, content='home_indicebusca', content_rowid='ordem_compra_id',
+       tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER home_indicebusca_ai AFTER INSERT ON home_indicebusca BEGIN
+       INSERT INTO home_indicebusca_fts(rowid, texto) VALUES (new.ordem_compra_id, new.texto);
+       END""",
+    """CREATE TRIGGER home_indicebusca_ad AFTER DELETE ON home_indicebusca BEGIN
+       INSERT INTO home_indicebusca_fts(home_indicebusca_fts, rowid, texto) VALUES ('delete', old.ordem_compra_id, old.texto);
+       END""",
+    """CREATE TRIGGER home_indicebusca_au AFTER UPDATE ON home_indicebusca BEGIN
+       INSERT INTO home_indicebusca_fts(home_indicebusca_fts, rowid, texto) VALUES ('delete', old.ordem_compra_id, old.texto);
+       INSERT INTO home_indicebusca_fts(rowid, texto) VALUES (new.ordem_compra_id, new.texto);
+       END""",
+]
+SQL_SQLITE_REVERSO = [
+    "DROP TRIGGER IF EXISTS home_indicebusca_ai",
+    "DROP TRIGGER IF EXISTS home_indicebusca_ad",
+    "DROP TRIGGER IF EXISTS home_indicebusca_au",
+    "DROP TABLE IF EXISTS home_indicebusca_fts",
+]
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'postgresql': SQL_POSTGRES, 'sqlite': SQL_SQLITE})
+
+
+def remover_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'postgresql': SQL_POSTGRES_REVERSO, 'sqlite': SQL_SQLITE_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0005_indices_listagens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusca',
+            fields=[
+                ('ordem_compra', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='indice_busca', serialize=False, to='home.ordemcompra')),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Índice de Busca',
+                'verbose_name_plural': 'Índices de Busca',
+            },
+        ),
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+    ]
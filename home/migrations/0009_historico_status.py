@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+CODIGOS = {'RASCUNHO': 1, 'SOLICITADO': 2, 'APROVADO': 3, 'REPROVADO': 4, 'CONCLUIDO': 5}
+
+
+def registrar_estado_atual(apps, schema_editor):
+    # OCs anteriores ao histórico ganham um único evento: o status em que estão hoje
+    OrdemCompra = apps.get_model('home', 'OrdemCompra')
+    HistoricoStatus = apps.get_model('home', 'HistoricoStatus')
+    ordens = OrdemCompra.objects.values_list('id', 'status', 'data_atualizacao').iterator(chunk_size=5000)
+    lote = []
+    for pk, status, momento in ordens:
+        lote.append(HistoricoStatus(ordem_compra_id=pk, para=CODIGOS[status], momento=momento,
+                                    observacao='Status na criação do histórico'))
+        if len(lote) >= 5000:
+            HistoricoStatus.objects.bulk_create(lote)
+            lote = []
+    HistoricoStatus.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0008_indice_numero_os'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('de', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Rascunho'), (2, 'Aguardando Aprovação'), (3, 'Aprovado (Ordem Gerada)'), (4, 'Reprovado'), (5, 'Concluído (NF Lançada)')], null=True)),
+                ('para', models.PositiveSmallIntegerField(choices=[(1, 'Rascunho'), (2, 'Aguardando Aprovação'), (3, 'Aprovado (Ordem Gerada)'), (4, 'Reprovado'), (5, 'Concluído (NF Lançada)')])),
+                ('momento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('observacao', models.TextField(blank=True, default='')),
+                ('ordem_compra', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='historico', to='home.ordemcompra')),
+                ('usuario', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Histórico de Status',
+                'verbose_name_plural': 'Histórico de Status',
+                'indexes': [models.Index(fields=['ordem_compra', 'momento'], name='historico_oc_momento_idx'), models.Index(fields=['momento'], name='historico_momento_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_estado_atual, migrations.RunPython.noop),
+    ]
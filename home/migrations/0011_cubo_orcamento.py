@@ -0,0 +1,85 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_arquivo_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuboContribuicao',
+            fields=[
+                ('ordem_compra_id', models.PositiveBigIntegerField(primary_key=True, serialize=False)),
+                ('valor_estimado', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('valor_realizado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tem_nf', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Contribuição ao Cubo',
+                'verbose_name_plural': 'Contribuições ao Cubo',
+            },
+        ),
+        migrations.CreateModel(
+            name='CuboOrcamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conta_contabil', models.CharField(choices=[('AGUA_ESGOTO', 'Água e Esgoto (OPEX)'), ('ENERGIA', 'Energia Elétrica (OPEX)'), ('GASES_MED', 'Gases Medicinais (OPEX)'), ('ALUGUEL_EQUIP', 'Aluguel de Equipamentos (OPEX)'), ('MANUT_PREDIAL', 'Manutenção Predial (OPEX)'), ('MANUT_EQUIP', 'Manutenção de Equipamentos (OPEX)'), ('MANUT_MOVEIS', 'Manutenção de Móveis e Utensílios (OPEX)'), ('INVESTIMENTO', 'Investimento / CAPEX (Outros)')], max_length=30)),
+                ('classificacao', models.CharField(choices=[('CAPEX', 'CAPEX (Investimento/Obras/Bens)'), ('OPEX', 'OPEX (Custeio/Manutenção/Materiais)')], max_length=10)),
+                ('mes', models.DateField(verbose_name='Mês de competência (1º dia)')),
+                ('quantidade', models.IntegerField(default=0)),
+                ('quantidade_nf', models.IntegerField(default=0)),
+                ('valor_estimado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('valor_realizado', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Cubo Orçado x Realizado',
+                'verbose_name_plural': 'Cubo Orçado x Realizado',
+            },
+        ),
+        migrations.CreateModel(
+            name='MarcaIncremental',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=100, unique=True)),
+                ('momento', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Marca Incremental',
+                'verbose_name_plural': 'Marcas Incrementais',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ordemcompra',
+            index=models.Index(fields=['data_atualizacao'], name='oc_atualizacao_idx'),
+        ),
+        migrations.AddField(
+            model_name='cuboorcamento',
+            name='centro_custo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.centrocusto'),
+        ),
+        migrations.AddField(
+            model_name='cuboorcamento',
+            name='unidade',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.unidade'),
+        ),
+        migrations.AddField(
+            model_name='cubocontribuicao',
+            name='celula',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contribuicoes', to='home.cuboorcamento'),
+        ),
+        migrations.AddIndex(
+            model_name='cuboorcamento',
+            index=models.Index(fields=['mes'], name='cubo_orcamento_mes_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cuboorcamento',
+            constraint=models.UniqueConstraint(fields=('centro_custo', 'unidade', 'conta_contabil', 'classificacao', 'mes'), name='cubo_orcamento_unico'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def calcular_consumo_atual(apps, schema_editor):
+    # Mesmo cálculo de ConsumoOrcamento.reconstruir() para as OCs já existentes
+    OrdemCompra = apps.get_model('home', 'OrdemCompra')
+    ConsumoOrcamento = apps.get_model('home', 'ConsumoOrcamento')
+    totais = {}
+    ordens = (OrdemCompra.objects.values_list('centro_custo_id', 'data_os', 'status', 'valor_estimado',
+                                              'nota_fiscal__valor_final').iterator(chunk_size=5000))
+    for centro_custo_id, data_os, status, estimado, realizado in ordens:
+        comprometido = estimado if status in ('RASCUNHO', 'SOLICITADO', 'APROVADO') else 0
+        for tipo, inicio in (('MES', data_os.replace(day=1)), ('ANO', data_os.replace(month=1, day=1))):
+            t = totais.setdefault((centro_custo_id, tipo, inicio), [Decimal(0), Decimal(0)])
+            t[0] += comprometido or 0
+            t[1] += realizado or 0
+    ConsumoOrcamento.objects.bulk_create([
+        ConsumoOrcamento(centro_custo_id=cc, tipo=tipo, inicio=inicio, comprometido=c, consumido=u)
+        for (cc, tipo, inicio), (c, u) in totais.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_cubo_orcamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='centrocusto',
+            name='bloquear_acima_orcamento',
+            field=models.BooleanField(default=True, help_text='Se desmarcado, a OC é aceita e sinalizada.', verbose_name='Bloquear OCs acima do orçamento'),
+        ),
+        migrations.AddField(
+            model_name='centrocusto',
+            name='orcamento_anual',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Orçamento Anual'),
+        ),
+        migrations.AddField(
+            model_name='centrocusto',
+            name='orcamento_mensal',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Orçamento Mensal'),
+        ),
+        migrations.AddField(
+            model_name='ordemcompra',
+            name='acima_orcamento',
+            field=models.BooleanField(default=False, verbose_name='Acima do Orçamento'),
+        ),
+        migrations.CreateModel(
+            name='ConsumoOrcamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('MES', 'Mensal'), ('ANO', 'Anual')], max_length=3)),
+                ('inicio', models.DateField(verbose_name='Início do período')),
+                ('comprometido', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('consumido', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('centro_custo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos', to='home.centrocusto')),
+            ],
+            options={
+                'verbose_name': 'Consumo de Orçamento',
+                'verbose_name_plural': 'Consumo de Orçamento',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='consumoorcamento',
+            constraint=models.UniqueConstraint(fields=('centro_custo', 'tipo', 'inicio'), name='consumo_orcamento_unico'),
+        ),
+        migrations.RunPython(calcular_consumo_atual, migrations.RunPython.noop),
+    ]
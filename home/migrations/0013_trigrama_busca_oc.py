@@ -0,0 +1,43 @@
+from django.db import migrations
+
+# Autocomplete do lançamento de NF: numero_os/fornecedor __icontains geram
+# UPPER(coluna::text) LIKE UPPER('%termo%'), que só um índice de trigramas atende.
+# No SQLite (desenvolvimento) o LIKE varre a tabela
+SQL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX oc_numero_os_trgm ON home_ordemcompra USING GIN (UPPER(numero_os::text) gin_trgm_ops)",
+    "CREATE INDEX oc_fornecedor_trgm ON home_ordemcompra USING GIN (UPPER(fornecedor::text) gin_trgm_ops)",
+]
+SQL_POSTGRES_REVERSO = [
+    "DROP INDEX IF EXISTS oc_numero_os_trgm",
+    "DROP INDEX IF EXISTS oc_fornecedor_trgm",
+]
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indices_trigrama(apps, schema_editor):
+    _executar(schema_editor, {'postgresql': SQL_POSTGRES})
+
+
+def remover_indices_trigrama(apps, schema_editor):
+    _executar(schema_editor, {'postgresql': SQL_POSTGRES_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0012_orcamento_centro_custo'),
+    ]
+
+    operations = [
+        # O prefixo de numero_os passa a ser atendido pelo índice de trigramas
+        migrations.RemoveIndex(
+            model_name='ordemcompra',
+            name='oc_status_numero_os_idx',
+        ),
+        migrations.RunPython(criar_indices_trigrama, remover_indices_trigrama),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
 import os
 
 # ... (Unidade, CentroCusto, Solicitante mantidos iguais) ...
@@ -22,6 +26,11 @@ class Unidade(models.Model):
 class CentroCusto(models.Model):
     codigo = models.CharField(max_length=20, unique=True)
     descricao = models.CharField(max_length=100)
+    # Limites de orçamento (vazio = sem limite); o consumo fica em ConsumoOrcamento
+    orcamento_mensal = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name="Orçamento Mensal")
+    orcamento_anual = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name="Orçamento Anual")
+    bloquear_acima_orcamento = models.BooleanField(default=True, verbose_name="Bloquear OCs acima do orçamento",
+                                                   help_text="Se desmarcado, a OC é aceita e sinalizada.")
 
     def __str__(self):
         return f"{self.codigo} - {self.descricao}"
@@ -124,17 +133,135 @@ class OrdemCompra(models.Model):
     data_aprovacao = models.DateTimeField(null=True, blank=True)
     aprovado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='aprovacoes')
     motivo_reprovacao = models.TextField(blank=True, null=True)
+    acima_orcamento = models.BooleanField(default=False, verbose_name="Acima do Orçamento")
+
+    class Meta:
+        indexes = [
+            # Lista de pendências: WHERE status = ... ORDER BY data_criacao DESC, id DESC
+            models.Index(fields=['status', '-data_criacao', '-id'], name='oc_status_criacao_idx'),
+            # Autocomplete do lançamento de NF (numero_os/fornecedor LIKE '%xxx%'): índices de
+            # trigramas do PostgreSQL criados na migração 0013_trigrama_busca_oc
+            # Atualização incremental do cubo: WHERE data_atualizacao >= marca
+            models.Index(fields=['data_atualizacao'], name='oc_atualizacao_idx'),
+        ]
 
     def __str__(self):
         return f"OS {self.numero_os} - {self.fornecedor}"
 
+    CONTAS_OPEX = ['AGUA_ESGOTO', 'ENERGIA', 'GASES_MED', 'ALUGUEL_EQUIP', 'MANUT_PREDIAL', 'MANUT_EQUIP', 'MANUT_MOVEIS']
+
+    @classmethod
+    def classificar(cls, conta_contabil):
+        """Regra CAPEX/OPEX pela conta contábil (também usada nas cargas em massa)."""
+        return 'OPEX' if conta_contabil in cls.CONTAS_OPEX else 'CAPEX'
+
+    # Colunas que só mudam pelas transições de home/transicoes.py (UPDATE condicional)
+    CAMPOS_TRANSICAO = ('status', 'aprovado_por', 'data_aprovacao', 'motivo_reprovacao')
+
+    def clean(self):
+        super().clean()
+        # Leitura de uma linha (CentroCusto + consumo do mês/ano); a reserva
+        # definitiva, com trava, acontece no save()
+        if self.centro_custo_id and self.data_os and self.valor_estimado is not None:
+            liberar = 0
+            if self.pk:
+                anterior = (OrdemCompra.objects.filter(pk=self.pk, status__in=ConsumoOrcamento.STATUS_ABERTOS,
+                                                       centro_custo_id=self.centro_custo_id)
+                            .values_list('data_os', 'valor_estimado').first())
+                if anterior and ConsumoOrcamento.periodos(anterior[0]) == ConsumoOrcamento.periodos(self.data_os):
+                    liberar = anterior[1]
+            erro = ConsumoOrcamento.verificar(self.centro_custo_id, self.data_os, self.valor_estimado - liberar)
+            if erro and erro.bloqueia:
+                raise ValidationError({'valor_estimado': erro.message})
+
     def save(self, *args, **kwargs):
-        contas_opex = ['AGUA_ESGOTO', 'ENERGIA', 'GASES_MED', 'ALUGUEL_EQUIP', 'MANUT_PREDIAL', 'MANUT_EQUIP', 'MANUT_MOVEIS']
-        if self.conta_contabil in contas_opex:
-            self.classificacao = 'OPEX'
-        else:
-            self.classificacao = 'CAPEX'
-        super().save(*args, **kwargs)
+        """
+        Em OCs já existentes, status e dados de aprovação/reprovação NÃO são
+        gravados aqui: prevalece o que está no banco, para que uma instância
+        desatualizada não desfaça uma transição concorrente. Use home.transicoes.
+        """
+        self.classificacao = self.classificar(self.conta_contabil)
+
+        # Salva e atualiza os contadores do Dashboard na mesma transação
+        with transaction.atomic():
+            antigo = None
+            if self.pk and not kwargs.get('force_insert'):
+                antigo = (OrdemCompra.objects.select_for_update()
+                          .filter(pk=self.pk)
+                          .values('status', 'unidade_id', 'data_criacao', 'valor_estimado',
+                                  'aprovado_por_id', 'data_aprovacao', 'motivo_reprovacao',
+                                  'centro_custo_id', 'data_os', 'acima_orcamento', *IndiceBusca.CAMPOS_OC)
+                          .first())
+            orcamento_antigo = None
+            realizado = 0
+            if antigo:
+                # O valor da NF já lançada acompanha a OC se ela mudar de balde ou de período
+                if (antigo['unidade_id'], antigo['centro_custo_id'], antigo['data_os']) != (
+                        self.unidade_id, self.centro_custo_id, self.data_os):
+                    realizado = (NotaFiscal.objects.filter(ordem_compra_id=self.pk)
+                                 .values_list('valor_final', flat=True).first()) or 0
+                self.status = antigo['status']
+                self.aprovado_por_id = antigo.pop('aprovado_por_id')
+                self.data_aprovacao = antigo.pop('data_aprovacao')
+                self.motivo_reprovacao = antigo.pop('motivo_reprovacao')
+                self.acima_orcamento = antigo.pop('acima_orcamento')
+                orcamento_antigo = (antigo.pop('centro_custo_id'), antigo.pop('data_os'), antigo['valor_estimado'])
+                if kwargs.get('update_fields') is None:
+                    kwargs['update_fields'] = [
+                        f.name for f in self._meta.concrete_fields
+                        if not f.primary_key and f.name not in self.CAMPOS_TRANSICAO
+                    ]
+            self._reservar_orcamento(orcamento_antigo, realizado)
+            super().save(*args, **kwargs)
+            novo = {
+                'status': self.status,
+                'unidade_id': self.unidade_id,
+                'data_criacao': self.data_criacao,
+                'valor_estimado': self.valor_estimado,
+            }
+            textos_antigos = {campo: antigo.pop(campo) for campo in IndiceBusca.CAMPOS_OC} if antigo else None
+            if textos_antigos != {campo: getattr(self, campo) for campo in IndiceBusca.CAMPOS_OC}:
+                IndiceBusca.indexar(self.pk)
+            if antigo != novo:
+                if antigo:
+                    ResumoDashboard.registrar(antigo, -1, valor_realizado=-realizado)
+                ResumoDashboard.registrar(novo, +1, valor_realizado=realizado)
+            if not antigo:
+                HistoricoStatus.registrar([self.pk], None, self.status)
+
+    def _reservar_orcamento(self, antigo, realizado=0):
+        """
+        Compromete o valor da OC no orçamento do centro de custo (mês e ano da
+        data_os), com as linhas de consumo travadas. Numa edição, devolve antes
+        o valor antigo. Levanta OrcamentoExcedido se o centro de custo bloqueia.
+        Se o centro de custo ou a data_os mudou, `realizado` (valor da NF já
+        lançada, o consumido) também passa para o novo período, em qualquer status.
+        """
+        if realizado and antigo[:2] != (self.centro_custo_id, self.data_os):
+            ConsumoOrcamento.ajustar([(antigo[0], antigo[1], 0, -realizado),
+                                      (self.centro_custo_id, self.data_os, 0, realizado)])
+        if self.status not in ConsumoOrcamento.STATUS_ABERTOS:
+            return
+        novo = (self.centro_custo_id, self.data_os, self.valor_estimado)
+        if antigo == novo:
+            return
+        if antigo:
+            ConsumoOrcamento.ajustar([(antigo[0], antigo[1], -antigo[2], 0)])
+        self.acima_orcamento = ConsumoOrcamento.reservar(*novo)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            atual = (OrdemCompra.objects.select_for_update().filter(pk=self.pk)
+                     .values('status', 'unidade_id', 'data_criacao', 'valor_estimado',
+                             'centro_custo_id', 'data_os').first())
+            valor_realizado = (NotaFiscal.objects.filter(ordem_compra_id=self.pk)
+                               .values_list('valor_final', flat=True).first())
+            if atual:
+                centro_custo_id, data_os = atual.pop('centro_custo_id'), atual.pop('data_os')
+                ResumoDashboard.registrar(atual, -1, valor_realizado=-(valor_realizado or 0))
+                comprometido = atual['valor_estimado'] if atual['status'] in ConsumoOrcamento.STATUS_ABERTOS else 0
+                ConsumoOrcamento.ajustar([(centro_custo_id, data_os, -comprometido, -(valor_realizado or 0))])
+            return super().delete(*args, **kwargs)
 
 # --- Módulo Financeiro ---
 
@@ -163,11 +290,854 @@ class NotaFiscal(models.Model):
     data_lancamento = models.DateTimeField(auto_now_add=True)
     responsavel_lancamento = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-data_lancamento', '-id'], name='nf_lancamento_idx'),
+        ]
+
     def __str__(self):
         return f"NF {self.numero_nf}"
 
+    def clean(self):
+        super().clean()
+        # A NF conclui a OC: só OCs aprovadas (ou a própria OC desta NF, já concluída)
+        if self.ordem_compra_id:
+            status = OrdemCompra.objects.filter(pk=self.ordem_compra_id).values_list('status', flat=True).first()
+            ja_vinculada = self.pk and NotaFiscal.objects.filter(pk=self.pk, ordem_compra_id=self.ordem_compra_id).exists()
+            if status != 'APROVADO' and not (status == 'CONCLUIDO' and ja_vinculada):
+                raise ValidationError({'ordem_compra': "A Ordem de Compra precisa estar aprovada para receber a NF."})
+
     def save(self, *args, **kwargs):
+        with transaction.atomic():
+            anterior = None
+            if self.pk:
+                anterior = (NotaFiscal.objects.filter(pk=self.pk)
+                            .values('valor_final', 'ordem_compra_id').first())
+            super().save(*args, **kwargs)
+            from .transicoes import ConflitoTransicao, concluir, reabrir
+            if self.ordem_compra.status != 'CONCLUIDO':
+                # Um UPDATE só da coluna status (APROVADO -> CONCLUIDO), não um save() da OC inteira
+                try:
+                    concluir(self.ordem_compra, usuario=self.responsavel_lancamento,
+                             observacao=f"NF {self.numero_nf}")
+                except ConflitoTransicao as e:
+                    if e.status_atual != 'CONCLUIDO':
+                        raise
+                    self.ordem_compra.status = 'CONCLUIDO'
+            IndiceBusca.indexar(self.ordem_compra_id)
+
+            delta = (self.valor_final or 0) - ((anterior or {}).get('valor_final') or 0)
+            if anterior and anterior['ordem_compra_id'] != self.ordem_compra_id:
+                # NF passada para outra OC (admin): o valor sai da OC anterior, que fica sem NF
+                oc_anterior = OrdemCompra.objects.get(pk=anterior['ordem_compra_id'])
+                self._lancar_realizado(oc_anterior, -(anterior['valor_final'] or 0))
+                if oc_anterior.status == 'CONCLUIDO':
+                    reabrir(oc_anterior, usuario=self.responsavel_lancamento,
+                            observacao=f"NF {self.numero_nf} passada para a OC {self.ordem_compra_id}")
+                IndiceBusca.indexar(oc_anterior.pk)
+                delta = self.valor_final or 0
+            # O valor realizado entra no balde da OC (já CONCLUIDO)
+            self._lancar_realizado(self.ordem_compra, delta)
+
+    @staticmethod
+    def _lancar_realizado(oc, valor):
+        """Soma `valor` ao realizado da OC no Dashboard e ao consumido do orçamento."""
+        if not valor:
+            return
+        # Marca a OC como alterada para os processos incrementais (cubo)
+        OrdemCompra.objects.filter(pk=oc.pk).update(data_atualizacao=timezone.now())
+        ResumoDashboard.registrar({
+            'status': oc.status,
+            'unidade_id': oc.unidade_id,
+            'data_criacao': oc.data_criacao,
+            'valor_estimado': 0,
+        }, 0, valor_realizado=valor)
+        ConsumoOrcamento.ajustar([(oc.centro_custo_id, oc.data_os, 0, valor)])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            oc = self.ordem_compra
+            if self.valor_final:
+                ResumoDashboard.registrar({
+                    'status': oc.status,
+                    'unidade_id': oc.unidade_id,
+                    'data_criacao': oc.data_criacao,
+                    'valor_estimado': 0,
+                }, 0, valor_realizado=-self.valor_final)
+                ConsumoOrcamento.ajustar([(oc.centro_custo_id, oc.data_os, 0, -self.valor_final)])
+            resultado = super().delete(*args, **kwargs)
+            OrdemCompra.objects.filter(pk=oc.pk).update(data_atualizacao=timezone.now())
+            IndiceBusca.indexar(oc.pk)
+            return resultado
+
+# --- Versões de Cache ---
+
+class VersaoCache(models.Model):
+    """
+    Contador de geração por chave (ex.: 'referencias'). Os caches em memória de
+    cada processo comparam sua versão com esta linha para saber se estão velhos.
+    """
+    chave = models.CharField(max_length=100, unique=True)
+    versao = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Versão de Cache"
+        verbose_name_plural = "Versões de Cache"
+
+    def __str__(self):
+        return f"{self.chave} v{self.versao}"
+
+    @classmethod
+    def atual(cls, chave):
+        versao = cls.objects.filter(chave=chave).values_list('versao', flat=True).first()
+        return versao or 1
+
+    @classmethod
+    def atuais(cls, chaves):
+        """Várias versões numa consulta: {chave: versao}."""
+        versoes = dict(cls.objects.filter(chave__in=chaves).values_list('chave', 'versao'))
+        return {chave: versoes.get(chave, 1) for chave in chaves}
+
+    @classmethod
+    def incrementar(cls, chave):
+        if not cls.objects.filter(chave=chave).update(versao=F('versao') + 1):
+            cls.objects.get_or_create(chave=chave, defaults={'versao': 2})
+
+# --- Fila de Geração de PDFs ---
+
+class TarefaPdf(models.Model):
+    STATUS_TAREFA = [
+        ('PENDENTE', 'Na fila'),
+        ('PROCESSANDO', 'Gerando PDF'),
+        ('CONCLUIDA', 'PDF disponível'),
+        ('FALHOU', 'Falhou'),
+    ]
+
+    ordem_compra = models.ForeignKey(OrdemCompra, on_delete=models.CASCADE, related_name='tarefas_pdf')
+    status = models.CharField(max_length=20, choices=STATUS_TAREFA, default='PENDENTE')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=3)
+    erro = models.TextField(blank=True, default='')
+    lote = models.UUIDField(null=True, blank=True, db_index=True, help_text="Aprovação em lote que originou a tarefa")
+
+    pdf = models.BinaryField(null=True, blank=True, editable=False)
+    nome_arquivo = models.CharField(max_length=100, blank=True, default='')
+    tamanho_bytes = models.PositiveIntegerField(null=True, blank=True)
+    tempo_render_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name="Tempo de Renderização (ms)")
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    disponivel_em = models.DateTimeField(default=timezone.now, verbose_name="Próxima Tentativa")
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa de PDF"
+        verbose_name_plural = "Tarefas de PDF"
+        indexes = [
+            models.Index(fields=['status', 'disponivel_em'], name='tarefapdf_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"PDF OC {self.ordem_compra_id} ({self.status})"
+
+# --- Busca Textual ---
+
+class IndiceBusca(models.Model):
+    """
+    Documento de busca de cada OC (dados da OC + da NF), já normalizado.
+    O índice textual propriamente dito é criado por banco na migração:
+    tsvector + GIN no PostgreSQL e tabela virtual FTS5 no SQLite (ver home/busca.py).
+    """
+    CAMPOS_OC = ('numero_os', 'fornecedor', 'descricao_servico', 'justificativa')
+    CAMPOS_NF = ('numero_nf', 'numero_fluig')
+
+    ordem_compra = models.OneToOneField(OrdemCompra, on_delete=models.CASCADE, primary_key=True, related_name='indice_busca')
+    texto = models.TextField()
+
+    class Meta:
+        verbose_name = "Índice de Busca"
+        verbose_name_plural = "Índices de Busca"
+
+    @staticmethod
+    def normalizar(texto):
+        import unicodedata
+        texto = unicodedata.normalize('NFKD', texto or '')
+        return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+    @classmethod
+    def montar_texto(cls, dados):
+        return cls.normalizar(' '.join(str(dados.get(c) or '') for c in ('id',) + cls.CAMPOS_OC + cls.CAMPOS_NF))
+
+    @classmethod
+    def _consulta_documentos(cls):
+        return OrdemCompra.objects.values(
+            'id', *cls.CAMPOS_OC,
+            numero_nf=F('nota_fiscal__numero_nf'), numero_fluig=F('nota_fiscal__numero_fluig'))
+
+    @classmethod
+    def indexar(cls, ordem_compra_id):
+        dados = cls._consulta_documentos().filter(pk=ordem_compra_id).first()
+        if dados:
+            cls.objects.update_or_create(ordem_compra_id=ordem_compra_id, defaults={'texto': cls.montar_texto(dados)})
+
+    @classmethod
+    def indexar_em_lote(cls, ordem_compra_ids):
+        """Reindexa um conjunto de OCs com um DELETE e um INSERT em massa."""
+        documentos = [cls(ordem_compra_id=dados['id'], texto=cls.montar_texto(dados))
+                      for dados in cls._consulta_documentos().filter(pk__in=ordem_compra_ids)]
+        cls.objects.filter(ordem_compra_id__in=ordem_compra_ids).delete()
+        cls.objects.bulk_create(documentos)
+
+    @classmethod
+    def reconstruir(cls, lote=2000):
+        """Reindexa todas as OCs (necessário após cargas com bulk_create)."""
+        total = 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+            documentos = []
+            for dados in cls._consulta_documentos().order_by('id').iterator(chunk_size=lote):
+                documentos.append(cls(ordem_compra_id=dados['id'], texto=cls.montar_texto(dados)))
+                if len(documentos) >= lote:
+                    cls.objects.bulk_create(documentos)
+                    total += len(documentos)
+                    documentos = []
+            cls.objects.bulk_create(documentos)
+            total += len(documentos)
+        return total
+
+# --- Dashboard (Contadores Incrementais) ---
+
+class ResumoDashboard(models.Model):
+    """
+    Totais pré-agregados por status, unidade e mês de criação da OC.
+    Mantido incrementalmente pelo save() de OrdemCompra/NotaFiscal, para que
+    o Dashboard leia poucas linhas independente do volume de ordens.
+    """
+    status = models.CharField(max_length=20, choices=OrdemCompra.STATUS_PEDIDO)
+    unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE, related_name='resumos_dashboard')
+    mes = models.DateField(verbose_name="Mês (1º dia)")
+    quantidade = models.IntegerField(default=0)
+    valor_estimado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    valor_realizado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumo do Dashboard"
+        verbose_name_plural = "Resumos do Dashboard"
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'unidade', 'mes'], name='resumo_dashboard_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} / {self.unidade_id} / {self.mes:%m/%Y}"
+
+    @staticmethod
+    def primeiro_dia(data):
+        data = data or timezone.now()
+        return data.date().replace(day=1) if hasattr(data, 'date') else data.replace(day=1)
+
+    @classmethod
+    def registrar(cls, estado, sinal, valor_realizado=0):
+        """Soma (sinal=+1) ou subtrai (sinal=-1) uma OC do seu balde."""
+        if not estado.get('unidade_id'):
+            return
+        balde, _ = cls.objects.get_or_create(
+            status=estado['status'],
+            unidade_id=estado['unidade_id'],
+            mes=cls.primeiro_dia(estado['data_criacao']),
+        )
+        cls.objects.filter(pk=balde.pk).update(
+            quantidade=F('quantidade') + sinal,
+            valor_estimado=F('valor_estimado') + sinal * Decimal(estado['valor_estimado'] or 0),
+            valor_realizado=F('valor_realizado') + Decimal(valor_realizado or 0),
+        )
+
+    @classmethod
+    def mover_em_lote(cls, linhas, status_de, status_para):
+        """
+        Move várias OCs de status de uma vez (após um UPDATE ou INSERT em massa),
+        com uma atualização por balde em vez de uma por OC. status_de=None para
+        OCs recém-inseridas.
+        `linhas`: dicts com unidade_id, data_criacao, valor_estimado e,
+        opcionalmente, valor_realizado (somado ao balde de destino).
+        """
+        baldes = {}
+        for linha in linhas:
+            chave = (linha['unidade_id'], cls.primeiro_dia(linha['data_criacao']))
+            quantidade, valor, realizado = baldes.get(chave, (0, Decimal(0), Decimal(0)))
+            baldes[chave] = (quantidade + 1, valor + linha['valor_estimado'],
+                             realizado + Decimal(linha.get('valor_realizado') or 0))
+        for (unidade_id, mes), (quantidade, valor, realizado) in baldes.items():
+            movimentos = [(status_para, +1, realizado)]
+            if status_de:
+                movimentos.insert(0, (status_de, -1, 0))
+            for status, sinal, valor_realizado in movimentos:
+                balde, _ = cls.objects.get_or_create(status=status, unidade_id=unidade_id, mes=mes)
+                cls.objects.filter(pk=balde.pk).update(
+                    quantidade=F('quantidade') + sinal * quantidade,
+                    valor_estimado=F('valor_estimado') + sinal * valor,
+                    valor_realizado=F('valor_realizado') + valor_realizado,
+                )
+
+    @classmethod
+    def reconstruir(cls):
+        """Recalcula todos os baldes do zero a partir das tabelas de origem."""
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncMonth
+
+        linhas = (OrdemCompra.objects
+                  .annotate(mes=TruncMonth('data_criacao'))
+                  .values('status', 'unidade_id', 'mes')
+                  .annotate(quantidade=Count('id'),
+                            valor_estimado=Sum('valor_estimado'),
+                            valor_realizado=Sum('nota_fiscal__valor_final'))
+                  .order_by())
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(status=l['status'], unidade_id=l['unidade_id'],
+                    mes=cls.primeiro_dia(l['mes']),
+                    quantidade=l['quantidade'],
+                    valor_estimado=l['valor_estimado'] or 0,
+                    valor_realizado=l['valor_realizado'] or 0)
+                for l in linhas
+            ])
+        return len(linhas)
+
+    @classmethod
+    def totais(cls):
+        """Números dos cards do Dashboard em uma única consulta sobre o rollup."""
+        from django.db.models import Q, Sum
+        mes_atual = cls.primeiro_dia(timezone.now())
+        dados = cls.objects.aggregate(
+            novas=Sum('quantidade', filter=Q(mes=mes_atual) & ~Q(status='RASCUNHO')),
+            pendentes=Sum('quantidade', filter=Q(status='SOLICITADO')),
+            aprovadas=Sum('quantidade', filter=Q(status__in=['APROVADO', 'CONCLUIDO'])),
+            total_gasto=Sum('valor_realizado'),
+        )
+        return {chave: valor or 0 for chave, valor in dados.items()}
+# --- Histórico de Status (somente inclusão) ---
+
+class HistoricoStatus(models.Model):
+    """
+    Um evento por mudança de status de uma OC, gravado na mesma transação da
+    mudança. Nunca é alterado: a linha do tempo e os relatórios de tempo em
+    cada status são lidos daqui, pelos índices (ordem_compra, momento) e
+    (momento), sem reconstruir nada a partir da OC.
+    """
+    # Status guardados como inteiro pequeno (2 bytes por coluna em vez do texto)
+    STATUS_CODIGO = [
+        (1, 'Rascunho'),
+        (2, 'Aguardando Aprovação'),
+        (3, 'Aprovado (Ordem Gerada)'),
+        (4, 'Reprovado'),
+        (5, 'Concluído (NF Lançada)'),
+    ]
+    CODIGOS = {'RASCUNHO': 1, 'SOLICITADO': 2, 'APROVADO': 3, 'REPROVADO': 4, 'CONCLUIDO': 5}
+
+    ordem_compra = models.ForeignKey(OrdemCompra, on_delete=models.CASCADE, related_name='historico', db_index=False)
+    de = models.PositiveSmallIntegerField(choices=STATUS_CODIGO, null=True, blank=True)
+    para = models.PositiveSmallIntegerField(choices=STATUS_CODIGO)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False)
+    momento = models.DateTimeField(default=timezone.now)
+    observacao = models.TextField(blank=True, default='')
+
+    class Meta:
+        verbose_name = "Histórico de Status"
+        verbose_name_plural = "Histórico de Status"
+        indexes = [
+            models.Index(fields=['ordem_compra', 'momento'], name='historico_oc_momento_idx'),
+            models.Index(fields=['momento'], name='historico_momento_idx'),
+        ]
+
+    def __str__(self):
+        return f"OC {self.ordem_compra_id}: {self.get_de_display() or '-'} -> {self.get_para_display()}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("O histórico de status não pode ser alterado.")
         super().save(*args, **kwargs)
-        if self.ordem_compra.status != 'CONCLUIDO':
-            self.ordem_compra.status = 'CONCLUIDO'
-            self.ordem_compra.save()
\ No newline at end of file
+
+    @classmethod
+    def registrar(cls, ids, de, para, usuario=None, observacao='', momento=None):
+        """Grava um evento `de -> para` para cada OC de `ids` (um INSERT por lote)."""
+        momento = momento or timezone.now()
+        cls.objects.bulk_create([
+            cls(ordem_compra_id=pk, de=cls.CODIGOS.get(de), para=cls.CODIGOS[para],
+                usuario=usuario, momento=momento, observacao=observacao or '')
+            for pk in ids
+        ])
+
+    @classmethod
+    def tempo_em_status(cls, status, inicio, fim):
+        """
+        Tempo que as OCs ficaram em `status`, por unidade, para as entradas
+        nesse status ocorridas em [inicio, fim). Devolve
+        {sigla: {'quantidade': n, 'media_horas': h, 'total_horas': t}}.
+
+        As entradas vêm de uma varredura por faixa em `momento`; a saída de
+        cada uma é o evento seguinte da mesma OC, achado pelo índice
+        (ordem_compra, momento). Quem ainda está no status conta até agora.
+        """
+        saida = (cls.objects.filter(ordem_compra=models.OuterRef('ordem_compra'),
+                                    momento__gt=models.OuterRef('momento'))
+                 .order_by('momento').values('momento')[:1])
+        entradas = (cls.objects.filter(para=cls.CODIGOS[status], momento__gte=inicio, momento__lt=fim)
+                    .annotate(saida=models.Subquery(saida))
+                    .values_list('ordem_compra__unidade__abreviacao', 'momento', 'saida'))
+        agora = timezone.now()
+        resultado = {}
+        for sigla, entrada, saida_em in entradas.iterator():
+            horas = ((saida_em or agora) - entrada).total_seconds() / 3600
+            linha = resultado.setdefault(sigla, {'quantidade': 0, 'total_horas': 0.0})
+            linha['quantidade'] += 1
+            linha['total_horas'] += horas
+        for linha in resultado.values():
+            linha['total_horas'] = round(linha['total_horas'], 2)
+            linha['media_horas'] = round(linha['total_horas'] / linha['quantidade'], 2)
+        return resultado
+
+# --- Arquivos Deduplicados (orçamentos e NFs) ---
+
+class ArquivoBlob(models.Model):
+    """
+    Um arquivo gravado uma única vez sob o seu SHA-256, com a contagem de
+    campos (anexo_orcamento / arquivo_nf) que apontam para ele. O arquivo
+    físico só é apagado quando a última referência sai.
+    """
+    nome = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    tamanho = models.PositiveBigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Arquivo Deduplicado"
+        verbose_name_plural = "Arquivos Deduplicados"
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias} ref.)"
+
+    @classmethod
+    def travar(cls, nome, sha256='', tamanho=0):
+        """
+        A linha do blob com select_for_update até o fim da transação em curso,
+        criada com 0 referências se ainda não existe. Conferir/gravar o arquivo,
+        somar a referência e apagar o arquivo físico acontecem sob esta trava.
+        """
+        sha256 = sha256 or nome.rsplit('/', 1)[-1].split('.', 1)[0]
+        return cls.objects.select_for_update().get_or_create(
+            nome=nome, defaults={'sha256': sha256, 'tamanho': tamanho, 'referencias': 0})[0]
+
+    @classmethod
+    def liberar(cls, nome):
+        """
+        Remove uma referência. Devolve True se o arquivo físico pode ser
+        apagado (era a última referência ou o arquivo não é deduplicado).
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(nome=nome).first()
+            if blob is None:
+                return True
+            if blob.referencias > 1:
+                cls.objects.filter(pk=blob.pk).update(referencias=F('referencias') - 1)
+                return False
+            blob.delete()
+            return True
+
+# --- Cubo Orçado x Realizado ---
+
+class MarcaIncremental(models.Model):
+    """Até que momento um processo incremental (ex.: o cubo) já processou as mudanças."""
+    chave = models.CharField(max_length=100, unique=True)
+    momento = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Marca Incremental"
+        verbose_name_plural = "Marcas Incrementais"
+
+    def __str__(self):
+        return f"{self.chave} @ {self.momento}"
+
+
+class CuboOrcamento(models.Model):
+    """
+    Valor estimado (OC) x realizado (NF) por centro de custo, unidade, conta
+    contábil, CAPEX/OPEX e mês de competência (mês da data_os). Entram as OCs
+    solicitadas, aprovadas e concluídas; rascunhos e reprovadas não são gasto.
+    Atualizado por atualizar(), que só lê as OCs alteradas desde a última marca;
+    o relatório lê apenas esta tabela.
+    """
+    STATUS_CONSIDERADOS = ['SOLICITADO', 'APROVADO', 'CONCLUIDO']
+    CHAVE_MARCA = 'cubo_orcamento'
+    # Reprocessa um pouco antes da marca: pega transações que commitaram atrasadas
+    MARGEM = timedelta(minutes=5)
+
+    centro_custo = models.ForeignKey(CentroCusto, on_delete=models.CASCADE, related_name='+')
+    unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE, related_name='+')
+    conta_contabil = models.CharField(max_length=30, choices=OrdemCompra.CONTA_CONTABIL_CHOICES)
+    classificacao = models.CharField(max_length=10, choices=OrdemCompra.TIPO_CLASSIFICACAO)
+    mes = models.DateField(verbose_name="Mês de competência (1º dia)")
+    quantidade = models.IntegerField(default=0)
+    quantidade_nf = models.IntegerField(default=0)
+    valor_estimado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    valor_realizado = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Cubo Orçado x Realizado"
+        verbose_name_plural = "Cubo Orçado x Realizado"
+        constraints = [
+            models.UniqueConstraint(fields=['centro_custo', 'unidade', 'conta_contabil', 'classificacao', 'mes'],
+                                    name='cubo_orcamento_unico'),
+        ]
+        indexes = [models.Index(fields=['mes'], name='cubo_orcamento_mes_idx')]
+
+    def __str__(self):
+        return f"{self.centro_custo_id}/{self.unidade_id}/{self.conta_contabil}/{self.classificacao}/{self.mes:%m/%Y}"
+
+    @staticmethod
+    def _contribuicao(linha):
+        """(chave da célula, estimado, realizado, tem_nf) de uma OC, ou None se ela não entra no cubo."""
+        if linha['status'] not in CuboOrcamento.STATUS_CONSIDERADOS:
+            return None
+        chave = (linha['centro_custo_id'], linha['unidade_id'], linha['conta_contabil'],
+                 linha['classificacao'], linha['data_os'].replace(day=1))
+        realizado = linha['nota_fiscal__valor_final'] or Decimal(0)
+        return chave, linha['valor_estimado'], realizado, linha['nota_fiscal__id'] is not None
+
+    CAMPOS_OC = ('id', 'status', 'centro_custo_id', 'unidade_id', 'conta_contabil', 'classificacao',
+                 'data_os', 'valor_estimado', 'nota_fiscal__valor_final', 'nota_fiscal__id')
+
+    @classmethod
+    def _celulas(cls, chaves):
+        """Ids das células para as chaves dadas, criando as que faltam (uma consulta + um INSERT)."""
+        if not chaves:
+            return {}
+        campos = ('centro_custo_id', 'unidade_id', 'conta_contabil', 'classificacao', 'mes')
+        existentes = (cls.objects.filter(centro_custo_id__in={c[0] for c in chaves},
+                                         unidade_id__in={c[1] for c in chaves},
+                                         mes__in={c[4] for c in chaves})
+                      .values_list('id', *campos))
+        ids = {tuple(linha[1:]): linha[0] for linha in existentes if tuple(linha[1:]) in chaves}
+        novas = [cls(**dict(zip(campos, chave))) for chave in chaves if chave not in ids]
+        # atualizar()/reconstruir() rodam serializados pela trava da marca: sem corrida no INSERT
+        for celula in cls.objects.bulk_create(novas):
+            ids[tuple(getattr(celula, campo) for campo in campos)] = celula.pk
+        return ids
+
+    @classmethod
+    def atualizar(cls, tamanho_lote=2000):
+        """
+        Aplica ao cubo as OCs alteradas (data_atualizacao) desde a última marca
+        e as excluídas. Cada OC guarda em CuboContribuicao o que somou em qual
+        célula: a atualização subtrai a contribuição antiga e soma a nova, então
+        reprocessar uma OC inalterada não muda nada. Devolve o nº de OCs lidas.
+        """
+        with transaction.atomic():
+            marca, _ = MarcaIncremental.objects.select_for_update().get_or_create(chave=cls.CHAVE_MARCA)
+            if marca.momento is None:
+                return cls.reconstruir()
+            agora = timezone.now()
+            alteradas = (OrdemCompra.objects.filter(data_atualizacao__gte=marca.momento - cls.MARGEM)
+                         .values_list('id', flat=True))
+            ids = list(alteradas)
+            for inicio in range(0, len(ids), tamanho_lote):
+                cls._aplicar(ids[inicio:inicio + tamanho_lote])
+            # OCs excluídas: contribuição sem OC correspondente
+            orfas = list(CuboContribuicao.objects.exclude(ordem_compra_id__in=OrdemCompra.objects.values('pk'))
+                         .values_list('ordem_compra_id', flat=True))
+            for inicio in range(0, len(orfas), tamanho_lote):
+                cls._aplicar(orfas[inicio:inicio + tamanho_lote])
+            cls.objects.filter(quantidade=0).delete()
+            marca.momento = agora
+            marca.save(update_fields=['momento'])
+        return len(ids) + len(orfas)
+
+    @classmethod
+    def _aplicar(cls, ids):
+        antigas = {c.ordem_compra_id: c for c in CuboContribuicao.objects.filter(ordem_compra_id__in=ids)}
+        novas = {}
+        for linha in OrdemCompra.objects.filter(pk__in=ids).values(*cls.CAMPOS_OC):
+            contribuicao = cls._contribuicao(linha)
+            if contribuicao:
+                novas[linha['id']] = contribuicao
+        celulas = cls._celulas({c[0] for c in novas.values()})
+
+        deltas = {}  # celula_id -> [quantidade, quantidade_nf, estimado, realizado]
+
+        def somar(celula_id, sinal, estimado, realizado, tem_nf):
+            d = deltas.setdefault(celula_id, [0, 0, Decimal(0), Decimal(0)])
+            d[0] += sinal
+            d[1] += sinal * int(tem_nf)
+            d[2] += sinal * estimado
+            d[3] += sinal * realizado
+
+        remover, gravar = [], []
+        for oc_id in ids:
+            antiga, nova = antigas.get(oc_id), novas.get(oc_id)
+            if antiga and nova and (antiga.celula_id, antiga.valor_estimado, antiga.valor_realizado, antiga.tem_nf) == \
+                    (celulas[nova[0]], nova[1], nova[2], nova[3]):
+                continue  # reprocessada pela margem, sem mudança
+            if antiga:
+                somar(antiga.celula_id, -1, antiga.valor_estimado, antiga.valor_realizado, antiga.tem_nf)
+            if nova:
+                chave, estimado, realizado, tem_nf = nova
+                somar(celulas[chave], +1, estimado, realizado, tem_nf)
+                gravar.append(CuboContribuicao(ordem_compra_id=oc_id, celula_id=celulas[chave],
+                                               valor_estimado=estimado, valor_realizado=realizado, tem_nf=tem_nf))
+            elif antiga:
+                remover.append(oc_id)
+
+        for celula_id, (quantidade, quantidade_nf, estimado, realizado) in deltas.items():
+            if quantidade or quantidade_nf or estimado or realizado:
+                cls.objects.filter(pk=celula_id).update(
+                    quantidade=F('quantidade') + quantidade,
+                    quantidade_nf=F('quantidade_nf') + quantidade_nf,
+                    valor_estimado=F('valor_estimado') + estimado,
+                    valor_realizado=F('valor_realizado') + realizado,
+                )
+        CuboContribuicao.objects.filter(ordem_compra_id__in=remover).delete()
+        CuboContribuicao.objects.bulk_create(
+            gravar, update_conflicts=True, unique_fields=['ordem_compra_id'],
+            update_fields=['celula', 'valor_estimado', 'valor_realizado', 'tem_nf'],
+        )
+
+    @classmethod
+    def reconstruir(cls, tamanho_lote=5000):
+        """Recalcula o cubo e as contribuições do zero. Devolve o nº de OCs lidas."""
+        with transaction.atomic():
+            marca, _ = MarcaIncremental.objects.select_for_update().get_or_create(chave=cls.CHAVE_MARCA)
+            agora = timezone.now()
+            CuboContribuicao.objects.all().delete()
+            cls.objects.all().delete()
+            linhas = (OrdemCompra.objects.filter(status__in=cls.STATUS_CONSIDERADOS)
+                      .order_by().values(*cls.CAMPOS_OC))
+            totais, contribuicoes, lidas = {}, [], 0
+            for linha in linhas.iterator(chunk_size=tamanho_lote):
+                chave, estimado, realizado, tem_nf = cls._contribuicao(linha)
+                t = totais.setdefault(chave, [0, 0, Decimal(0), Decimal(0)])
+                t[0] += 1
+                t[1] += int(tem_nf)
+                t[2] += estimado
+                t[3] += realizado
+                contribuicoes.append((linha['id'], chave, estimado, realizado, tem_nf))
+                lidas += 1
+            celulas = cls.objects.bulk_create([
+                cls(centro_custo_id=cc, unidade_id=unidade, conta_contabil=conta, classificacao=classe, mes=mes,
+                    quantidade=q, quantidade_nf=qnf, valor_estimado=est, valor_realizado=real)
+                for (cc, unidade, conta, classe, mes), (q, qnf, est, real) in totais.items()
+            ], batch_size=1000)
+            ids = {(c.centro_custo_id, c.unidade_id, c.conta_contabil, c.classificacao, c.mes): c.pk for c in celulas}
+            if None in ids.values():
+                # Banco sem RETURNING no bulk_create: busca os ids gravados
+                ids = {(c['centro_custo_id'], c['unidade_id'], c['conta_contabil'], c['classificacao'], c['mes']): c['id']
+                       for c in cls.objects.values('id', 'centro_custo_id', 'unidade_id', 'conta_contabil',
+                                                   'classificacao', 'mes')}
+            CuboContribuicao.objects.bulk_create([
+                CuboContribuicao(ordem_compra_id=oc_id, celula_id=ids[chave], valor_estimado=estimado,
+                                 valor_realizado=realizado, tem_nf=tem_nf)
+                for oc_id, chave, estimado, realizado, tem_nf in contribuicoes
+            ], batch_size=tamanho_lote)
+            marca.momento = agora
+            marca.save(update_fields=['momento'])
+        return lidas
+
+
+class CuboContribuicao(models.Model):
+    """
+    Quanto cada OC somou em qual célula do cubo na última atualização. Sem FK
+    para a OC de propósito: se ela for excluída, a linha continua aqui até a
+    próxima atualização descontar o valor da célula.
+    """
+    ordem_compra_id = models.PositiveBigIntegerField(primary_key=True)
+    celula = models.ForeignKey(CuboOrcamento, on_delete=models.CASCADE, related_name='contribuicoes')
+    valor_estimado = models.DecimalField(max_digits=12, decimal_places=2)
+    valor_realizado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    tem_nf = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Contribuição ao Cubo"
+        verbose_name_plural = "Contribuições ao Cubo"
+
+# --- Orçamento dos Centros de Custo ---
+
+class OrcamentoExcedido(ValidationError):
+    def __init__(self, message, bloqueia=True):
+        super().__init__(message)
+        self.bloqueia = bloqueia
+
+
+class ConsumoOrcamento(models.Model):
+    """
+    Total corrente do orçamento de um centro de custo num período (mês ou ano
+    da data_os): `comprometido` = valor estimado das OCs em aberto,
+    `consumido` = valor final das NFs lançadas (a NF substitui a estimativa).
+    Ajustado na mesma transação de cada criação, reprovação e lançamento de
+    NF, com a linha travada; a validação do formulário lê uma única linha.
+    """
+    STATUS_ABERTOS = ['RASCUNHO', 'SOLICITADO', 'APROVADO']
+    TIPO_PERIODO = [('MES', 'Mensal'), ('ANO', 'Anual')]
+
+    centro_custo = models.ForeignKey(CentroCusto, on_delete=models.CASCADE, related_name='consumos')
+    tipo = models.CharField(max_length=3, choices=TIPO_PERIODO)
+    inicio = models.DateField(verbose_name="Início do período")
+    comprometido = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    consumido = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Consumo de Orçamento"
+        verbose_name_plural = "Consumo de Orçamento"
+        constraints = [
+            models.UniqueConstraint(fields=['centro_custo', 'tipo', 'inicio'], name='consumo_orcamento_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.centro_custo_id} {self.tipo} {self.inicio:%m/%Y}"
+
+    @property
+    def utilizado(self):
+        return self.comprometido + self.consumido
+
+    @staticmethod
+    def periodos(data):
+        return [('MES', data.replace(day=1)), ('ANO', data.replace(month=1, day=1))]
+
+    @classmethod
+    def ajustar(cls, movimentos):
+        """
+        Soma deltas aos totais. `movimentos`: (centro_custo_id, data_os,
+        delta_comprometido, delta_consumido). Um UPDATE por linha de período,
+        sempre na mesma ordem, para duas transações não se travarem em cruz.
+        """
+        deltas = {}
+        for centro_custo_id, data_os, comprometido, consumido in movimentos:
+            if not centro_custo_id or not (comprometido or consumido):
+                continue
+            for tipo, inicio in cls.periodos(data_os):
+                d = deltas.setdefault((centro_custo_id, tipo, inicio), [Decimal(0), Decimal(0)])
+                d[0] += Decimal(comprometido or 0)
+                d[1] += Decimal(consumido or 0)
+        for (centro_custo_id, tipo, inicio), (comprometido, consumido) in sorted(deltas.items()):
+            if not (comprometido or consumido):
+                continue
+            filtro = {'centro_custo_id': centro_custo_id, 'tipo': tipo, 'inicio': inicio}
+            if not cls.objects.filter(**filtro).update(comprometido=F('comprometido') + comprometido,
+                                                       consumido=F('consumido') + consumido):
+                cls._criar(filtro)
+                cls.objects.filter(**filtro).update(comprometido=F('comprometido') + comprometido,
+                                                    consumido=F('consumido') + consumido)
+
+    @classmethod
+    def _criar(cls, filtro):
+        try:
+            with transaction.atomic():
+                cls.objects.create(**filtro)
+        except IntegrityError:
+            pass  # criada por outra transação no meio tempo
+
+    @classmethod
+    def mover(cls, linhas, status_de, status_para):
+        """
+        Efeito de uma transição em massa (mesma forma de ResumoDashboard.mover_em_lote):
+        o valor estimado sai/entra do comprometido conforme o status deixa ou passa
+        a ser aberto; `valor_realizado` das linhas, se houver, entra no consumido.
+        `linhas` precisam de centro_custo_id, data_os e valor_estimado.
+        """
+        sinal = int(status_para in cls.STATUS_ABERTOS) - int(status_de in cls.STATUS_ABERTOS)
+        cls.ajustar((linha['centro_custo_id'], linha['data_os'], sinal * linha['valor_estimado'],
+                     linha.get('valor_realizado') or 0) for linha in linhas)
+
+    @classmethod
+    def verificar(cls, centro_custo_id, data_os, valor):
+        """
+        Leitura sem trava para a validação do formulário: uma consulta devolve os
+        limites do centro de custo e o já utilizado no mês e no ano. Devolve
+        OrcamentoExcedido (sem levantar) se `valor` passar de algum limite.
+        """
+        (mes, inicio_mes), (ano, inicio_ano) = cls.periodos(data_os)
+
+        def utilizado(tipo, inicio):
+            return models.Subquery(
+                cls.objects.filter(centro_custo_id=models.OuterRef('pk'), tipo=tipo, inicio=inicio)
+                .annotate(total=F('comprometido') + F('consumido')).values('total')[:1])
+
+        linha = (CentroCusto.objects.filter(pk=centro_custo_id)
+                 .annotate(usado_mes=utilizado(mes, inicio_mes), usado_ano=utilizado(ano, inicio_ano))
+                 .values('codigo', 'orcamento_mensal', 'orcamento_anual', 'bloquear_acima_orcamento',
+                         'usado_mes', 'usado_ano')
+                 .first())
+        if linha:
+            return cls._excedido(linha, valor, inicio_mes)
+        return None
+
+    @staticmethod
+    def _excedido(linha, valor, inicio_mes):
+        for limite, usado, periodo in ((linha['orcamento_mensal'], linha['usado_mes'], f"{inicio_mes:%m/%Y}"),
+                                       (linha['orcamento_anual'], linha['usado_ano'], f"{inicio_mes:%Y}")):
+            if limite is None:
+                continue
+            usado = Decimal(usado or 0)
+            if usado + Decimal(valor) > limite:
+                return OrcamentoExcedido(
+                    f"Orçamento do centro de custo {linha['codigo']} em {periodo} excedido: "
+                    f"limite R$ {limite:.2f}, já utilizado R$ {usado:.2f}, disponível R$ {max(limite - usado, 0):.2f}.",
+                    bloqueia=linha['bloquear_acima_orcamento'],
+                )
+        return None
+
+    @classmethod
+    def reservar(cls, centro_custo_id, data_os, valor):
+        """
+        Compromete `valor` com as linhas do mês e do ano travadas (SELECT FOR
+        UPDATE): dois envios simultâneos para o mesmo centro de custo são
+        verificados um depois do outro. Levanta OrcamentoExcedido se o centro
+        de custo bloqueia; senão devolve True quando a OC passou do limite.
+        """
+        (_, inicio_mes), (_, inicio_ano) = cls.periodos(data_os)
+        with transaction.atomic():
+            for tipo, inicio in (('MES', inicio_mes), ('ANO', inicio_ano)):
+                filtro = {'centro_custo_id': centro_custo_id, 'tipo': tipo, 'inicio': inicio}
+                if not cls.objects.filter(**filtro).exists():
+                    cls._criar(filtro)
+            usados = dict(cls.objects.select_for_update()
+                          .filter(centro_custo_id=centro_custo_id, tipo__in=['MES', 'ANO'],
+                                  inicio__in=[inicio_mes, inicio_ano])
+                          .order_by('tipo', 'inicio')
+                          .annotate(total=F('comprometido') + F('consumido'))
+                          .values_list('tipo', 'total'))
+            centro = (CentroCusto.objects.filter(pk=centro_custo_id)
+                      .values('codigo', 'orcamento_mensal', 'orcamento_anual', 'bloquear_acima_orcamento').first())
+            excedido = None
+            if centro:
+                excedido = cls._excedido(dict(centro, usado_mes=usados.get('MES'), usado_ano=usados.get('ANO')),
+                                         valor, inicio_mes)
+            if excedido and excedido.bloqueia:
+                raise excedido
+            cls.ajustar([(centro_custo_id, data_os, valor, 0)])
+        return excedido is not None
+
+    @classmethod
+    def reconstruir(cls):
+        """Recalcula todos os totais a partir das OCs e NFs."""
+        from django.db.models import Sum
+        from django.db.models.functions import TruncMonth
+
+        linhas = (OrdemCompra.objects
+                  .annotate(mes=TruncMonth('data_os'))
+                  .values('centro_custo_id', 'mes')
+                  .annotate(comprometido=Sum('valor_estimado', filter=models.Q(status__in=cls.STATUS_ABERTOS)),
+                            consumido=Sum('nota_fiscal__valor_final'))
+                  .order_by())
+        totais = {}
+        for l in linhas:
+            mes = l['mes'].date() if hasattr(l['mes'], 'date') else l['mes']
+            for tipo, inicio in cls.periodos(mes):
+                t = totais.setdefault((l['centro_custo_id'], tipo, inicio), [Decimal(0), Decimal(0)])
+                t[0] += l['comprometido'] or 0
+                t[1] += l['consumido'] or 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([
+                cls(centro_custo_id=cc, tipo=tipo, inicio=inicio, comprometido=c, consumido=u)
+                for (cc, tipo, inicio), (c, u) in totais.items()
+            ], batch_size=1000)
+        return len(totais)
@@ -0,0 +1,208 @@
+"""
+Pacote de PDFs de Ordens de Compra para auditoria: um ZIP com o PDF de cada
+OC selecionada (período / unidade / status) e um manifesto.csv com id,
+hash_audit e SHA-256 de cada arquivo.
+
+No comando gerar_pacote_pdf os PDFs são renderizados por
+gerar_pdf_ordem_compra num pool de processos (o WeasyPrint é CPU-bound); na
+view, no executor de PDFs compartilhado (executor_pdf em home/utils.py): o
+pool de processos 'spawn' com settings.PDF_EXECUTOR = 'processos', que não
+faz fork do servidor, ou threads onde não há como criar processos (Vercel).
+Cada PDF entra no ZIP assim que fica pronto; o ZIP é escrito num fluxo sem
+seek, então os bytes saem para o cliente (ou para o arquivo) à medida que são
+gerados. No máximo o dobro de trabalhadores em PDFs ficam em voo ao mesmo
+tempo: a memória não cresce com o tamanho do pacote.
+Uma OC que falha vira uma linha de erro no manifesto, sem abortar o resto. Se
+nenhum PDF fica pronto em settings.PDF_PACOTE_TEMPO_LIMITE_S (trabalhador
+morto ou travado), as OCs ainda não entregues saem como erro no manifesto.
+"""
+import csv
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .exportacao import filtrar_ordens
+from .models import OrdemCompra
+from .utils import chave_pdf_ordem_compra, gerar_pdf_ordem_compra
+
+logger = logging.getLogger(__name__)
+
+STATUS_PADRAO = 'APROVADO,CONCLUIDO'
+PROCESSOS_PADRAO = min(4, os.cpu_count() or 1)
+COLUNAS_MANIFESTO = ['ordem_compra_id', 'numero_os', 'arquivo', 'hash_audit', 'sha256', 'tamanho_bytes', 'erro']
+
+
+def ids_pacote(inicio=None, fim=None, unidade=None, status=None):
+    consulta = filtrar_ordens(inicio, fim, unidade, status or STATUS_PADRAO)
+    return list(consulta.order_by('data_os', 'id').values_list('id', flat=True))
+
+
+def _inicializar_processo():
+    # Necessário quando o start method é 'spawn'/'forkserver'; inofensivo com 'fork'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pweb.settings')
+    django.setup()
+
+
+def _erro(oc_id, mensagem):
+    return oc_id, '', None, None, None, None, mensagem
+
+
+def _sem_resposta(ids):
+    """Linhas de erro para as OCs em voo ou ainda não enviadas quando o pool para de responder."""
+    limite = settings.PDF_PACOTE_TEMPO_LIMITE_S
+    logger.error("Nenhum PDF do pacote ficou pronto em %s s; %s OC(s) marcadas com erro", limite, len(ids))
+    for oc_id in ids:
+        yield _erro(oc_id, f"Sem resposta do gerador de PDFs em {limite} s")
+
+
+def renderizar(oc_id):
+    """Roda no processo filho. Devolve (id, numero_os, nome, pdf, hash_audit, sha256, erro)."""
+    try:
+        oc = OrdemCompra.objects.select_related(
+            'unidade', 'solicitante', 'centro_custo', 'aprovado_por').get(pk=oc_id)
+        pdf, nome = gerar_pdf_ordem_compra(oc)
+        if not pdf:
+            return oc_id, oc.numero_os, None, None, None, None, "Falha na renderização (WeasyPrint indisponível?)"
+        hash_audit = chave_pdf_ordem_compra(oc)[:12].upper()
+        return oc_id, oc.numero_os, nome, pdf, hash_audit, hashlib.sha256(pdf).hexdigest(), ''
+    except Exception as e:
+        return _erro(oc_id, f"{type(e).__name__}: {e}")
+
+
+def _renderizar_no_executor_pdf(oc_id):
+    try:
+        return renderizar(oc_id)
+    finally:
+        # No executor de threads a conexão é da thread, não de uma requisição
+        close_old_connections()
+
+
+def _renderizar_em_paralelo(ids, processos):
+    """Gera os resultados conforme ficam prontos, com no máximo processos*2 em voo."""
+    if processos <= 1:
+        for oc_id in ids:
+            yield renderizar(oc_id)
+        return
+
+    # Conexões abertas não podem ser herdadas pelos filhos do fork
+    connections.close_all()
+    try:
+        pool = multiprocessing.Pool(processos, initializer=_inicializar_processo)
+    except OSError:
+        logger.warning("Não foi possível criar o pool de processos; renderizando os PDFs em sequência",
+                       exc_info=True)
+        yield from _renderizar_em_paralelo(ids, 1)
+        return
+    prontos = queue.Queue()
+    pendentes = iter(ids)
+    em_voo = set()
+    with pool:
+        def enviar():
+            oc_id = next(pendentes, None)
+            if oc_id is None:
+                return
+            em_voo.add(oc_id)
+            pool.apply_async(renderizar, (oc_id,), callback=prontos.put,
+                             error_callback=lambda e, oc_id=oc_id: prontos.put(
+                                 _erro(oc_id, f"{type(e).__name__}: {e}")))
+
+        for _ in range(processos * 2):
+            enviar()
+        while em_voo:
+            try:
+                resultado = prontos.get(timeout=settings.PDF_PACOTE_TEMPO_LIMITE_S)
+            except queue.Empty:
+                # Um filho morto (OOM, sinal) não chama callback: sem isto o fluxo esperaria para sempre
+                yield from _sem_resposta(sorted(em_voo) + list(pendentes))
+                return
+            em_voo.discard(resultado[0])
+            yield resultado
+            enviar()
+
+
+def _renderizar_no_executor(ids, executor, em_voo_max):
+    """Como _renderizar_em_paralelo, num concurrent.futures.Executor já existente (o da view)."""
+    pendentes = iter(ids)
+    futuros = {}
+
+    def enviar():
+        oc_id = next(pendentes, None)
+        if oc_id is not None:
+            futuros[executor.submit(_renderizar_no_executor_pdf, oc_id)] = oc_id
+
+    for _ in range(em_voo_max):
+        enviar()
+    while futuros:
+        prontos, _ = wait(futuros, timeout=settings.PDF_PACOTE_TEMPO_LIMITE_S, return_when=FIRST_COMPLETED)
+        if not prontos:
+            for futuro in futuros:
+                futuro.cancel()
+            yield from _sem_resposta(sorted(futuros.values()) + list(pendentes))
+            return
+        for futuro in prontos:
+            oc_id = futuros.pop(futuro)
+            try:
+                yield futuro.result()
+            except Exception as e:
+                # BrokenProcessPool: o filho do pool 'spawn' morreu com a OC em mãos
+                yield _erro(oc_id, f"{type(e).__name__}: {e}")
+            enviar()
+
+
+class _FluxoZip:
+    """Saída sem seek para o ZipFile: acumula os bytes até serem drenados."""
+    def __init__(self):
+        self.pedacos = []
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados, self.pedacos = b''.join(self.pedacos), []
+        return dados
+
+
+def gerar_zip(ids, processos=1, executor=None):
+    """
+    Gera o ZIP em pedaços de bytes: um pedaço por PDF concluído, e o manifesto
+    no final. Com `executor` (a view) os PDFs são renderizados nele; senão num
+    multiprocessing.Pool de `processos`, só fora de requisições (gerar_pacote_pdf).
+    """
+    fluxo = _FluxoZip()
+    # O manifesto só vai para o ZIP no final; acima de 1 MB fica em disco
+    manifesto = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', encoding='utf-8', newline='')
+    escritor = csv.writer(manifesto, delimiter=';')
+    escritor.writerow(COLUNAS_MANIFESTO)
+    with zipfile.ZipFile(fluxo, 'w', zipfile.ZIP_DEFLATED) as zf:
+        if executor is not None:
+            resultados = _renderizar_no_executor(ids, executor, settings.PDF_EXECUTOR_LIMITE * 2)
+        else:
+            resultados = _renderizar_em_paralelo(ids, processos)
+        for oc_id, numero_os, nome, pdf, hash_audit, sha256, erro in resultados:
+            if pdf:
+                zf.writestr(nome, pdf)
+            escritor.writerow([oc_id, numero_os, nome or '', hash_audit or '', sha256 or '',
+                               len(pdf) if pdf else '', erro])
+            dados = fluxo.drenar()
+            if dados:
+                yield dados
+        manifesto.seek(0)
+        with zf.open('manifesto.csv', 'w') as destino:
+            destino.write('\ufeff'.encode())  # BOM: o Excel reconhece o UTF-8
+            for linha in manifesto:
+                destino.write(linha.encode())
+    manifesto.close()
+    yield fluxo.drenar()
@@ -0,0 +1,52 @@
+"""
+Dados de referência do formulário de OC (unidades, solicitantes, centros de custo).
+
+Servidos num único JSON versionado. Cada processo guarda o JSON pronto em
+memória; os signals de home/signals.py incrementam a VersaoCache 'referencias'
+quando algum cadastro muda, o que invalida o cache de todos os processos.
+"""
+import json
+import threading
+
+from .models import CentroCusto, Solicitante, Unidade, VersaoCache
+
+CHAVE_VERSAO = 'referencias'
+
+_lock = threading.Lock()
+_cache = {'versao': None, 'conteudo': None}
+
+
+def _montar(versao):
+    dados = {
+        'versao': versao,
+        'unidades': list(Unidade.objects.values('id', 'abreviacao', 'nome', 'razao_social', 'cnpj')),
+        'solicitantes': list(Solicitante.objects.order_by('nome').values('id', 'nome', 'telefone')),
+        'centros_custo': list(CentroCusto.objects.order_by('codigo').values('id', 'codigo', 'descricao')),
+    }
+    return json.dumps(dados, ensure_ascii=False).encode()
+
+
+def versao_atual():
+    return VersaoCache.atual(CHAVE_VERSAO)
+
+
+def obter(versao=None):
+    """Devolve (versao, json_bytes), remontando só se a versão do banco mudou."""
+    versao = versao or versao_atual()
+    with _lock:
+        if _cache['versao'] != versao:
+            _cache['conteudo'] = _montar(versao)
+            _cache['versao'] = versao
+        return versao, _cache['conteudo']
+
+
+def invalidar():
+    """Chamado pelos signals: descarta o cache local e avisa os outros processos."""
+    VersaoCache.incrementar(CHAVE_VERSAO)
+    with _lock:
+        _cache['versao'] = None
+        _cache['conteudo'] = None
+
+
+def etag(versao):
+    return f'"ref-{versao}"'
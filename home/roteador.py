@@ -0,0 +1,236 @@
+"""
+Leituras de relatório na réplica do banco (alias 'replica').
+
+Dashboard, lista de NFs, exportações, busca e relatório orçado x realizado só
+leem e agregam: com settings.BANCO_REPLICA_ATIVA essas consultas vão para a
+réplica e deixam o primário ('default') para a criação e a aprovação de OCs.
+Todo o resto continua no primário.
+
+O que marca uma leitura como de relatório:
+- `with relatorio():`, o decorador `leitura_relatorio` (views função, sync
+  ou async) ou o `RelatorioMixin` (class-based views, inclusive a renderização
+  do TemplateResponse);
+- a dica `relatorio` no queryset (`para_relatorio(Modelo)`), para consultas
+  avaliadas depois que a view retornou, como o CSV transmitido em streaming.
+
+RoteadorReplica (settings.DATABASE_ROUTERS) manda uma leitura de relatório
+para o primário quando:
+- o usuário acabou de gravar (ler o que escreveu): o ReplicaMiddleware marca
+  toda requisição POST/PUT/PATCH/DELETE e deixa um cookie que mantém as leituras
+  dele no primário por BANCO_REPLICA_GRUDE_S segundos; uma gravação no meio
+  de uma requisição também passa o resto dela para o primário;
+- a réplica está atrasada mais que BANCO_REPLICA_ATRASO_MAX_S ou não
+  responde (verificado no máximo a cada BANCO_REPLICA_VERIFICAR_S);
+- o modelo não é do app home (sessão, usuários e permissões ficam no primário).
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+ALIAS_REPLICA = 'replica'
+DICA = 'relatorio'
+COOKIE_PRIMARIO = 'ler_primario_ate'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+# Só no PostgreSQL: 0 se a réplica já aplicou tudo o que recebeu (sem escrita
+# recente no primário o replay_timestamp fica velho sem haver atraso)
+SQL_ATRASO = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_modo_relatorio = ContextVar('modo_relatorio', default=False)
+# None fora de requisições; o ReplicaMiddleware põe False/True em cada uma
+_ler_primario = ContextVar('ler_primario', default=None)
+
+
+# --- Marcação das leituras de relatório ---
+
+@contextmanager
+def relatorio():
+    token = _modo_relatorio.set(True)
+    try:
+        yield
+    finally:
+        _modo_relatorio.reset(token)
+
+
+def leitura_relatorio(view):
+    """Decorador de views função: as consultas feitas dentro da view são de relatório."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def envoltorio(request, *args, **kwargs):
+            with relatorio():
+                return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def envoltorio(request, *args, **kwargs):
+            with relatorio():
+                return view(request, *args, **kwargs)
+    return envoltorio
+
+
+class RelatorioMixin:
+    """Primeiro na herança da view: dispatch() e a renderização do template leem da réplica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with relatorio():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+
+
+def para_relatorio(modelo):
+    """Manager com a dica de relatório: vale para o queryset onde e quando ele for avaliado."""
+    return modelo._default_manager.db_manager(hints={DICA: True})
+
+
+# --- Atraso da réplica ---
+
+def medir_atraso(alias=ALIAS_REPLICA):
+    """Segundos de atraso da réplica. Fora do PostgreSQL não há replicação a medir: 0."""
+    conexao = connections[alias]
+    if conexao.vendor != 'postgresql':
+        return 0.0
+    with conexao.cursor() as cursor:
+        cursor.execute(SQL_ATRASO)
+        valor = cursor.fetchone()[0]
+    return float(valor or 0)
+
+
+class _EstadoReplica:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lock_leituras = threading.Lock()
+        self.verificada_em = None
+        self.atraso = None  # None: réplica não respondeu
+        self.leituras = {}
+
+    def em_dia(self):
+        agora = time.monotonic()
+        intervalo = getattr(settings, 'BANCO_REPLICA_VERIFICAR_S', 5)
+        if self.verificada_em is None or agora - self.verificada_em >= intervalo:
+            # Uma thread mede; as outras seguem com a última medição
+            if self._lock.acquire(blocking=self.verificada_em is None):
+                try:
+                    self._verificar(agora)
+                finally:
+                    self._lock.release()
+        atraso = self.atraso
+        return atraso is not None and atraso <= getattr(settings, 'BANCO_REPLICA_ATRASO_MAX_S', 5)
+
+    def _verificar(self, agora):
+        try:
+            atraso = medir_atraso()
+        except DatabaseError:
+            logger.warning("Réplica de leitura indisponível; relatórios lidos do primário", exc_info=True)
+            atraso = None
+        else:
+            if atraso > getattr(settings, 'BANCO_REPLICA_ATRASO_MAX_S', 5):
+                logger.warning("Réplica de leitura %.1f s atrasada; relatórios lidos do primário", atraso)
+        self.atraso = atraso
+        self.verificada_em = agora
+
+    def registrar(self, destino):
+        with self._lock_leituras:
+            self.leituras[destino] = self.leituras.get(destino, 0) + 1
+
+    def esquecer(self):
+        """Força nova medição na próxima leitura (testes)."""
+        self.verificada_em = None
+        self.atraso = None
+
+
+estado_replica = _EstadoReplica()
+
+
+# --- Roteador ---
+
+class RoteadorReplica:
+
+    def db_for_read(self, model, **hints):
+        if not (hints.get(DICA) or _modo_relatorio.get()) or not getattr(settings, 'BANCO_REPLICA_ATIVA', False):
+            return None
+        if model._meta.app_label != 'home':
+            return None
+        if _ler_primario.get():
+            estado_replica.registrar('primario_gravacao')
+            return DEFAULT_DB_ALIAS
+        if not estado_replica.em_dia():
+            estado_replica.registrar('primario_atraso')
+            return DEFAULT_DB_ALIAS
+        estado_replica.registrar('replica')
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        # Gravou nesta requisição: o resto dela lê do primário
+        if _ler_primario.get() is False:
+            _ler_primario.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        bancos = {DEFAULT_DB_ALIAS, ALIAS_REPLICA}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+
+# --- Ler o que escreveu ---
+
+class ReplicaMiddleware:
+    """
+    Antes da sessão no MIDDLEWARE. O cookie guarda até quando (epoch) as
+    leituras do navegador ficam no primário: vale entre instâncias da Vercel,
+    que não compartilham memória.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self._acall(request)
+        token = self._inicio(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _ler_primario.reset(token)
+        return self._fim(request, response)
+
+    async def _acall(self, request):
+        token = self._inicio(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _ler_primario.reset(token)
+        return self._fim(request, response)
+
+    def _inicio(self, request):
+        try:
+            ate = float(request.COOKIES.get(COOKIE_PRIMARIO, 0))
+        except ValueError:
+            ate = 0
+        return _ler_primario.set(request.method not in METODOS_SEGUROS or ate > time.time())
+
+    def _fim(self, request, response):
+        if request.method not in METODOS_SEGUROS and response.status_code < 500:
+            grude = getattr(settings, 'BANCO_REPLICA_GRUDE_S', 10)
+            response.set_cookie(COOKIE_PRIMARIO, f"{time.time() + grude:.0f}", max_age=grude,
+                                httponly=True, samesite='Lax')
+        return response
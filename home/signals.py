@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache_paginas, referencias
+from .armazenamento import eh_blob
+from .models import CentroCusto, NotaFiscal, OrdemCompra, Solicitante, Unidade
+
+
+@receiver([post_save, post_delete], sender=Unidade)
+@receiver([post_save, post_delete], sender=Solicitante)
+@receiver([post_save, post_delete], sender=CentroCusto)
+def invalidar_referencias(sender, **kwargs):
+    referencias.invalidar()
+
+
+# --- Cache de páginas (home/cache_paginas.py) ---
+# Transições (UPDATE) e importações (bulk_create) não disparam estes signals:
+# home/transicoes.py e home/importacao.py chamam cache_paginas.invalidar().
+
+@receiver([post_save, post_delete], sender=OrdemCompra)
+def invalidar_paginas_ordem(sender, instance, **kwargs):
+    cache_paginas.invalidar([instance.status])
+
+
+@receiver([post_save, post_delete], sender=NotaFiscal)
+def invalidar_paginas_nota(sender, instance, **kwargs):
+    cache_paginas.invalidar(['CONCLUIDO'], nf=True)
+
+
+# --- Referências dos arquivos deduplicados (home/armazenamento.py) ---
+
+CAMPOS_ARQUIVO = {OrdemCompra: 'anexo_orcamento', NotaFiscal: 'arquivo_nf'}
+
+
+def _liberar_arquivo(campo, nome):
+    # Só depois do commit: se a transação for desfeita, a referência continua valendo.
+    # Arquivos antigos (fora de blobs/) podem ser compartilhados sem contagem: ficam.
+    if eh_blob(nome):
+        transaction.on_commit(lambda: campo.storage.delete(nome))
+
+
+@receiver(pre_save, sender=OrdemCompra)
+@receiver(pre_save, sender=NotaFiscal)
+def guardar_arquivo_anterior(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._arquivo_anterior = (sender.objects.filter(pk=instance.pk)
+                                      .values_list(CAMPOS_ARQUIVO[sender], flat=True).first())
+
+
+@receiver(post_save, sender=OrdemCompra)
+@receiver(post_save, sender=NotaFiscal)
+def liberar_arquivo_substituido(sender, instance, **kwargs):
+    anterior = getattr(instance, '_arquivo_anterior', None)
+    instance._arquivo_anterior = None
+    nome_campo = CAMPOS_ARQUIVO[sender]
+    if anterior and anterior != getattr(instance, nome_campo).name:
+        _liberar_arquivo(sender._meta.get_field(nome_campo), anterior)
+
+
+@receiver(post_delete, sender=OrdemCompra)
+@receiver(post_delete, sender=NotaFiscal)
+def liberar_arquivo_removido(sender, instance, **kwargs):
+    nome_campo = CAMPOS_ARQUIVO[sender]
+    _liberar_arquivo(sender._meta.get_field(nome_campo), getattr(instance, nome_campo).name)
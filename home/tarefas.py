@@ -0,0 +1,125 @@
+"""
+Fila de geração de PDFs das Ordens de Compra.
+
+A aprovação só enfileira uma TarefaPdf; o comando `processar_pdfs` consome a
+fila com um pool de processos (o WeasyPrint é CPU-bound) e grava o PDF na
+própria tarefa, de onde ele é baixado.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TarefaPdf
+from .utils import renderizar_pdf_ordem_compra
+
+logger = logging.getLogger(__name__)
+
+# Tarefa "PROCESSANDO" há mais tempo que isso é considerada abandonada (worker morreu)
+TEMPO_LIMITE_PROCESSAMENTO = timedelta(minutes=10)
+
+
+def enfileirar_pdf(ordem_compra):
+    """Cria a tarefa de PDF da OC, reaproveitando uma que ainda esteja na fila."""
+    tarefa = (TarefaPdf.objects
+              .filter(ordem_compra=ordem_compra, status__in=['PENDENTE', 'PROCESSANDO'])
+              .first())
+    return tarefa or TarefaPdf.objects.create(ordem_compra=ordem_compra)
+
+
+def enfileirar_lote(ordem_compra_ids, lote):
+    """Enfileira de uma vez os PDFs de uma aprovação em lote; o pool os renderiza em paralelo."""
+    return TarefaPdf.objects.bulk_create([
+        TarefaPdf(ordem_compra_id=oc_id, lote=lote) for oc_id in ordem_compra_ids
+    ])
+
+
+def ultima_tarefa(ordem_compra_id):
+    return (TarefaPdf.objects.filter(ordem_compra_id=ordem_compra_id)
+            .defer('pdf').order_by('-criado_em', '-id').first())
+
+
+def reivindicar_tarefas(limite):
+    """
+    Marca até `limite` tarefas como PROCESSANDO e devolve seus ids.
+    Cada tarefa é tomada com um UPDATE condicional: se outro worker chegou
+    antes, o UPDATE afeta 0 linhas e a tarefa é ignorada.
+    """
+    agora = timezone.now()
+    candidatas = (TarefaPdf.objects
+                  .filter(Q(status='PENDENTE', disponivel_em__lte=agora) |
+                          Q(status='PROCESSANDO', iniciado_em__lt=agora - TEMPO_LIMITE_PROCESSAMENTO))
+                  .order_by('disponivel_em')
+                  .values_list('id', 'status')[:limite])
+    return [tarefa_id for tarefa_id, status in candidatas if _tomar(tarefa_id, status, agora)]
+
+
+def _tomar(tarefa_id, status, agora):
+    """
+    UPDATE condicional de uma candidata. Uma abandonada só é tomada se ainda
+    estiver vencida: quem a retomou antes já renovou o iniciado_em.
+    """
+    filtro = {'pk': tarefa_id, 'status': status}
+    if status == 'PROCESSANDO':
+        filtro['iniciado_em__lt'] = agora - TEMPO_LIMITE_PROCESSAMENTO
+    return TarefaPdf.objects.filter(**filtro).update(status='PROCESSANDO', iniciado_em=agora) > 0
+
+
+def processar_tarefa(tarefa_id):
+    """
+    Renderiza o PDF de uma tarefa já reivindicada e registra o resultado.
+    Roda nos processos do pool: um erro aqui (tarefa apagada junto com a OC,
+    banco fora do ar ao gravar) é registrado no log e não derruba o worker;
+    a tarefa, se ainda existir, volta à fila quando vencer o TEMPO_LIMITE_PROCESSAMENTO.
+    """
+    try:
+        return _processar(tarefa_id)
+    except Exception:
+        logger.exception("Tarefa de PDF %s não pôde ser processada", tarefa_id)
+        close_old_connections()
+        return tarefa_id, 'ERRO'
+
+
+def _processar(tarefa_id):
+    tarefa = TarefaPdf.objects.select_related(
+        'ordem_compra__unidade', 'ordem_compra__solicitante',
+        'ordem_compra__centro_custo', 'ordem_compra__aprovado_por',
+    ).get(pk=tarefa_id)
+    tarefa.tentativas += 1
+    inicio = time.perf_counter()
+    try:
+        pdf, nome = renderizar_pdf_ordem_compra(tarefa.ordem_compra)
+    except ImportError as e:
+        # WeasyPrint ausente não se resolve tentando de novo
+        return _registrar_falha(tarefa, f"ImportError: {e}", definitiva=True)
+    except OSError as e:
+        return _registrar_falha(tarefa, f"OSError: {e}")
+    except Exception as e:
+        # Erro de dados/template: repetir daria o mesmo resultado
+        return _registrar_falha(tarefa, f"{type(e).__name__}: {e}", definitiva=True)
+
+    tarefa.tempo_render_ms = int((time.perf_counter() - inicio) * 1000)
+    tarefa.status = 'CONCLUIDA'
+    tarefa.pdf = pdf
+    tarefa.nome_arquivo = nome
+    tarefa.tamanho_bytes = len(pdf)
+    tarefa.erro = ''
+    tarefa.concluido_em = timezone.now()
+    tarefa.save()
+    return tarefa.id, tarefa.status
+
+
+def _registrar_falha(tarefa, erro, definitiva=False):
+    tarefa.erro = erro
+    if definitiva or tarefa.tentativas >= tarefa.max_tentativas:
+        tarefa.status = 'FALHOU'
+        tarefa.concluido_em = timezone.now()
+    else:
+        # Backoff exponencial: 30s, 60s, 120s...
+        tarefa.status = 'PENDENTE'
+        tarefa.disponivel_em = timezone.now() + timedelta(seconds=30 * 2 ** (tarefa.tentativas - 1))
+    tarefa.save()
+    return tarefa.id, tarefa.status
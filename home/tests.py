@@ -0,0 +1,969 @@
+import csv
+import datetime
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Executor, Future
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import OperationalError, connection, transaction
+from django.test import (RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metricas, pacote_pdf, tarefas, transicoes, utils
+from .armazenamento import ArmazenamentoLocalDeduplicado
+from .banco.pool import PoolConexoes, PoolEsgotado
+from .busca import buscar
+from .downloads import responder_arquivo
+from .importacao import importar_notas, importar_ordens
+from .inicializacao import executar_medicao
+from .models import (ArquivoBlob, CentroCusto, ConsumoOrcamento, HistoricoStatus, IndiceBusca, NotaFiscal,
+                     OrcamentoExcedido, OrdemCompra, ResumoDashboard, Solicitante, TarefaPdf, Unidade)
+from .roteador import COOKIE_PRIMARIO, estado_replica
+from .views import ListaPendenciasView
+
+
+class DadosBaseMixin:
+    """Cadastros mínimos para criar Ordens de Compra nos testes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('gestor', password='senha')
+        cls.unidade = Unidade.objects.create(abreviacao='HMI', nome='Hospital', razao_social='Hospital SA', cnpj='00.000.000/0001-00')
+        cls.centro_custo = CentroCusto.objects.create(codigo='100', descricao='Manutenção')
+        cls.solicitante = Solicitante.objects.create(nome='Fulano', email='fulano@exemplo.com')
+
+    @classmethod
+    def criar_oc(cls, **kwargs):
+        dados = dict(
+            numero_os='OS-1', data_os=datetime.date(2025, 1, 15), solicitante=cls.solicitante,
+            setor_execucao='Manutenção', unidade=cls.unidade, centro_custo=cls.centro_custo,
+            objetivo_compra='MATERIAL', especialidade='ELETRICA', conta_contabil='MANUT_PREDIAL',
+            descricao_servico='Troca de lâmpadas', justificativa='Preventiva', fornecedor='Fornecedor X',
+            condicao_pagamento='30 dias', valor_estimado=100, anexo_orcamento='orcamentos/teste.pdf',
+            status='SOLICITADO',
+        )
+        dados.update(kwargs)
+        return OrdemCompra.objects.create(**dados)
+
+    @classmethod
+    def criar_nf(cls, oc, **kwargs):
+        dados = dict(
+            ordem_compra=oc, numero_nf='NF-1', data_emissao=datetime.date(2025, 2, 1),
+            valor_final=90, arquivo_nf='notas_fiscais/teste.pdf', responsavel_lancamento=cls.usuario,
+        )
+        dados.update(kwargs)
+        return NotaFiscal.objects.create(**dados)
+
+
+# Mede as consultas da renderização; o cache de páginas acrescentaria a leitura das versões
+@override_settings(CACHE_PAGINAS_ATIVO=False)
+class ListagensTest(DadosBaseMixin, TestCase):
+
+    def popular(self, quantidade):
+        for i in range(quantidade):
+            self.criar_nf(self.criar_oc(numero_os=f'OS-NF-{i}', status='APROVADO'), numero_nf=f'NF-{i}')
+            self.criar_oc(numero_os=f'OS-{i}')
+
+    def test_lista_pendencias_numero_fixo_de_consultas(self):
+        for quantidade in (2, 20):
+            self.popular(quantidade)
+            with self.assertNumQueries(1):
+                self.client.get(reverse('lista_pendencias'))
+
+    def test_lista_notas_numero_fixo_de_consultas(self):
+        for quantidade in (2, 20):
+            self.popular(quantidade)
+            with self.assertNumQueries(1):
+                self.client.get(reverse('lista_notasfiscais'))
+
+    @mock.patch.object(ListaPendenciasView, 'tamanho_pagina', 3)
+    def test_paginacao_por_cursor_percorre_todas_as_linhas(self):
+        self.popular(7)
+        vistos, cursor = [], None
+        while True:
+            resposta = self.client.get(reverse('lista_pendencias'), {'cursor': cursor} if cursor else {})
+            vistos += [oc.id for oc in resposta.context['solicitacoes']]
+            cursor = resposta.context['proximo_cursor']
+            if not cursor:
+                break
+        esperado = list(OrdemCompra.objects.filter(status='SOLICITADO')
+                        .order_by('-data_criacao', '-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperado)
+
+
+class BuscaOcNotaFiscalTest(DadosBaseMixin, TestCase):
+    """Autocomplete do lançamento de NF: trecho do número ou do fornecedor, sem acento nem caixa."""
+
+    def buscar(self, termo):
+        resposta = self.client.get(reverse('ajax_busca_oc'), {'q': termo}, HTTP_HOST='localhost')
+        return [item['id'] for item in resposta.json()]
+
+    def test_fornecedor_pelo_indice_de_busca(self):
+        oc = self.criar_oc(numero_os='OS-77', status='APROVADO', aprovado_por=self.usuario,
+                           fornecedor='Elétrica Souza Ltda')
+        com_nf = self.criar_oc(numero_os='OS-78', status='APROVADO', aprovado_por=self.usuario,
+                               fornecedor='Elétrica Souza Ltda')
+        self.criar_nf(com_nf)
+        self.criar_oc(numero_os='OS-79', fornecedor='Elétrica Souza Ltda')
+        for termo in ('souza', 'ouza lt', 'ELETRICA sou', 'os-7', 's-77', str(oc.pk)):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.buscar(termo), [oc.pk], termo)
+        self.assertEqual(self.buscar('mercado'), [])
+
+
+@override_settings(CACHE_PAGINAS_ATIVO=True)
+class CachePaginasTest(DadosBaseMixin, TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        # Sem cookie CSRF a página não entra no cache (o HTML leva o token)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+
+    def x_cache(self, url):
+        resposta = self.client.get(url, HTTP_HOST='localhost')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta['X-Cache']
+
+    def test_aprovacao_invalida_detalhe_e_pendencias(self):
+        oc = self.criar_oc()
+        detalhe, pendencias = reverse('detalhe_aprovacao', args=[oc.pk]), reverse('lista_pendencias')
+        self.assertEqual([self.x_cache(detalhe), self.x_cache(detalhe)], ['MISS', 'HIT'])
+        self.assertEqual([self.x_cache(pendencias), self.x_cache(pendencias)], ['MISS', 'HIT'])
+        self.assertContains(self.client.get(pendencias, HTTP_HOST='localhost'), f'value="{oc.pk}"')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transicoes.aprovar(oc, self.usuario)
+        self.assertEqual([self.x_cache(detalhe), self.x_cache(detalhe)], ['MISS', 'HIT'])
+        self.assertEqual([self.x_cache(pendencias), self.x_cache(pendencias)], ['MISS', 'HIT'])
+        self.assertNotContains(self.client.get(pendencias, HTTP_HOST='localhost'), f'value="{oc.pk}"')
+
+
+class BuscaTextualTest(DadosBaseMixin, TestCase):
+    """busca.buscar sobre o índice (FTS5 no SQLite): relevância, paginação e triggers."""
+
+    def test_mais_ocorrencias_primeiro(self):
+        uma = self.criar_oc(numero_os='OS-A', descricao_servico='Reparo da bomba')
+        tres = self.criar_oc(numero_os='OS-B', descricao_servico='Bomba reserva',
+                             justificativa='Bomba principal e bomba auxiliar paradas')
+        self.criar_oc(numero_os='OS-C', descricao_servico='Troca de lâmpadas')
+        ordens, tem_proxima = buscar('bomba')
+        self.assertEqual([oc.pk for oc in ordens], [tres.pk, uma.pk])
+        self.assertFalse(tem_proxima)
+        # Todos os termos, por prefixo e sem acento
+        self.assertEqual([oc.pk for oc in buscar('bom princ')[0]], [tres.pk])
+        self.assertEqual([oc.pk for oc in buscar('LAMPADA')[0]], [OrdemCompra.objects.get(numero_os='OS-C').pk])
+
+    def test_paginas_sem_repeticao_nem_lacuna(self):
+        ids = {self.criar_oc(numero_os=f'OS-{i}', fornecedor='Hidráulica Central').pk for i in range(5)}
+        paginas = [buscar('hidraulica', pagina=p, tamanho=2) for p in (1, 2, 3, 4)]
+        self.assertEqual([(len(ordens), tem_proxima) for ordens, tem_proxima in paginas],
+                         [(2, True), (2, True), (1, False), (0, False)])
+        vistos = [oc.pk for ordens, _ in paginas for oc in ordens]
+        self.assertEqual(len(vistos), len(set(vistos)))
+        self.assertEqual(set(vistos), ids)
+
+    def test_edicao_atualiza_o_indice(self):
+        oc = self.criar_oc(fornecedor='Fornecedor Antigo')
+        oc.fornecedor = 'Casa das Ferragens'
+        oc.save()
+        self.assertEqual(buscar('antigo'), ([], False))
+        self.assertEqual([o.pk for o in buscar('ferragens')[0]], [oc.pk])
+        oc.delete()
+        self.assertEqual(buscar('ferragens'), ([], False))
+
+
+class TransicoesTest(DadosBaseMixin, TestCase):
+
+    def test_segunda_aprovacao_com_instancia_antiga_gera_conflito(self):
+        oc = self.criar_oc()
+        # Dois usuários abriram a mesma OC enquanto ela ainda estava SOLICITADO
+        tela_a, tela_b = OrdemCompra.objects.get(pk=oc.pk), OrdemCompra.objects.get(pk=oc.pk)
+        transicoes.aprovar(tela_a, self.usuario)
+        with self.assertRaises(transicoes.ConflitoTransicao) as erro:
+            transicoes.reprovar(tela_b, 'Sem orçamento')
+        self.assertEqual(erro.exception.status_atual, 'APROVADO')
+        oc.refresh_from_db()
+        self.assertEqual((oc.status, oc.motivo_reprovacao), ('APROVADO', None))
+        self.assertEqual(ResumoDashboard.totais()['aprovadas'], 1)
+        self.assertEqual(ResumoDashboard.totais()['pendentes'], 0)
+
+    def test_aprovacao_com_instancia_antiga_nao_altera_contadores(self):
+        # Versão determinística de TransicoesConcorrentesTest (pulado no SQLite): a OC
+        # muda de status por baixo de uma instância já carregada
+        CentroCusto.objects.filter(pk=self.centro_custo.pk).update(orcamento_mensal=1000)
+        oc = self.criar_oc()
+        antiga = OrdemCompra.objects.get(pk=oc.pk)
+        transicoes.aprovar(oc, self.usuario)
+
+        def contadores():
+            return (sorted(ResumoDashboard.objects.values_list('status', 'unidade_id', 'mes', 'quantidade',
+                                                               'valor_estimado', 'valor_realizado')),
+                    sorted(ConsumoOrcamento.objects.values_list('centro_custo_id', 'tipo', 'inicio',
+                                                                'comprometido', 'consumido')),
+                    HistoricoStatus.objects.count())
+
+        antes = contadores()
+        for transicao in (lambda: transicoes.aprovar(antiga, self.usuario),
+                          lambda: transicoes.reprovar(antiga, 'Sem orçamento')):
+            with self.assertRaises(transicoes.ConflitoTransicao) as erro:
+                transicao()
+            self.assertEqual((erro.exception.status_esperado, erro.exception.status_atual), ('SOLICITADO', 'APROVADO'))
+        self.assertEqual(contadores(), antes)
+        self.assertEqual(ResumoDashboard.totais()['aprovadas'], 1)
+        oc.refresh_from_db()
+        self.assertEqual((oc.status, oc.aprovado_por_id, oc.motivo_reprovacao), ('APROVADO', self.usuario.pk, None))
+
+    def test_save_nao_sobrescreve_status_gravado_por_outra_transicao(self):
+        oc = self.criar_oc()
+        antiga = OrdemCompra.objects.get(pk=oc.pk)
+        transicoes.aprovar(oc, self.usuario)
+        antiga.fornecedor = 'Fornecedor Y'
+        antiga.save()
+        oc.refresh_from_db()
+        self.assertEqual((oc.status, oc.fornecedor), ('APROVADO', 'Fornecedor Y'))
+
+    def test_lote_ignora_ordens_fora_do_status_de_origem(self):
+        pendente, rascunho = self.criar_oc(numero_os='OS-A'), self.criar_oc(numero_os='OS-B', status='RASCUNHO')
+        movidos = transicoes.transicionar_em_lote([pendente.pk, rascunho.pk], 'APROVADO', aprovado_por=self.usuario)
+        self.assertEqual(movidos, [pendente.pk])
+
+    def test_lote_sem_ordens_movidas_nao_anuncia_sucesso(self):
+        oc = self.criar_oc(status='APROVADO', aprovado_por=self.usuario)
+        self.client.force_login(self.usuario)
+        for acao in ('aprovar', 'reprovar'):
+            resposta = self.client.post(reverse('acao_em_lote'), {
+                'acao': acao, 'selecionadas': [oc.pk], 'motivo_reprovacao': 'Duplicada',
+            }, HTTP_HOST='localhost', follow=True)
+            self.assertRedirects(resposta, reverse('lista_pendencias'))
+            self.assertEqual([(m.level_tag, m.message) for m in resposta.context['messages']],
+                             [('warning', '1 solicitação(ões) já tinham sido processadas e foram ignoradas.')])
+
+    def test_paginas_do_lote_so_para_quem_aprovou(self):
+        oc = self.criar_oc()
+        self.client.force_login(self.usuario)
+        resposta = self.client.post(reverse('acao_em_lote'), {'acao': 'aprovar', 'selecionadas': [oc.pk]},
+                                    HTTP_HOST='localhost')
+        lote = TarefaPdf.objects.get(ordem_compra=oc).lote
+        self.assertRedirects(resposta, reverse('lote_aprovacao', args=[lote]), fetch_redirect_response=False)
+        urls = [reverse('lote_aprovacao', args=[lote]), reverse('baixar_lote_pdf', args=[lote])]
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('outro', password='senha'))
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_HOST='localhost').status_code, 404)
+
+        self.client.logout()
+        for url in urls + [reverse('acao_em_lote')]:
+            resposta = self.client.get(url, HTTP_HOST='localhost')
+            self.assertRedirects(resposta, f"{settings.LOGIN_URL}?next={url}", fetch_redirect_response=False)
+
+    def test_nota_fiscal_exige_ordem_aprovada(self):
+        nf = NotaFiscal(ordem_compra=self.criar_oc(), numero_nf='NF-1', data_emissao=datetime.date(2025, 2, 1),
+                        valor_final=90, arquivo_nf='notas_fiscais/teste.pdf', responsavel_lancamento=self.usuario)
+        with self.assertRaises(ValidationError):
+            nf.clean()
+
+
+
+class ResumoDashboardTest(DadosBaseMixin, TestCase):
+
+    def baldes(self):
+        return {(b.status, b.unidade_id, b.mes): (b.quantidade, b.valor_estimado, b.valor_realizado)
+                for b in ResumoDashboard.objects.all() if b.quantidade or b.valor_estimado or b.valor_realizado}
+
+    def test_troca_de_unidade_leva_o_valor_da_nf(self):
+        outra = Unidade.objects.create(abreviacao='HMA', nome='Anexo', razao_social='Anexo SA', cnpj='00.000.000/0002-00')
+        oc = self.criar_oc(status='APROVADO')
+        self.criar_nf(oc, valor_final=150)
+        oc.refresh_from_db()
+        oc.unidade = outra
+        oc.save()
+        incremental = self.baldes()
+        ResumoDashboard.reconstruir()
+        self.assertEqual(incremental, self.baldes())
+        self.assertEqual(incremental[('CONCLUIDO', outra.pk, ResumoDashboard.primeiro_dia(oc.data_criacao))][2], 150)
+
+
+class OrcamentoTest(DadosBaseMixin, TestCase):
+    """Os totais incrementais de ConsumoOrcamento devem bater com um reconstruir() do zero."""
+
+    def totais(self):
+        return {(c.centro_custo_id, c.tipo, c.inicio): (c.comprometido, c.consumido)
+                for c in ConsumoOrcamento.objects.all() if c.comprometido or c.consumido}
+
+    def assertConsumoConsistente(self):
+        incremental = self.totais()
+        ConsumoOrcamento.reconstruir()
+        self.assertEqual(incremental, self.totais())
+
+    def utilizado_no_mes(self, centro_custo=None, data=datetime.date(2025, 1, 1)):
+        consumo = ConsumoOrcamento.objects.get(centro_custo=centro_custo or self.centro_custo, tipo='MES', inicio=data)
+        return consumo.comprometido, consumo.consumido
+
+    def test_reserva_bloqueio_e_sinalizacao(self):
+        CentroCusto.objects.filter(pk=self.centro_custo.pk).update(orcamento_mensal=250)
+        self.assertFalse(self.criar_oc(valor_estimado=200).acima_orcamento)
+        with self.assertRaises(OrcamentoExcedido):
+            self.criar_oc(numero_os='OS-2', valor_estimado=100)
+        self.assertEqual(self.utilizado_no_mes(), (200, 0))
+
+        CentroCusto.objects.filter(pk=self.centro_custo.pk).update(bloquear_acima_orcamento=False)
+        self.assertTrue(self.criar_oc(numero_os='OS-3', valor_estimado=100).acima_orcamento)
+        self.assertEqual(self.utilizado_no_mes(), (300, 0))
+        self.assertConsumoConsistente()
+
+    def test_edicao_de_valor_centro_de_custo_e_data(self):
+        outro = CentroCusto.objects.create(codigo='200', descricao='Obras')
+        oc = self.criar_oc()
+        oc.valor_estimado = 150
+        oc.save()
+        self.assertEqual(self.utilizado_no_mes(), (150, 0))
+        oc.centro_custo, oc.data_os = outro, datetime.date(2025, 3, 10)
+        oc.save()
+        self.assertEqual(self.utilizado_no_mes(), (0, 0))
+        self.assertEqual(self.utilizado_no_mes(outro, datetime.date(2025, 3, 1)), (150, 0))
+        self.assertConsumoConsistente()
+
+    def test_edicao_de_oc_concluida_move_o_valor_da_nf(self):
+        outro = CentroCusto.objects.create(codigo='200', descricao='Obras')
+        oc = self.criar_oc(status='APROVADO')
+        self.criar_nf(oc, valor_final=90)
+        oc.refresh_from_db()
+        oc.centro_custo, oc.data_os = outro, datetime.date(2024, 12, 20)
+        oc.save()
+        self.assertEqual(self.utilizado_no_mes(), (0, 0))
+        self.assertEqual(self.utilizado_no_mes(outro, datetime.date(2024, 12, 1)), (0, 90))
+        self.assertConsumoConsistente()
+
+    def test_reprovacao_libera_o_comprometido(self):
+        oc = self.criar_oc()
+        transicoes.reprovar(oc, 'Sem verba')
+        self.assertEqual(self.utilizado_no_mes(), (0, 0))
+        self.assertConsumoConsistente()
+
+    def test_troca_da_nota_fiscal(self):
+        oc = self.criar_oc(status='APROVADO')
+        nf = self.criar_nf(oc, valor_final=90)
+        self.assertEqual(self.utilizado_no_mes(), (0, 90))
+        nf.valor_final = 95
+        nf.save()
+        self.assertEqual(self.utilizado_no_mes(), (0, 95))
+        nf.delete()
+        nf = self.criar_nf(OrdemCompra.objects.get(pk=oc.pk), numero_nf='NF-2', valor_final=120)
+        self.assertEqual(self.utilizado_no_mes(), (0, 120))
+        self.assertConsumoConsistente()
+
+        # A NF passa (pelo admin) para outra OC aprovada, com o mesmo valor
+        outra_unidade = Unidade.objects.create(abreviacao='HSL', nome='Outro', razao_social='Outro SA', cnpj='1')
+        outro_centro = CentroCusto.objects.create(codigo='200', descricao='Obras')
+        destino = self.criar_oc(numero_os='OS-2', status='APROVADO', unidade=outra_unidade,
+                                centro_custo=outro_centro, data_os=datetime.date(2025, 3, 10))
+        nf.ordem_compra = destino
+        nf.save()
+        oc.refresh_from_db()
+        destino.refresh_from_db()
+        self.assertEqual((oc.status, destino.status), ('APROVADO', 'CONCLUIDO'))
+        self.assertEqual(self.utilizado_no_mes(), (100, 0))
+        self.assertEqual(self.utilizado_no_mes(outro_centro, datetime.date(2025, 3, 1)), (0, 120))
+        self.assertNotIn('nf-2', IndiceBusca.objects.get(pk=oc.pk).texto)
+        self.assertIn('nf-2', IndiceBusca.objects.get(pk=destino.pk).texto)
+        self.assertConsumoConsistente()
+        baldes = lambda: {(b.status, b.unidade_id, b.mes): (b.quantidade, b.valor_estimado, b.valor_realizado)
+                          for b in ResumoDashboard.objects.all() if b.quantidade or b.valor_realizado}
+        incremental = baldes()
+        ResumoDashboard.reconstruir()
+        self.assertEqual(incremental, baldes())
+
+
+
+class FilaPdfTest(DadosBaseMixin, TestCase):
+
+    def test_tarefa_abandonada_e_retomada_por_um_so_worker(self):
+        tarefa = tarefas.enfileirar_pdf(self.criar_oc(status='APROVADO', aprovado_por=self.usuario))
+        vencida = timezone.now() - tarefas.TEMPO_LIMITE_PROCESSAMENTO - datetime.timedelta(minutes=1)
+        TarefaPdf.objects.filter(pk=tarefa.pk).update(status='PROCESSANDO', iniciado_em=vencida)
+        # Dois workers viram a mesma candidata vencida: só o primeiro UPDATE a toma
+        agora = timezone.now()
+        self.assertTrue(tarefas._tomar(tarefa.pk, 'PROCESSANDO', agora))
+        self.assertFalse(tarefas._tomar(tarefa.pk, 'PROCESSANDO', agora))
+        self.assertEqual(tarefas.reivindicar_tarefas(limite=5), [])
+
+    def test_erro_numa_tarefa_nao_derruba_o_worker(self):
+        oc = self.criar_oc(status='APROVADO', aprovado_por=self.usuario)
+        tarefa = tarefas.enfileirar_pdf(oc)
+        self.assertEqual(tarefas.reivindicar_tarefas(limite=5), [tarefa.pk])
+        oc.delete()  # a tarefa vai junto, em cascata
+        with self.assertLogs('home.tarefas', 'ERROR'):
+            self.assertEqual(tarefas.processar_tarefa(tarefa.pk), (tarefa.pk, 'ERRO'))
+
+
+
+class HtmlFalso:
+    """Substitui weasyprint.HTML: conta as renderizações."""
+    renderizados = 0
+
+    def __init__(self, string):
+        self.string = string
+
+    def write_pdf(self):
+        HtmlFalso.renderizados += 1
+        return b'%PDF-1.4 ' + hashlib.sha256(self.string.encode()).hexdigest().encode()
+
+
+class CachePdfTest(DadosBaseMixin, TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        for contexto in (override_settings(PDF_CACHE_DIR=pasta.name),
+                         mock.patch.dict('sys.modules', {'weasyprint': mock.Mock(HTML=HtmlFalso)}),
+                         mock.patch.object(utils, '_cache_total', None),
+                         mock.patch.object(utils, '_cache_gravacoes', 0),
+                         mock.patch.object(HtmlFalso, 'renderizados', 0)):
+            self.enterContext(contexto)
+        self.pasta = pasta.name
+
+    def gerar(self, oc):
+        return utils.gerar_pdf_ordem_compra(OrdemCompra.objects.get(pk=oc.pk))
+
+    def test_oc_inalterada_vem_do_cache_e_alteracoes_invalidam(self):
+        oc = transicoes.aprovar(self.criar_oc(), self.usuario)
+        pdf, nome = self.gerar(oc)
+        self.assertEqual(self.gerar(oc), (pdf, nome))
+        self.assertEqual(HtmlFalso.renderizados, 1)
+
+        oc = OrdemCompra.objects.get(pk=oc.pk)
+        oc.fornecedor = 'Fornecedor Y'
+        oc.save()
+        _, nome_editada = self.gerar(oc)
+        self.assertNotEqual(nome_editada, nome)  # o hash de auditoria acompanha a chave
+        Unidade.objects.filter(pk=self.unidade.pk).update(razao_social='Hospital Ltda')
+        self.gerar(oc)
+        with mock.patch.object(utils, 'PDF_CACHE_VERSAO', utils.PDF_CACHE_VERSAO + 1):
+            self.gerar(oc)
+        self.assertEqual(HtmlFalso.renderizados, 4)
+        self.gerar(oc)
+        self.assertEqual(HtmlFalso.renderizados, 4)
+
+    @override_settings(PDF_CACHE_MAX_BYTES=250)
+    def test_varre_o_diretorio_so_quando_o_total_passa_do_limite(self):
+        with mock.patch.object(utils, '_cache_limitar_tamanho', wraps=utils._cache_limitar_tamanho) as varrer:
+            for letra in 'abc':
+                utils._cache_gravar(letra * 64, b'x' * 100)
+            # 1ª gravação: total desconhecido; 3ª: 300 bytes > 250
+            self.assertEqual(varrer.call_count, 2)
+        self.assertIsNone(utils._cache_ler('a' * 64))
+        self.assertEqual(utils._cache_ler('c' * 64), b'x' * 100)
+        self.assertEqual(utils._cache_total, 200)
+
+    def test_falha_de_gravacao_vai_para_o_log(self):
+        with mock.patch('home.utils.os.makedirs', side_effect=PermissionError('somente leitura')), \
+                self.assertLogs('home.utils', 'WARNING'):
+            utils._cache_gravar('d' * 64, b'%PDF')
+
+
+class MetricasPdfTest(DadosBaseMixin, TestCase):
+
+    def test_pdf_da_view_async_entra_na_rota(self):
+        oc = self.criar_oc(status='APROVADO', aprovado_por=self.usuario)
+
+        def gerar(oc_id, usar_cache):
+            # Roda na thread do executor_pdf, como o WeasyPrint de verdade
+            metricas.registrar_pdf(0.25, 2048)
+            return b'%PDF-1.4 teste', f'OC_{oc_id}.pdf'
+
+        metricas.agregado.zerar()
+        self.addCleanup(metricas.agregado.zerar)
+        with mock.patch('home.utils._gerar_pdf_por_id', gerar):
+            self.assertEqual(self.client.get(reverse('visualizar_pdf', args=[oc.pk])).status_code, 200)
+        texto = metricas.texto_prometheus()
+        self.assertIn('gestao_rota_pdfs_total{rota="visualizar_pdf",metodo="GET"} 1', texto)
+        self.assertIn('gestao_rota_pdf_bytes_total{rota="visualizar_pdf",metodo="GET"} 2048', texto)
+        self.assertIn('gestao_rota_pdf_segundos_total{rota="visualizar_pdf",metodo="GET"} 0.250000', texto)
+
+
+class ImportacaoXlsxTest(DadosBaseMixin, TestCase):
+
+    def planilha(self, cabecalho, *linhas):
+        from openpyxl import Workbook
+        livro = Workbook()
+        livro.active.append(cabecalho)
+        for linha in linhas:
+            livro.active.append(linha)
+        arquivo = io.BytesIO()
+        livro.save(arquivo)
+        arquivo.seek(0)
+        return arquivo
+
+    def test_importa_ordens_de_planilha(self):
+        arquivo = self.planilha(
+            ['Número OS', 'Data OS', 'Solicitante', 'Setor Execução', 'Unidade', 'Centro Custo',
+             'Objetivo Compra', 'Especialidade', 'Conta Contábil', 'Descrição Serviço', 'Justificativa',
+             'Fornecedor', 'Condição Pagamento', 'Valor Estimado'],
+            ['OS-XLSX', datetime.datetime(2025, 3, 10), 'FULANO@exemplo.com', 'Manutenção', 'hmi', 100,
+             'MATERIAL', 'ELETRICA', 'MANUT_PREDIAL', 'Troca de lâmpadas', 'Preventiva',
+             'Fornecedor X', '30 dias', 1234.5],
+            [None] * 14,
+            ['OS-RUIM', 'amanhã'],
+        )
+        resultado = importar_ordens(arquivo, 'ordens.xlsx')
+        self.assertEqual(resultado['importadas'], 1)
+        self.assertEqual([numero for numero, _ in resultado['erros']], [4])
+        oc = OrdemCompra.objects.get(numero_os='OS-XLSX')
+        self.assertEqual((oc.data_os, oc.valor_estimado, oc.unidade_id, oc.centro_custo_id, oc.status),
+                         (datetime.date(2025, 3, 10), Decimal('1234.50'), self.unidade.pk, self.centro_custo.pk,
+                          'SOLICITADO'))
+        self.assertEqual(ResumoDashboard.totais()['pendentes'], 1)
+
+
+class ImportacaoErrosPorLinhaTest(DadosBaseMixin, TestCase):
+    CABECALHO_OC = ('numero_os;data_os;solicitante;setor_execucao;unidade;centro_custo;objetivo_compra;'
+                    'especialidade;conta_contabil;descricao_servico;justificativa;fornecedor;'
+                    'condicao_pagamento;valor_estimado')
+
+    def csv(self, cabecalho, *linhas):
+        return io.BytesIO('\n'.join((cabecalho,) + linhas).encode())
+
+    def linha_oc(self, numero_os, valor='100,00'):
+        return (f'{numero_os};15/01/2025;fulano@exemplo.com;Manutenção;HMI;100;MATERIAL;ELETRICA;'
+                f'MANUT_PREDIAL;Troca;Preventiva;Fornecedor X;30 dias;{valor}')
+
+    def test_linha_invalida_nao_derruba_o_lote(self):
+        arquivo = self.csv(self.CABECALHO_OC, self.linha_oc('OS-1'), self.linha_oc('X' * 60),
+                           self.linha_oc('OS-3', '123456789012,00'), self.linha_oc('OS-4'))
+        resultado = importar_ordens(arquivo, 'ordens.csv')
+        self.assertEqual(resultado['importadas'], 2)
+        self.assertEqual([numero for numero, _ in resultado['erros']], [3, 4])
+        self.assertIn("'numero_os'", resultado['erros'][0][1])
+        self.assertIn("'valor_estimado'", resultado['erros'][1][1])
+
+    def test_lote_recusado_pelo_banco_e_regravado_linha_a_linha(self):
+        mover = ResumoDashboard.mover_em_lote
+
+        def mover_ou_falhar(linhas, de, para):
+            if any(linha['valor_estimado'] == 666 for linha in linhas):
+                raise OperationalError('linha recusada')
+            return mover(linhas, de, para)
+
+        arquivo = self.csv(self.CABECALHO_OC, self.linha_oc('OS-1'), self.linha_oc('OS-2', '666'),
+                           self.linha_oc('OS-3'))
+        with mock.patch.object(ResumoDashboard, 'mover_em_lote', mover_ou_falhar):
+            resultado = importar_ordens(arquivo, 'ordens.csv')
+        self.assertEqual(resultado['importadas'], 2)
+        self.assertEqual(resultado['erros'], [(3, 'Linha não gravada: linha recusada')])
+        self.assertEqual(sorted(OrdemCompra.objects.values_list('numero_os', flat=True)), ['OS-1', 'OS-3'])
+        self.assertEqual(ResumoDashboard.totais()['pendentes'], 2)
+
+    def test_numero_os_repetido_e_ambiguo(self):
+        duplicadas = [self.criar_oc(numero_os='OS-DUP', status='APROVADO') for _ in range(2)]
+        unica = self.criar_oc(numero_os='OS-UNICA', status='APROVADO')
+        arquivo = self.csv('numero_os;ordem_compra;numero_nf;data_emissao;valor_final',
+                           'OS-DUP;;NF-1;01/02/2025;90,00',
+                           f';{duplicadas[1].pk};NF-2;01/02/2025;90,00',
+                           'OS-UNICA;;NF-3;01/02/2025;50,00')
+        resultado = importar_notas(arquivo, 'notas.csv')
+        self.assertEqual(resultado['importadas'], 2)
+        self.assertEqual([numero for numero, _ in resultado['erros']], [2])
+        self.assertIn('ambíguo', resultado['erros'][0][1])
+        self.assertEqual(dict(NotaFiscal.objects.values_list('numero_nf', 'ordem_compra_id')),
+                         {'NF-2': duplicadas[1].pk, 'NF-3': unica.pk})
+
+
+class ExportacaoXlsxTest(DadosBaseMixin, TestCase):
+
+    def test_planilha_exportada_relida_com_openpyxl(self):
+        from openpyxl import load_workbook
+        oc = self.criar_oc(status='APROVADO', aprovado_por=self.usuario)
+        self.criar_nf(oc)
+        self.criar_oc(numero_os='OS-FORA')
+        resposta = self.client.get(reverse('exportar_conciliacao'), {'formato': 'xlsx', 'status': 'concluido'},
+                                   HTTP_HOST='localhost')
+        self.assertEqual(resposta.status_code, 200)
+        linhas = list(load_workbook(io.BytesIO(b''.join(resposta.streaming_content)), read_only=True)
+                      .active.iter_rows(values_only=True))
+        self.assertEqual(linhas[0][:3], ('ID OC', 'Nº OS', 'Data OS'))
+        self.assertEqual(len(linhas), 2)
+        dados = dict(zip(linhas[0], linhas[1]))
+        self.assertEqual((dados['ID OC'], dados['Nº OS'], dados['Unidade'], dados['Status'], dados['Nº NF']),
+                         (oc.pk, 'OS-1', 'HMI', 'CONCLUIDO', 'NF-1'))
+        self.assertEqual(dados['Data OS'].date(), datetime.date(2025, 1, 15))
+        self.assertEqual((dados['Valor Estimado'], dados['Valor Final']), (100, 90))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class TransicoesConcorrentesTest(DadosBaseMixin, TransactionTestCase):
+    """Aprovações simultâneas em conexões separadas: exatamente uma vence."""
+
+    def setUp(self):
+        self.setUpTestData()
+
+    def test_aprovacoes_simultaneas(self):
+        oc = self.criar_oc()
+        barreira = threading.Barrier(4)
+        resultados = []
+
+        def aprovar():
+            try:
+                barreira.wait()
+                transicoes.aprovar(OrdemCompra.objects.get(pk=oc.pk), self.usuario)
+                resultados.append('ok')
+            except transicoes.ConflitoTransicao:
+                resultados.append('conflito')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=aprovar) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(resultados), ['conflito', 'conflito', 'conflito', 'ok'])
+        self.assertEqual(ResumoDashboard.totais()['aprovadas'], 1)
+
+
+class DownloadsTest(SimpleTestCase):
+    CONTEUDO = bytes(range(100))
+    ETAG = '"abc123"'
+
+    def responder(self, **cabecalhos):
+        aberturas = []
+
+        def abrir():
+            aberturas.append(1)
+            return io.BytesIO(self.CONTEUDO)
+
+        request = RequestFactory().get('/arquivo', **cabecalhos)
+        response = responder_arquivo(request, abrir, len(self.CONTEUDO), self.ETAG, 'orçamento.pdf')
+        corpo = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, corpo, len(aberturas)
+
+    def test_intervalo_responde_206_com_content_range(self):
+        response, corpo, _ = self.responder(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 10-19/100', '10'))
+        self.assertEqual(corpo, self.CONTEUDO[10:20])
+
+    def test_intervalo_aberto_e_fim_alem_do_tamanho(self):
+        for cabecalho in ('bytes=90-', 'bytes=90-500'):
+            response, corpo, _ = self.responder(HTTP_RANGE=cabecalho)
+            self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 90-99/100'))
+            self.assertEqual(corpo, self.CONTEUDO[90:])
+
+    def test_sufixo_devolve_os_ultimos_bytes(self):
+        response, corpo, _ = self.responder(HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 95-99/100'))
+        self.assertEqual(corpo, self.CONTEUDO[-5:])
+        response, corpo, _ = self.responder(HTTP_RANGE='bytes=-500')
+        self.assertEqual((response['Content-Range'], corpo), ('bytes 0-99/100', self.CONTEUDO))
+
+    def test_intervalo_fora_do_arquivo_responde_416(self):
+        for cabecalho in ('bytes=100-', 'bytes=50-10', 'bytes=-0'):
+            response, corpo, aberturas = self.responder(HTTP_RANGE=cabecalho)
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'), cabecalho)
+            self.assertEqual((corpo, aberturas), (b'', 0))
+
+    def test_etag_que_confere_responde_304_sem_abrir_o_arquivo(self):
+        for cabecalho in (self.ETAG, f'"outro", W/{self.ETAG}', '*'):
+            response, corpo, aberturas = self.responder(HTTP_IF_NONE_MATCH=cabecalho, HTTP_RANGE='bytes=0-9')
+            self.assertEqual((response.status_code, response['ETag'], aberturas), (304, self.ETAG, 0))
+        response, corpo, _ = self.responder(HTTP_IF_NONE_MATCH='"outro"')
+        self.assertEqual((response.status_code, corpo), (200, self.CONTEUDO))
+
+    def test_if_range_desatualizado_manda_o_arquivo_inteiro(self):
+        response, corpo, _ = self.responder(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"antigo"')
+        self.assertEqual((response.status_code, response.has_header('Content-Range')), (200, False))
+        self.assertEqual(corpo, self.CONTEUDO)
+        response, corpo, _ = self.responder(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=self.ETAG)
+        self.assertEqual((response.status_code, corpo), (206, self.CONTEUDO[10:20]))
+
+
+class ArmazenamentoDeduplicadoTest(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.storage = ArmazenamentoLocalDeduplicado(location=pasta.name)
+
+    def referencias(self, nome):
+        return ArquivoBlob.objects.filter(nome=nome).values_list('referencias', flat=True).first()
+
+    def test_mesmo_conteudo_grava_um_blob_compartilhado(self):
+        nome = self.storage.save('orcamentos/a.pdf', ContentFile(b'%PDF orcamento'))
+        self.assertEqual(self.storage.save('notas_fiscais/b.PDF', ContentFile(b'%PDF orcamento')), nome)
+        self.assertTrue(nome.startswith('blobs/') and nome.endswith('.pdf'))
+        self.assertEqual(self.referencias(nome), 2)
+        self.assertEqual(self.storage.listdir(os.path.dirname(nome))[1], [os.path.basename(nome)])
+
+    def test_apagar_uma_de_duas_referencias_mantem_o_arquivo(self):
+        nome = self.storage.save('a.pdf', ContentFile(b'%PDF'))
+        self.storage.save('b.pdf', ContentFile(b'%PDF'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(nome)
+        self.assertEqual(self.referencias(nome), 1)
+        self.assertTrue(self.storage.exists(nome))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(nome)
+        self.assertIsNone(self.referencias(nome))
+        self.assertFalse(self.storage.exists(nome))
+
+    def test_novo_upload_antes_do_commit_do_delete_nao_perde_o_arquivo(self):
+        nome = self.storage.save('a.pdf', ContentFile(b'%PDF'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(nome)
+            self.storage.save('b.pdf', ContentFile(b'%PDF'))
+        self.assertEqual(self.referencias(nome), 1)
+        self.assertTrue(self.storage.exists(nome))
+
+    def test_rollback_deixa_blob_orfao_que_a_varredura_apaga(self):
+        mantido = self.storage.save('a.pdf', ContentFile(b'%PDF mantido'))
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            orfao = self.storage.save('b.pdf', ContentFile(b'%PDF desfeito'))
+            raise RuntimeError('falha depois do upload')
+        self.assertIsNone(self.referencias(orfao))
+        self.assertTrue(self.storage.exists(orfao))
+        self.assertEqual(self.storage.varrer_blobs_orfaos(), 1)
+        self.assertFalse(self.storage.exists(orfao))
+        self.assertIsNone(self.referencias(orfao))
+        self.assertTrue(self.storage.exists(mantido))
+        self.assertEqual(self.referencias(mantido), 1)
+
+
+class InicializacaoTest(SimpleTestCase):
+    """Inicialização a frio num interpretador novo, como um lambda recém-criado na Vercel."""
+    # Folgado (localmente fica perto de 0,2 s): o que o teste pega é uma importação pesada nova
+    LIMITE_SEGUNDOS = float(os.environ.get('LIMITE_INICIALIZACAO_S', 2.0))
+
+    def test_inicializacao_rapida_dentro_do_limite(self):
+        resultado, _ = executar_medicao(reverse('metricas'), rapida=True)
+        self.assertTrue(resultado['rapida'])
+        self.assertLess(resultado['total'], self.LIMITE_SEGUNDOS, resultado['fases'])
+        # Admin e WeasyPrint ficam para depois da primeira resposta
+        self.assertEqual(resultado['adiados_carregados'], [])
+
+    def test_admin_montado_no_primeiro_acesso(self):
+        resultado, _ = executar_medicao('/admin/login/', rapida=True)
+        self.assertEqual(resultado['status'], '200 OK')
+        self.assertIn('home.admin', resultado['adiados_carregados'])
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.fechada = self.quebrada = False
+
+    def close(self):
+        self.fechada = True
+
+
+def verificar_falsa(conexao):
+    if conexao.quebrada:
+        raise OSError('conexão perdida')
+
+
+class PoolConexoesTest(SimpleTestCase):
+
+    def criar_pool(self, **kwargs):
+        return PoolConexoes(ConexaoFalsa, verificar_falsa, **{'minimo': 0, 'maximo': 2, 'timeout': 1, **kwargs})
+
+    def test_conexao_devolvida_e_reaproveitada(self):
+        pool = self.criar_pool()
+        primeira = pool.obter()
+        pool.devolver(primeira)
+        self.assertIs(pool.obter(), primeira)
+        est = pool.estatisticas()
+        self.assertEqual((est['aquisicoes'], est['criadas'], est['reutilizadas'], est['em_uso']), (2, 1, 1, 1))
+
+    def test_esgotado_espera_e_desiste_no_timeout(self):
+        pool = self.criar_pool(maximo=1, timeout=0.05)
+        pool.obter()
+        with self.assertRaises(PoolEsgotado):
+            pool.obter()
+        est = pool.estatisticas()
+        self.assertEqual((est['esperas'], est['timeouts'], est['criadas']), (1, 1, 1))
+
+    def test_espera_recebe_a_conexao_devolvida(self):
+        pool = self.criar_pool(maximo=1)
+        conexao = pool.obter()
+        threading.Timer(0.05, pool.devolver, [conexao]).start()
+        self.assertIs(pool.obter(), conexao)
+        self.assertEqual(pool.estatisticas()['esperas'], 1)
+
+    def test_conexao_quebrada_e_trocada_na_retirada(self):
+        pool = self.criar_pool()
+        quebrada = pool.obter()
+        pool.devolver(quebrada)
+        quebrada.quebrada = True
+        nova = pool.obter()
+        self.assertIsNot(nova, quebrada)
+        self.assertTrue(quebrada.fechada)
+        est = pool.estatisticas()
+        self.assertEqual((est['reconexoes'], est['criadas'], est['em_uso']), (1, 2, 1))
+
+    def test_conexao_velha_e_reciclada(self):
+        pool = self.criar_pool(max_vida=0)
+        velha = pool.obter()
+        pool.devolver(velha)
+        self.assertTrue(velha.fechada)
+        self.assertIsNot(pool.obter(), velha)
+        self.assertEqual(pool.estatisticas()['recicladas'], 1)
+
+
+# Dois bancos locais: 'replica' é um segundo SQLite em memória (test_replica no Postgres).
+# Cada um recebe uma NF diferente para saber de qual a página leu.
+@override_settings(BANCO_REPLICA_ATIVA=True, CACHE_PAGINAS_ATIVO=False)
+class RoteadorReplicaTest(DadosBaseMixin, TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        estado_replica.esquecer()
+        self.addCleanup(estado_replica.esquecer)
+        self.criar_nf(self.criar_oc(numero_os='OS-PRIMARIO', status='CONCLUIDO'), numero_nf='NF-PRIMARIO')
+        oc = self.criar_oc(numero_os='OS-REPLICA', status='CONCLUIDO')
+        nf = self.criar_nf(oc, numero_nf='NF-REPLICA')
+        # Copiadas linha a linha (bulk_create não passa pelo save() e seus efeitos no primário)
+        indice = IndiceBusca.objects.get(ordem_compra=oc)
+        for registro in (self.usuario, self.unidade, self.centro_custo, self.solicitante, oc, nf, indice):
+            type(registro).objects.using('replica').bulk_create([registro])
+        nf.delete(using='default')
+        oc.delete(using='default')
+
+    def notas_listadas(self):
+        return {nf.numero_nf for nf in self.client.get(reverse('lista_notasfiscais')).context['notas']}
+
+    def test_relatorios_leem_da_replica(self):
+        self.assertEqual(self.notas_listadas(), {'NF-REPLICA'})
+        resposta = self.client.get(reverse('exportar_conciliacao'))
+        csv = b''.join(resposta.streaming_content).decode()
+        self.assertIn('OS-REPLICA', csv)
+        self.assertNotIn('OS-PRIMARIO', csv)
+        # A busca usa SQL cru no índice: vai para o banco que o roteador escolheu
+        resultados = self.client.get(reverse('ajax_busca'), {'q': 'OS'}).json()['resultados']
+        self.assertEqual([r['numero_os'] for r in resultados], ['OS-REPLICA'])
+
+    def test_demais_paginas_leem_do_primario(self):
+        resposta = self.client.get(reverse('detalhe_aprovacao', args=[OrdemCompra.objects.get().pk]))
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_depois_de_um_post_le_do_primario(self):
+        resposta = self.client.post(reverse('solicitacao_nova'), {})
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+        self.assertEqual(self.notas_listadas(), {'NF-PRIMARIO'})
+        # Passado BANCO_REPLICA_GRUDE_S o navegador volta para a réplica
+        self.client.cookies[COOKIE_PRIMARIO] = '0'
+        self.assertEqual(self.notas_listadas(), {'NF-REPLICA'})
+
+    def test_replica_atrasada_ou_fora_do_ar_le_do_primario(self):
+        with mock.patch('home.roteador.medir_atraso', return_value=60), self.assertLogs('home.roteador'):
+            self.assertEqual(self.notas_listadas(), {'NF-PRIMARIO'})
+        estado_replica.esquecer()
+        with mock.patch('home.roteador.medir_atraso', side_effect=OperationalError), self.assertLogs('home.roteador'):
+            self.assertEqual(self.notas_listadas(), {'NF-PRIMARIO'})
+
+
+def pdf_falso(oc, usar_cache=True):
+    if oc.numero_os == 'OS-FALHA':
+        raise RuntimeError('WeasyPrint falhou')
+    return b'%PDF-1.4 teste', f'OC_{oc.id}.pdf'
+
+
+class ExecutorImediato(Executor):
+    """Roda cada tarefa na hora, na thread do teste (que enxerga a transação); as de `travados` nunca terminam."""
+    travados = set()
+
+    def __init__(self):
+        self.enviados = []
+
+    def submit(self, funcao, oc_id):
+        self.enviados.append(oc_id)
+        futuro = Future()
+        if oc_id not in self.travados:
+            futuro.set_result(funcao(oc_id))
+        return futuro
+
+
+@mock.patch('home.pacote_pdf.gerar_pdf_ordem_compra', pdf_falso)
+class PacotePdfTest(DadosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.ok = self.criar_oc(numero_os='OS-OK', status='APROVADO', aprovado_por=self.usuario)
+        self.falha = self.criar_oc(numero_os='OS-FALHA', status='APROVADO', aprovado_por=self.usuario)
+
+    def manifesto(self, conteudo):
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+            nomes = zf.namelist()
+            linhas = list(csv.DictReader(io.StringIO(zf.read('manifesto.csv').decode('utf-8-sig')), delimiter=';'))
+        return nomes, {int(linha['ordem_compra_id']): linha for linha in linhas}
+
+    def test_view_renderiza_no_executor_de_pdfs(self):
+        self.client.force_login(self.usuario)
+        executor = ExecutorImediato()
+        with mock.patch('home.pacote_pdf.multiprocessing.Pool', side_effect=AssertionError("fork na requisição")), \
+                mock.patch('home.views.executor_pdf', return_value=executor):
+            resposta = self.client.get(reverse('baixar_pacote_pdf'))
+            conteudo = b''.join(resposta.streaming_content)
+        self.assertEqual(sorted(executor.enviados), [self.ok.pk, self.falha.pk])
+        nomes, linhas = self.manifesto(conteudo)
+        self.assertEqual(sorted(nomes), sorted([f'OC_{self.ok.pk}.pdf', 'manifesto.csv']))
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(linhas[self.ok.pk]['erro'], '')
+        self.assertEqual(linhas[self.ok.pk]['tamanho_bytes'], str(len(b'%PDF-1.4 teste')))
+        self.assertEqual(linhas[self.falha.pk]['arquivo'], '')
+        self.assertIn('WeasyPrint falhou', linhas[self.falha.pk]['erro'])
+
+    @override_settings(PDF_PACOTE_TEMPO_LIMITE_S=0.2)
+    def test_pdf_que_nunca_termina_vira_erro_no_manifesto(self):
+        travado = self.criar_oc(numero_os='OS-TRAVADA', status='APROVADO', aprovado_por=self.usuario)
+        ids = [self.ok.pk, travado.pk, self.falha.pk]
+        with mock.patch.object(ExecutorImediato, 'travados', {travado.pk}), self.assertLogs('home.pacote_pdf', 'ERROR'):
+            conteudo = b''.join(pacote_pdf.gerar_zip(ids, executor=ExecutorImediato()))
+        _, linhas = self.manifesto(conteudo)
+        self.assertEqual(sorted(linhas), sorted(ids))
+        self.assertEqual(linhas[self.ok.pk]['erro'], '')
+        self.assertIn('Sem resposta', linhas[travado.pk]['erro'])
+        self.assertIn('WeasyPrint falhou', linhas[self.falha.pk]['erro'])
+
+    @override_settings(PDF_PACOTE_TEMPO_LIMITE_S=0.2)
+    def test_filho_do_pool_que_morre_nao_trava_o_pacote(self):
+        perdida = self.falha.pk
+
+        class PoolSemResposta:
+            """apply_async de um filho que morreu: nem callback nem error_callback."""
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def apply_async(self, funcao, args, callback, error_callback):
+                if args[0] != perdida:
+                    callback(funcao(*args))
+
+        with mock.patch('home.pacote_pdf.multiprocessing.Pool', PoolSemResposta), \
+                self.assertLogs('home.pacote_pdf', 'ERROR'):
+            conteudo = b''.join(pacote_pdf.gerar_zip([self.ok.pk, self.falha.pk], processos=2))
+        _, linhas = self.manifesto(conteudo)
+        self.assertEqual(linhas[self.ok.pk]['erro'], '')
+        self.assertIn('Sem resposta', linhas[self.falha.pk]['erro'])
+
+    def test_sem_processos_disponiveis_renderiza_em_sequencia(self):
+        with mock.patch('home.pacote_pdf.multiprocessing.Pool', side_effect=OSError("sem /dev/shm")), \
+                self.assertLogs('home.pacote_pdf', 'WARNING'):
+            conteudo = b''.join(pacote_pdf.gerar_zip([self.ok.pk, self.falha.pk], processos=4))
+        _, linhas = self.manifesto(conteudo)
+        self.assertEqual(linhas[self.ok.pk]['erro'], '')
+        self.assertIn('WeasyPrint falhou', linhas[self.falha.pk]['erro'])
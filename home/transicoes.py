@@ -0,0 +1,108 @@
+"""
+Máquina de estados da Ordem de Compra.
+
+RASCUNHO -> SOLICITADO -> APROVADO | REPROVADO ; APROVADO -> CONCLUIDO
+CONCLUIDO -> APROVADO só quando a NF passa para outra OC (reabrir)
+
+Cada transição é um único `UPDATE ... WHERE id = X AND status = <esperado>`
+que grava só as colunas alteradas. Se outro usuário moveu a OC antes, o UPDATE
+não afeta nenhuma linha e ConflitoTransicao é levantada: não há janela entre
+o "checar status" e o "salvar" para duas aprovações simultâneas passarem.
+Cada transição bem-sucedida grava seu evento em HistoricoStatus e ajusta o
+orçamento comprometido do centro de custo (ConsumoOrcamento) na mesma
+transação; no commit, as páginas em cache dos dois status são invalidadas.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache_paginas
+from .models import ConsumoOrcamento, HistoricoStatus, OrdemCompra, ResumoDashboard
+
+# Status de destino -> status de origem exigido
+ORIGEM = {
+    'SOLICITADO': 'RASCUNHO',
+    'APROVADO': 'SOLICITADO',
+    'REPROVADO': 'SOLICITADO',
+    'CONCLUIDO': 'APROVADO',
+}
+
+
+class ConflitoTransicao(Exception):
+    def __init__(self, ordem_compra_id, status_esperado, status_atual):
+        self.ordem_compra_id = ordem_compra_id
+        self.status_esperado = status_esperado
+        self.status_atual = status_atual
+        super().__init__(
+            f"OC {ordem_compra_id}: esperado '{status_esperado}', encontrado '{status_atual}'."
+        )
+
+
+def transicionar_em_lote(ids, para, usuario=None, observacao='', **campos):
+    """
+    Move para `para` as OCs de `ids` que ainda estão no status de origem, com um
+    único UPDATE condicional. Devolve os ids efetivamente movidos; os demais já
+    tinham sido processados por outra requisição.
+    """
+    de = ORIGEM[para]
+    agora = timezone.now()
+    campos = {'status': para, 'data_atualizacao': agora, **campos}
+    with transaction.atomic():
+        # Trava as linhas candidatas na ordem do id (evita deadlock entre lotes)
+        linhas = list(OrdemCompra.objects.select_for_update()
+                      .filter(pk__in=ids, status=de).order_by('pk')
+                      .values('id', 'unidade_id', 'data_criacao', 'valor_estimado', 'centro_custo_id', 'data_os'))
+        movidos = [linha['id'] for linha in linhas]
+        if movidos:
+            OrdemCompra.objects.filter(pk__in=movidos, status=de).update(**campos)
+            ResumoDashboard.mover_em_lote(linhas, de, para)
+            ConsumoOrcamento.mover(linhas, de, para)
+            HistoricoStatus.registrar(movidos, de, para, usuario, observacao, momento=agora)
+            cache_paginas.invalidar([de, para])
+    return movidos
+
+
+def transicionar(ordem_compra, para, usuario=None, observacao='', de=None, **campos):
+    """
+    Move uma OC para `para`. Levanta ConflitoTransicao se ela não estiver mais
+    no status de origem (`de`, padrão ORIGEM[para]). Atualiza a instância em
+    memória com o que foi gravado.
+    """
+    de = de or ORIGEM[para]
+    agora = timezone.now()
+    valores = {'status': para, 'data_atualizacao': agora, **campos}
+    with transaction.atomic():
+        if not OrdemCompra.objects.filter(pk=ordem_compra.pk, status=de).update(**valores):
+            atual = OrdemCompra.objects.filter(pk=ordem_compra.pk).values_list('status', flat=True).first()
+            raise ConflitoTransicao(ordem_compra.pk, de, atual)
+        # A linha já está travada pelo UPDATE: estes valores não mudam até o commit
+        linha = (OrdemCompra.objects.filter(pk=ordem_compra.pk)
+                 .values('id', 'unidade_id', 'data_criacao', 'valor_estimado', 'centro_custo_id', 'data_os').get())
+        ResumoDashboard.mover_em_lote([linha], de, para)
+        ConsumoOrcamento.mover([linha], de, para)
+        HistoricoStatus.registrar([ordem_compra.pk], de, para, usuario, observacao, momento=agora)
+        cache_paginas.invalidar([de, para])
+    for campo, valor in valores.items():
+        setattr(ordem_compra, campo, valor)
+    return ordem_compra
+
+
+def solicitar(ordem_compra, usuario=None):
+    return transicionar(ordem_compra, 'SOLICITADO', usuario)
+
+
+def aprovar(ordem_compra, usuario):
+    return transicionar(ordem_compra, 'APROVADO', usuario, aprovado_por=usuario,
+                        data_aprovacao=timezone.now(), motivo_reprovacao=None)
+
+
+def reprovar(ordem_compra, motivo, usuario=None):
+    return transicionar(ordem_compra, 'REPROVADO', usuario, motivo, motivo_reprovacao=motivo)
+
+
+def concluir(ordem_compra, usuario=None, observacao=''):
+    return transicionar(ordem_compra, 'CONCLUIDO', usuario, observacao)
+
+
+def reabrir(ordem_compra, usuario=None, observacao=''):
+    """CONCLUIDO -> APROVADO: a NF da OC foi passada para outra OC."""
+    return transicionar(ordem_compra, 'APROVADO', usuario, observacao, de='CONCLUIDO')
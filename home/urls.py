@@ -9,13 +9,35 @@ urlpatterns = [
     path('ajax/get-cnpj/', views.get_cnpj_unidade, name='ajax_get_cnpj'),
     path('ajax/get-solicitante/', views.get_dados_solicitante, name='ajax_get_solicitante'),
     path('ajax/get-oc-detalhes/', views.get_detalhes_ordem_compra, name='ajax_get_oc_detalhes'), # NOVO
+    path('ajax/busca-oc/', views.busca_ordem_compra_nf, name='ajax_busca_oc'),
+    path('ajax/referencias/', views.get_referencias, name='ajax_referencias'),
+    path('ajax/busca/', views.ajax_busca, name='ajax_busca'),
+
+    # Busca
+    path('busca/', views.busca, name='busca'),
     
     # Aprovações
     path('pendencias/', views.ListaPendenciasView.as_view(), name='lista_pendencias'),
+    path('pendencias/lote/', views.AcaoEmLoteView.as_view(), name='acao_em_lote'),
+    path('pendencias/lote/<uuid:lote>/', views.lote_aprovacao, name='lote_aprovacao'),
+    path('pendencias/lote/<uuid:lote>/zip/', views.baixar_lote_pdf, name='baixar_lote_pdf'),
     path('aprovacao/<int:pk>/', views.DetalheAprovacaoView.as_view(), name='detalhe_aprovacao'),
     path('aprovacao/<int:pk>/preview/', views.VisualizarPdfView.as_view(), name='visualizar_pdf'),
+    path('aprovacao/<int:pk>/pdf/', views.baixar_pdf_ordem_compra, name='baixar_pdf'),
+    path('aprovacao/<int:pk>/orcamento/', views.baixar_anexo_orcamento, name='baixar_orcamento'),
+    path('ajax/pdf-status/<int:pk>/', views.status_pdf_ordem_compra, name='ajax_pdf_status'),
 
     # Financeiro
     path('financeiro/notas/', views.NotaFiscalListView.as_view(), name='lista_notasfiscais'),
     path('financeiro/notas/nova/', views.NotaFiscalCreateView.as_view(), name='notafiscal_nova'),
+    path('financeiro/notas/<int:pk>/arquivo/', views.baixar_arquivo_nf, name='baixar_arquivo_nf'),
+    path('financeiro/exportar/', views.exportar_conciliacao, name='exportar_conciliacao'),
+    path('financeiro/orcamento/', views.relatorio_orcamento, name='relatorio_orcamento'),
+    path('financeiro/pacote-pdf/', views.baixar_pacote_pdf, name='baixar_pacote_pdf'),
+
+    # Importação
+    path('importacao/', views.importacao, name='importacao'),
+
+    # Monitoramento (Prometheus)
+    path('metrics', views.metricas, name='metricas'),
 ]
\ No newline at end of file
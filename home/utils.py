@@ -1,32 +1,160 @@
+from django.conf import settings
+from django.db import close_old_connections
 from django.template.loader import render_to_string
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
 import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
 from django.utils import timezone
 
-def gerar_pdf_ordem_compra(ordem_compra):
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+# Incrementar sempre que o template do PDF mudar, para invalidar o cache
+PDF_CACHE_VERSAO = 1
+# Além do limite de bytes estimado, varre o diretório a cada N gravações: outros
+# processos (workers, lambdas) também gravam no mesmo cache
+PDF_CACHE_VARRER_A_CADA = 100
+
+
+def chave_pdf_ordem_compra(ordem_compra):
     """
-    Gera o PDF da Ordem de Compra.
-    Usa 'Lazy Import' e tratamento de erro para não quebrar o deploy no Vercel.
+    Chave de conteúdo do PDF: muda quando a OC (data_atualizacao) ou qualquer
+    dado impresso no documento muda. A mesma OC gera sempre a mesma chave.
+    """
+    oc = ordem_compra
+    partes = [
+        PDF_CACHE_VERSAO, oc.id, oc.data_atualizacao, oc.status, oc.valor_estimado,
+        oc.fornecedor, oc.descricao_servico, oc.classificacao, oc.data_aprovacao,
+        oc.unidade.nome, oc.unidade.razao_social, oc.unidade.cnpj,
+        oc.solicitante.nome, oc.solicitante.cargo, oc.solicitante.telefone,
+        oc.centro_custo.codigo, oc.centro_custo.descricao,
+        oc.aprovado_por_id and oc.aprovado_por.get_full_name(),
+        oc.aprovado_por_id and oc.aprovado_por.username,
+    ]
+    return hashlib.sha256("|".join(str(p) for p in partes).encode()).hexdigest()
+
+
+# --- Cache de PDFs em disco (endereçado por conteúdo) ---
+
+def _cache_caminho(chave):
+    return os.path.join(settings.PDF_CACHE_DIR, chave[:2], f"{chave}.pdf")
+
+
+def _cache_ler(chave):
+    caminho = _cache_caminho(chave)
+    try:
+        with open(caminho, 'rb') as f:
+            pdf = f.read()
+        os.utime(caminho)  # marca como usado recentemente (LRU)
+        return pdf
+    except OSError:
+        return None
+
+
+# Bytes no cache segundo a última varredura + o que este processo gravou depois
+_cache_total = None
+_cache_gravacoes = 0
+_cache_lock = threading.Lock()
+
+
+def _cache_gravar(chave, pdf):
+    global _cache_total, _cache_gravacoes
+    caminho = _cache_caminho(chave)
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Grava em arquivo temporário e renomeia: leitores nunca veem PDF pela metade
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, caminho)
+    except OSError as e:
+        logger.warning("Cache de PDF indisponível: %s", e)
+        return
+    # Percorrer o diretório custa um stat por PDF: só quando o total estimado passa do limite
+    with _cache_lock:
+        _cache_gravacoes += 1
+        if _cache_total is not None:
+            _cache_total += len(pdf)
+        varrer = (_cache_total is None or _cache_total > settings.PDF_CACHE_MAX_BYTES
+                  or _cache_gravacoes % PDF_CACHE_VARRER_A_CADA == 0)
+    if varrer:
+        total = _cache_limitar_tamanho()
+        with _cache_lock:
+            _cache_total = total
+
+
+def _cache_limitar_tamanho():
+    """Remove os PDFs menos usados até o cache caber em PDF_CACHE_MAX_BYTES. Devolve o total que ficou."""
+    arquivos = []
+    for raiz, _, nomes in os.walk(settings.PDF_CACHE_DIR):
+        for nome in nomes:
+            if nome.endswith('.pdf'):
+                try:
+                    st = os.stat(os.path.join(raiz, nome))
+                except OSError:
+                    continue  # removido por outro processo durante a varredura
+                arquivos.append((st.st_mtime, st.st_size, os.path.join(raiz, nome)))
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= settings.PDF_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+    return total
+
+
+def renderizar_pdf_ordem_compra(ordem_compra, usar_cache=True):
     """
-    # 1. Gerar Hash Único
-    audit_string = f"{ordem_compra.id}-{ordem_compra.valor_estimado}-{timezone.now()}"
-    hash_audit = hashlib.sha256(audit_string.encode()).hexdigest()[:12].upper()
+    Renderiza o PDF da Ordem de Compra propagando OSError/ImportError do WeasyPrint.
+    Usado pelo worker de PDFs, que precisa registrar a falha na tarefa.
+    Documentos de OCs inalteradas são servidos do cache, sem chamar o WeasyPrint.
+    """
+    # 1. Hash de auditoria estável: derivado do conteúdo e da versão da OC
+    chave = chave_pdf_ordem_compra(ordem_compra)
+    hash_audit = chave[:12].upper()
+    filename = f"OC_{ordem_compra.id}_{hash_audit}.pdf"
+
+    if usar_cache:
+        pdf_file = _cache_ler(chave)
+        if pdf_file:
+            return pdf_file, filename
 
     context = {
         'oc': ordem_compra,
         'hash_audit': hash_audit,
-        'data_geracao': timezone.now()
+        'data_geracao': ordem_compra.data_aprovacao or ordem_compra.data_atualizacao or timezone.now()
     }
 
     html_string = render_to_string('home/pdf_ordem_compra.html', context)
 
-    # 2. Tenta importar e gerar o PDF com segurança
+    # 2. IMPORTAÇÃO TARDIA: Só carrega a lib aqui dentro
+    from weasyprint import HTML
+
+    inicio = time.perf_counter()
+    pdf_file = HTML(string=html_string).write_pdf()
+    metricas.registrar_pdf(time.perf_counter() - inicio, len(pdf_file))
+    if usar_cache:
+        _cache_gravar(chave, pdf_file)
+    return pdf_file, filename
+
+
+def gerar_pdf_ordem_compra(ordem_compra, usar_cache=True):
+    """
+    Gera o PDF da Ordem de Compra.
+    Usa 'Lazy Import' e tratamento de erro para não quebrar o deploy no Vercel.
+    """
     try:
-        # IMPORTAÇÃO TARDIA: Só carrega a lib aqui dentro
-        from weasyprint import HTML
-        
-        pdf_file = HTML(string=html_string).write_pdf()
-        filename = f"OC_{ordem_compra.id}_{hash_audit}.pdf"
-        return pdf_file, filename
+        return renderizar_pdf_ordem_compra(ordem_compra, usar_cache=usar_cache)
 
     except OSError as e:
         # Se der erro de biblioteca (comum no Vercel), loga e retorna vazio
@@ -34,4 +162,57 @@ def gerar_pdf_ordem_compra(ordem_compra):
         return None, None
     except ImportError:
         print("WeasyPrint não está instalado ou falhou ao importar.")
-        return None, None
\ No newline at end of file
+        return None, None
+
+
+# --- Geração de PDF nas views assíncronas (ASGI) ---
+
+_executor_pdf = None
+_executor_lock = threading.Lock()
+
+
+def executor_pdf():
+    """
+    Executor limitado (settings.PDF_EXECUTOR_LIMITE) para o WeasyPrint: o event
+    loop nunca renderiza, e no máximo N PDFs são gerados ao mesmo tempo por
+    processo, por mais requisições que cheguem. 'processos' escapa do GIL;
+    'threads' serve onde não dá para criar processos (Vercel).
+    """
+    global _executor_pdf
+    with _executor_lock:
+        if _executor_pdf is None:
+            limite = settings.PDF_EXECUTOR_LIMITE
+            if settings.PDF_EXECUTOR == 'processos':
+                # Importados aqui: multiprocessing pesa na inicialização a frio e só serve a este modo
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                from .pacote_pdf import _inicializar_processo
+                _executor_pdf = ProcessPoolExecutor(limite, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_inicializar_processo)
+            else:
+                _executor_pdf = ThreadPoolExecutor(limite, thread_name_prefix='pdf')
+        return _executor_pdf
+
+
+def _gerar_pdf_por_id(oc_id, usar_cache):
+    """Roda no executor: carrega a OC (com tudo que o PDF imprime) e devolve (pdf, nome)."""
+    from .models import OrdemCompra
+    try:
+        oc = OrdemCompra.objects.select_related(
+            'unidade', 'solicitante', 'centro_custo', 'aprovado_por').get(pk=oc_id)
+        return gerar_pdf_ordem_compra(oc, usar_cache=usar_cache)
+    finally:
+        close_old_connections()
+
+
+async def agerar_pdf_ordem_compra(oc_id, usar_cache=True):
+    loop = asyncio.get_running_loop()
+    executor = executor_pdf()
+    if isinstance(executor, ThreadPoolExecutor):
+        # run_in_executor não leva os ContextVars: sem a cópia, o WeasyPrint e as
+        # consultas não entram nas métricas da requisição (home/metricas.py)
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(executor, contexto.run, _gerar_pdf_por_id, oc_id, usar_cache)
+    # Em 'processos' o WeasyPrint é medido no processo filho, fora das métricas deste
+    return await loop.run_in_executor(executor, _gerar_pdf_por_id, oc_id, usar_cache)
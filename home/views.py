@@ -1,20 +1,88 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.views.generic import CreateView, ListView, DetailView
-from django.urls import reverse_lazy
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.views.generic import CreateView, ListView, DetailView, View
+from django.urls import reverse, reverse_lazy
+from django.http import Http404, JsonResponse, HttpResponse, FileResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.db.models import Q, Sum
+import base64
+from datetime import datetime
+import io
+import os
+import tempfile
+import uuid
+import zipfile
 
-from .models import OrdemCompra, Unidade, Solicitante, NotaFiscal
-from .forms import OrdemCompraForm, NotaFiscalForm
-from .utils import gerar_pdf_ordem_compra
+from .models import OrdemCompra, Unidade, Solicitante, NotaFiscal, ResumoDashboard, TarefaPdf, CuboOrcamento, MarcaIncremental, CentroCusto, OrcamentoExcedido
+from .forms import OrdemCompraForm, NotaFiscalForm, ImportacaoForm
+from .utils import agerar_pdf_ordem_compra, executor_pdf
+from .tarefas import enfileirar_pdf, ultima_tarefa, enfileirar_lote
+from .busca import buscar, filtro_indice
+from . import referencias
+from .importacao import ErroLinha, importar_notas, importar_ordens
+from .exportacao import consulta_exportacao, gravar_xlsx, linhas_csv
+from . import transicoes
+from .downloads import aresponder_campo_arquivo, responder_arquivo
+from . import pacote_pdf
+from . import metricas as metricas_desempenho
+from .cache_paginas import CHAVE_NF, CHAVE_REFERENCIAS, CachePaginaMixin, Ponteiro, chave_status
+from .roteador import RelatorioMixin, leitura_relatorio
+
+# --- Paginação por cursor (keyset) ---
+
+class PaginacaoCursorMixin:
+    """
+    Paginação por cursor para ListViews: em vez de OFFSET, cada página continua
+    a partir do (campo_cursor, id) da última linha da anterior, usando o índice
+    e mantendo o custo constante em qualquer página.
+    """
+    campo_cursor = 'data_criacao'
+    tamanho_pagina = 50
+
+    def _ler_cursor(self):
+        try:
+            valor, pk = base64.urlsafe_b64decode(self.request.GET['cursor']).decode().split('|')
+            return datetime.fromisoformat(valor), int(pk)
+        except (KeyError, ValueError, UnicodeDecodeError):
+            return None
+
+    def get_queryset(self):
+        campo = self.campo_cursor
+        queryset = super().get_queryset().order_by(f'-{campo}', '-id')
+        cursor = self._ler_cursor()
+        if cursor:
+            valor, pk = cursor
+            queryset = queryset.filter(Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'id__lt': pk}))
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        # Busca uma linha a mais só para saber se existe próxima página
+        pagina = list(self.object_list[:self.tamanho_pagina + 1])
+        proximo_cursor = None
+        if len(pagina) > self.tamanho_pagina:
+            pagina = pagina[:self.tamanho_pagina]
+            ultimo = pagina[-1]
+            chave = f"{getattr(ultimo, self.campo_cursor).isoformat()}|{ultimo.pk}"
+            proximo_cursor = base64.urlsafe_b64encode(chave.encode()).decode()
+        kwargs['object_list'] = pagina
+        context = super().get_context_data(**kwargs)
+        context['proximo_cursor'] = proximo_cursor
+        context['pagina_inicial'] = 'cursor' not in self.request.GET
+        return context
 
 # ... (Views existentes: index, SolicitacaoCreateView, get_cnpj_unidade, get_dados_solicitante, ListaPendenciasView, DetalheAprovacaoView, VisualizarPdfView mantidas) ...
 
 # 1. Dashboard
+@leitura_relatorio
 def index(request):
-    return render(request, 'index.html')
+    # Lê apenas o rollup (ResumoDashboard), nunca COUNT/SUM sobre as tabelas de origem
+    return render(request, 'index.html', {'resumo': ResumoDashboard.totais()})
 
 class SolicitacaoCreateView(CreateView):
     model = OrdemCompra
@@ -26,84 +94,335 @@ class SolicitacaoCreateView(CreateView):
         context['titulo_conteudo'] = "Nova Solicitação de Compra/Serviço"
         return context
 
-def get_cnpj_unidade(request):
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except OrcamentoExcedido as e:
+            # Outra OC consumiu o saldo entre a validação e a gravação
+            form.add_error('valor_estimado', e.message)
+            return self.form_invalid(form)
+
+# As consultas AJAX do formulário e os downloads são views assíncronas: sob
+# ASGI (pweb/asgi.py) esperam o banco e o disco sem ocupar uma thread cada.
+
+async def get_cnpj_unidade(request):
     unidade_id = request.GET.get('unidade_id')
     try:
-        unidade = Unidade.objects.get(id=unidade_id)
+        unidade = await Unidade.objects.aget(id=unidade_id)
         data = {'cnpj': unidade.cnpj, 'abreviacao': unidade.abreviacao, 'razao_social': unidade.razao_social}
     except (Unidade.DoesNotExist, ValueError):
         data = {'cnpj': '', 'abreviacao': '', 'razao_social': ''}
     return JsonResponse(data)
 
-def get_dados_solicitante(request):
+async def get_dados_solicitante(request):
     solicitante_id = request.GET.get('solicitante_id')
     try:
-        solicitante = Solicitante.objects.get(id=solicitante_id)
+        solicitante = await Solicitante.objects.aget(id=solicitante_id)
         data = {'telefone': solicitante.telefone if solicitante.telefone else 'Não cadastrado'}
     except (Solicitante.DoesNotExist, ValueError):
         data = {'telefone': ''}
     return JsonResponse(data)
 
-class ListaPendenciasView(ListView):
+def get_referencias(request):
+    """
+    Unidades, solicitantes e centros de custo num único JSON versionado, para o
+    formulário fazer as consultas no navegador. Responde 304 se o ETag não mudou.
+    """
+    versao = referencias.versao_atual()
+    etag = referencias.etag(versao)
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        versao, conteudo = referencias.obter(versao)
+        response = HttpResponse(conteudo, content_type='application/json')
+    response['ETag'] = etag
+    response['X-Referencias-Versao'] = str(versao)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def busca_ordem_compra_nf(request):
+    """
+    Autocomplete do campo OC no lançamento de NF: OCs aprovadas e sem NF cujo
+    número ou fornecedor contém o termo (sem diferenciar maiúsculas), cujo id é
+    o termo ou que o índice de busca encontra pelo termo (sem acentos).
+    Responde no formato esperado por autoComplete() (static/js/funcoes.js).
+    """
+    termo = request.GET.get('q', '').strip()
+    pagina = _pagina(request)
+    tamanho = 15
+    if not termo:
+        return JsonResponse([], safe=False)
+    # UPPER(coluna) LIKE '%TERMO%': índices de trigramas no PostgreSQL (migração 0013)
+    filtro = Q(numero_os__icontains=termo) | Q(fornecedor__icontains=termo)
+    # "eletrica" acha "Elétrica": o índice textual guarda o texto sem acentos
+    indice = filtro_indice(termo)
+    if indice:
+        filtro |= indice
+    if termo.isdigit():
+        filtro |= Q(pk=int(termo))
+    ordens = (OrdemCompra.objects.filter(status='APROVADO', nota_fiscal__isnull=True)
+              .filter(filtro)
+              .order_by('numero_os', 'id')
+              .values('id', 'numero_os', 'fornecedor')[(pagina - 1) * tamanho:pagina * tamanho])
+    data = [{'id': oc['id'], 'nome': f"OS {oc['numero_os']} - {oc['fornecedor']}"} for oc in ordens]
+    return JsonResponse(data, safe=False)
+
+class ListaPendenciasView(CachePaginaMixin, PaginacaoCursorMixin, ListView):
     model = OrdemCompra
     template_name = 'home/lista_pendencias.html'
     context_object_name = 'solicitacoes'
+    campo_cursor = 'data_criacao'
+    cache_pagina = 'lista_pendencias'
+    cache_dependencias = (chave_status('SOLICITADO'), CHAVE_REFERENCIAS)
     def get_queryset(self):
-        return OrdemCompra.objects.select_related('unidade', 'solicitante').filter(status='SOLICITADO').order_by('-data_criacao')
+        self.queryset = OrdemCompra.objects.select_related('unidade', 'solicitante').filter(status='SOLICITADO')
+        return super().get_queryset()
 
-class DetalheAprovacaoView(DetailView):
+class DetalheAprovacaoView(CachePaginaMixin, DetailView):
     model = OrdemCompra
     template_name = 'home/detalhe_aprovacao.html'
     context_object_name = 'oc'
+    cache_pagina = 'detalhe_aprovacao'
+    cache_dependencias = (CHAVE_REFERENCIAS,)
+    def ponteiro_cache(self):
+        # A página depende só do contador do status atual da OC
+        return Ponteiro(f"pagina:status_oc:{self.kwargs['pk']}",
+                        [chave_status(s) for s, _ in OrdemCompra.STATUS_PEDIDO],
+                        lambda: chave_status(self.object.status))
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Linha do tempo: varredura pelo índice (ordem_compra, momento)
+        context['historico'] = self.object.historico.select_related('usuario').order_by('momento', 'id')
+        return context
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
         acao = request.POST.get('acao')
         motivo = request.POST.get('motivo_reprovacao')
-        if self.object.status != 'SOLICITADO':
+        try:
+            if acao == 'aprovar':
+                with transaction.atomic():
+                    transicoes.aprovar(self.object, request.user)
+                    # O PDF é gerado pelo worker (processar_pdfs), fora da requisição
+                    enfileirar_pdf(self.object)
+                messages.success(request, 'Ordem aprovada! O PDF está sendo gerado.')
+                return redirect('detalhe_aprovacao', pk=self.object.pk)
+            elif acao == 'reprovar':
+                transicoes.reprovar(self.object, motivo, request.user)
+                return redirect('lista_pendencias')
+        except transicoes.ConflitoTransicao:
             messages.error(request, 'Processado anteriormente.')
             return redirect('lista_pendencias')
-        if acao == 'aprovar':
-            self.object.status = 'APROVADO'
-            self.object.aprovado_por = request.user
-            self.object.data_aprovacao = timezone.now()
-            self.object.save()
-            pdf, fname = gerar_pdf_ordem_compra(self.object)
-            if pdf:
-                response = HttpResponse(pdf, content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{fname}"'
-                return response
-            return redirect('lista_pendencias')
-        elif acao == 'reprovar':
-            self.object.status = 'REPROVADO'
-            self.object.motivo_reprovacao = motivo
-            self.object.save()
-            return redirect('lista_pendencias')
         return redirect('lista_pendencias')
 
-class VisualizarPdfView(DetailView):
-    model = OrdemCompra
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        pdf, fname = gerar_pdf_ordem_compra(self.object)
+class VisualizarPdfView(View):
+    async def get(self, request, pk):
+        # O WeasyPrint roda no executor limitado (utils.executor_pdf), fora do event loop
+        try:
+            pdf, fname = await agerar_pdf_ordem_compra(pk)
+        except OrdemCompra.DoesNotExist:
+            raise Http404("Ordem de Compra não encontrada.")
         if pdf:
             response = HttpResponse(pdf, content_type='application/pdf')
             response['Content-Disposition'] = f'inline; filename="{fname}"'
             return response
         return HttpResponse("Erro PDF")
 
+class AcaoEmLoteView(LoginRequiredMixin, View):
+    """Aprova ou reprova de uma vez as OCs 'SOLICITADO' marcadas na lista de pendências."""
+    def post(self, request, *args, **kwargs):
+        acao = request.POST.get('acao')
+        motivo = request.POST.get('motivo_reprovacao')
+        ids = [i for i in request.POST.getlist('selecionadas') if i.isdigit()]
+        if not ids or acao not in ('aprovar', 'reprovar'):
+            messages.error(request, 'Selecione ao menos uma solicitação.')
+            return redirect('lista_pendencias')
+        if acao == 'reprovar' and not motivo:
+            messages.error(request, 'Informe o motivo da reprovação em lote.')
+            return redirect('lista_pendencias')
+
+        lote = uuid.uuid4()
+        with transaction.atomic():
+            # Um UPDATE condicional: OCs que já saíram de SOLICITADO ficam de fora
+            if acao == 'aprovar':
+                movidos = transicoes.transicionar_em_lote(
+                    ids, 'APROVADO', request.user, aprovado_por=request.user,
+                    data_aprovacao=timezone.now(), motivo_reprovacao=None)
+                enfileirar_lote(movidos, lote)
+            else:
+                movidos = transicoes.transicionar_em_lote(
+                    ids, 'REPROVADO', request.user, motivo, motivo_reprovacao=motivo)
+        total = len(movidos)
+
+        ignoradas = len(ids) - total
+        if ignoradas:
+            messages.warning(request, f'{ignoradas} solicitação(ões) já tinham sido processadas e foram ignoradas.')
+        if not total:
+            return redirect('lista_pendencias')
+        if acao == 'aprovar':
+            messages.success(request, f'{total} ordem(ns) aprovada(s). Os PDFs estão sendo gerados.')
+            return redirect('lote_aprovacao', lote=lote)
+        messages.success(request, f'{total} solicitação(ões) reprovada(s).')
+        return redirect('lista_pendencias')
+
+def _tarefas_do_lote(request, lote):
+    """Tarefas do lote para quem o aprovou (aprovado_por das OCs) ou para a equipe do admin; 404 para os demais."""
+    tarefas = TarefaPdf.objects.filter(lote=lote)
+    if not request.user.is_staff:
+        tarefas = tarefas.filter(ordem_compra__aprovado_por=request.user)
+    if not tarefas.exists():
+        raise Http404("Lote não encontrado.")
+    return tarefas
+
+@login_required
+def lote_aprovacao(request, lote):
+    tarefas = _tarefas_do_lote(request, lote)
+    contagem = {status: 0 for status, _ in TarefaPdf.STATUS_TAREFA}
+    for status in tarefas.values_list('status', flat=True):
+        contagem[status] += 1
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'total': sum(contagem.values()), 'contagem': contagem})
+    return render(request, 'home/lote_aprovacao.html', {
+        'lote': lote, 'contagem': contagem, 'total': sum(contagem.values()),
+        'titulo_conteudo': "Aprovação em Lote",
+    })
+
+@login_required
+def baixar_lote_pdf(request, lote):
+    """Compacta em um único .zip os PDFs já gerados do lote."""
+    tarefas = (_tarefas_do_lote(request, lote).filter(status='CONCLUIDA')
+               .values_list('nome_arquivo', 'pdf'))
+    # Arquivo temporário em disco: o ZIP não precisa caber inteiro na memória
+    arquivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    with zipfile.ZipFile(arquivo, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for nome, pdf in tarefas.iterator(chunk_size=50):
+            zf.writestr(nome, bytes(pdf))
+    arquivo.seek(0)
+    return FileResponse(arquivo, content_type='application/zip', as_attachment=True,
+                        filename=f"ordens_aprovadas_{str(lote)[:8]}.zip")
+
+@login_required
+def baixar_pacote_pdf(request):
+    """
+    ZIP com os PDFs das OCs do período/unidade/status (padrão: aprovadas e
+    concluídas) e um manifesto.csv, transmitido enquanto os PDFs são gerados.
+    """
+    try:
+        ids = pacote_pdf.ids_pacote(request.GET.get('inicio'), request.GET.get('fim'),
+                                    request.GET.get('unidade'), request.GET.get('status'))
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+    if not ids:
+        return HttpResponse("Nenhuma Ordem de Compra encontrada para os filtros informados.", status=404)
+    # No executor de PDFs compartilhado ('spawn' ou threads): nunca um fork do servidor na requisição
+    response = StreamingHttpResponse(pacote_pdf.gerar_zip(ids, executor=executor_pdf()),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="ordens_compra_{timezone.now():%Y%m%d_%H%M}.zip"'
+    return response
+
+def status_pdf_ordem_compra(request, pk):
+    tarefa = ultima_tarefa(pk)
+    if not tarefa:
+        return JsonResponse({'status': None})
+    data = {
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'tentativas': tarefa.tentativas,
+        'erro': tarefa.erro,
+        'url_download': reverse('baixar_pdf', args=[pk]) if tarefa.status == 'CONCLUIDA' else None,
+    }
+    return JsonResponse(data)
+
+async def _exigir_login(request):
+    """login_required para views async (o decorator só aceita views async a partir do Django 5.1)."""
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    return None
+
+async def baixar_pdf_ordem_compra(request, pk):
+    if negado := await _exigir_login(request):
+        return negado
+    # O PDF (BinaryField) só é lido se os bytes forem mesmo enviados
+    tarefa = await (TarefaPdf.objects.filter(ordem_compra_id=pk, status='CONCLUIDA')
+                    .defer('pdf').order_by('-concluido_em').afirst())
+    if not tarefa:
+        messages.warning(request, 'O PDF desta ordem ainda não está pronto.')
+        return redirect('detalhe_aprovacao', pk=pk)
+    # Uma tarefa concluída nunca muda: id + conclusão identificam os bytes
+    etag = f'"pdf-{tarefa.pk}-{tarefa.concluido_em:%Y%m%d%H%M%S%f}"'
+    abrir = lambda: io.BytesIO(bytes(TarefaPdf.objects.values_list('pdf', flat=True).get(pk=tarefa.pk)))
+    return responder_arquivo(request, abrir, tarefa.tamanho_bytes or 0, etag, tarefa.nome_arquivo,
+                             'application/pdf', anexo=True)
+
+async def baixar_anexo_orcamento(request, pk):
+    if negado := await _exigir_login(request):
+        return negado
+    oc = await aget_object_or_404(OrdemCompra.objects.only('id', 'numero_os', 'anexo_orcamento'), pk=pk)
+    extensao = os.path.splitext(oc.anexo_orcamento.name)[1]
+    return await aresponder_campo_arquivo(request, oc.anexo_orcamento, f"Orcamento_OS_{oc.numero_os}{extensao}")
+
+async def baixar_arquivo_nf(request, pk):
+    if negado := await _exigir_login(request):
+        return negado
+    nf = await aget_object_or_404(NotaFiscal.objects.only('id', 'numero_nf', 'arquivo_nf'), pk=pk)
+    extensao = os.path.splitext(nf.arquivo_nf.name)[1]
+    return await aresponder_campo_arquivo(request, nf.arquivo_nf, f"NF_{nf.numero_nf}{extensao}")
+
+# --- BUSCA ---
+
+def _pagina(request):
+    try:
+        return max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        return 1
+
+@leitura_relatorio
+def busca(request):
+    q = request.GET.get('q', '').strip()
+    pagina = _pagina(request)
+    resultados, tem_proxima = buscar(q, pagina) if q else ([], False)
+    return render(request, 'home/busca.html', {
+        'q': q, 'resultados': resultados, 'pagina': pagina, 'tem_proxima': tem_proxima,
+    })
+
+@leitura_relatorio
+def ajax_busca(request):
+    pagina = _pagina(request)
+    resultados, tem_proxima = buscar(request.GET.get('q', ''), pagina)
+    data = {
+        'pagina': pagina,
+        'tem_proxima': tem_proxima,
+        'resultados': [{
+            'id': oc.id,
+            'numero_os': oc.numero_os,
+            'fornecedor': oc.fornecedor,
+            'unidade': oc.unidade.abreviacao,
+            'status': oc.get_status_display(),
+            'valor_estimado': str(oc.valor_estimado),
+            'numero_nf': getattr(getattr(oc, 'nota_fiscal', None), 'numero_nf', None),
+            'url': reverse('detalhe_aprovacao', args=[oc.id]),
+        } for oc in resultados],
+    }
+    return JsonResponse(data)
+
 # --- MÓDULO FINANCEIRO ---
 
-class NotaFiscalListView(ListView):
+class NotaFiscalListView(RelatorioMixin, CachePaginaMixin, PaginacaoCursorMixin, ListView):
     model = NotaFiscal
     template_name = 'home/lista_notasfiscais.html'
     context_object_name = 'notas'
-    ordering = ['-data_lancamento']
+    campo_cursor = 'data_lancamento'
+    cache_pagina = 'lista_notasfiscais'
+    # Cada linha mostra dados da OC, que já está CONCLUIDO
+    cache_dependencias = (CHAVE_NF, chave_status('CONCLUIDO'))
+    # O template lê a OC e o responsável de cada linha: traz tudo no mesmo JOIN
+    queryset = NotaFiscal.objects.select_related('ordem_compra', 'responsavel_lancamento')
 
 # NOVA VIEW AJAX: Busca detalhes da OC para o formulário de NF
-def get_detalhes_ordem_compra(request):
+async def get_detalhes_ordem_compra(request):
     oc_id = request.GET.get('oc_id')
     try:
-        oc = OrdemCompra.objects.get(id=oc_id)
+        oc = await OrdemCompra.objects.select_related('solicitante', 'unidade', 'centro_custo').aget(id=oc_id)
         
         # Lógica do Mês (Month(Data OS))
         meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 
@@ -127,7 +446,7 @@ def get_detalhes_ordem_compra(request):
             'descricao': oc.descricao_servico,
             'valor_estimado': str(oc.valor_estimado)
         }
-    except OrdemCompra.DoesNotExist:
+    except (OrdemCompra.DoesNotExist, ValueError):
         data = {'success': False}
     
     return JsonResponse(data)
@@ -148,4 +467,167 @@ class NotaFiscalCreateView(CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['titulo_conteudo'] = "Lançamento de Nota Fiscal"
-        return context
\ No newline at end of file
+        return context
+
+# --- EXPORTAÇÃO (CONCILIAÇÃO FINANCEIRA) ---
+
+@leitura_relatorio
+def exportar_conciliacao(request):
+    """
+    Extrato OC + NF filtrado por período (inicio/fim sobre data_os), unidade e status.
+    CSV é transmitido linha a linha; XLSX é montado em arquivo temporário.
+    """
+    try:
+        consulta = consulta_exportacao(
+            inicio=request.GET.get('inicio'), fim=request.GET.get('fim'),
+            unidade=request.GET.get('unidade'), status=request.GET.get('status'),
+        )
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    nome = f"conciliacao_{timezone.now():%Y%m%d_%H%M}"
+    if request.GET.get('formato') == 'xlsx':
+        arquivo = tempfile.TemporaryFile()
+        try:
+            gravar_xlsx(consulta, arquivo)
+        except ImportError:
+            return HttpResponse("Exportação XLSX indisponível (openpyxl não instalado). Use formato=csv.", status=501)
+        arquivo.seek(0)
+        return FileResponse(arquivo, as_attachment=True, filename=f"{nome}.xlsx",
+                            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    response = StreamingHttpResponse(linhas_csv(consulta), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome}.csv"'
+    return response
+
+# --- IMPORTAÇÃO EM MASSA ---
+
+def importacao(request):
+    resultado = None
+    form = ImportacaoForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        arquivo = form.cleaned_data['arquivo']
+        try:
+            # Lê direto do arquivo enviado (em disco se for grande), linha a linha
+            if form.cleaned_data['tipo'] == 'ordens':
+                resultado = importar_ordens(arquivo.file, arquivo.name)
+            else:
+                usuario = request.user if request.user.is_authenticated else None
+                resultado = importar_notas(arquivo.file, arquivo.name, usuario=usuario)
+        except ErroLinha as e:
+            messages.error(request, str(e))
+        else:
+            if resultado['importadas']:
+                messages.success(request, f"{resultado['importadas']} registro(s) importado(s).")
+            if resultado['erros']:
+                messages.warning(request, f"{len(resultado['erros'])} linha(s) com erro não foram importadas.")
+    return render(request, 'home/importacao.html', {
+        'form': form, 'resultado': resultado, 'titulo_conteudo': "Importação em Massa",
+    })
+
+# --- RELATÓRIO ORÇADO x REALIZADO ---
+
+# Ordem do drill-down: cada nível agrupa pela próxima dimensão ainda não filtrada
+NIVEIS_CUBO = [
+    ('centro_custo', 'Centro de Custo', ['centro_custo_id', 'centro_custo__codigo', 'centro_custo__descricao']),
+    ('unidade', 'Unidade', ['unidade_id', 'unidade__abreviacao', 'unidade__nome']),
+    ('conta', 'Conta Contábil', ['conta_contabil']),
+    ('mes', 'Mês de Competência', ['mes']),
+]
+
+def _mes_filtro(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m').date() if valor else None
+    except ValueError:
+        return None
+
+@leitura_relatorio
+def relatorio_orcamento(request):
+    """
+    Orçado (valor estimado das OCs) x realizado (NFs) com drill-down
+    centro de custo -> unidade -> conta -> mês. Lê só o CuboOrcamento;
+    o cubo é atualizado pelo comando atualizar_cubo_orcamento.
+    """
+    filtros = {}
+    inicio, fim = _mes_filtro(request.GET.get('inicio')), _mes_filtro(request.GET.get('fim'))
+    if inicio:
+        filtros['mes__gte'] = inicio
+    if fim:
+        filtros['mes__lte'] = fim
+    classificacao = request.GET.get('classificacao')
+    if classificacao in ('CAPEX', 'OPEX'):
+        filtros['classificacao'] = classificacao
+
+    # Dimensões já escolhidas no drill-down
+    escolhidos, trilha = {}, []
+    for parametro, titulo, campos in NIVEIS_CUBO[:-1]:
+        valor = request.GET.get(parametro)
+        if not valor or (parametro != 'conta' and not valor.isdigit()):
+            break
+        escolhidos[parametro] = valor
+        filtros['conta_contabil' if parametro == 'conta' else f'{parametro}_id'] = valor
+        trilha.append((titulo, _rotulo_dimensao(parametro, valor)))
+    nivel = len(escolhidos)
+    parametro, titulo, campos = NIVEIS_CUBO[nivel]
+
+    celulas = CuboOrcamento.objects.filter(**filtros)
+    linhas = list(celulas.values(*campos)
+                  .annotate(quantidade=Sum('quantidade'), quantidade_nf=Sum('quantidade_nf'),
+                            estimado=Sum('valor_estimado'), realizado=Sum('valor_realizado'))
+                  .order_by(*campos))
+    contas = dict(OrdemCompra.CONTA_CONTABIL_CHOICES)
+    total = {'quantidade': 0, 'quantidade_nf': 0, 'estimado': 0, 'realizado': 0}
+    for linha in linhas:
+        if parametro == 'centro_custo':
+            linha['valor'], linha['rotulo'] = linha['centro_custo_id'], f"{linha['centro_custo__codigo']} - {linha['centro_custo__descricao']}"
+        elif parametro == 'unidade':
+            linha['valor'], linha['rotulo'] = linha['unidade_id'], f"{linha['unidade__abreviacao']} - {linha['unidade__nome']}"
+        elif parametro == 'conta':
+            linha['valor'], linha['rotulo'] = linha['conta_contabil'], contas.get(linha['conta_contabil'], linha['conta_contabil'])
+        else:
+            linha['valor'], linha['rotulo'] = None, linha['mes'].strftime('%m/%Y')
+        linha['diferenca'] = linha['estimado'] - linha['realizado']
+        linha['execucao'] = round(100 * linha['realizado'] / linha['estimado'], 1) if linha['estimado'] else None
+        if linha['valor'] is not None:
+            parametros = request.GET.copy()
+            parametros[parametro] = linha['valor']
+            linha['url'] = '?' + parametros.urlencode()
+        for chave in total:
+            total[chave] += linha[chave]
+    total['diferenca'] = total['estimado'] - total['realizado']
+
+    # Links da trilha: cada nível mantém só os filtros até ele
+    migalhas = [{'titulo': 'Todos', 'url': '?' + _sem_parametros(request.GET, [p for p, _, _ in NIVEIS_CUBO]).urlencode()}]
+    for i, (titulo_nivel, rotulo) in enumerate(trilha):
+        restantes = [p for p, _, _ in NIVEIS_CUBO[i + 1:]]
+        migalhas.append({'titulo': f"{titulo_nivel}: {rotulo}", 'url': '?' + _sem_parametros(request.GET, restantes).urlencode()})
+
+    return render(request, 'home/relatorio_orcamento.html', {
+        'linhas': linhas, 'total': total, 'titulo_nivel': titulo, 'migalhas': migalhas,
+        'filtros': request.GET, 'atualizado_em': MarcaIncremental.objects.filter(
+            chave=CuboOrcamento.CHAVE_MARCA).values_list('momento', flat=True).first(),
+        'titulo_conteudo': "Orçado x Realizado",
+    })
+
+def _rotulo_dimensao(parametro, valor):
+    if parametro == 'centro_custo':
+        return CentroCusto.objects.filter(pk=valor).values_list('codigo', flat=True).first() or valor
+    if parametro == 'unidade':
+        return Unidade.objects.filter(pk=valor).values_list('abreviacao', flat=True).first() or valor
+    return dict(OrdemCompra.CONTA_CONTABIL_CHOICES).get(valor, valor)
+
+def _sem_parametros(query, nomes):
+    copia = query.copy()
+    for nome in nomes:
+        copia.pop(nome, None)
+    return copia
+
+def metricas(request):
+    """Texto do Prometheus com as métricas deste processo (home/metricas.py)."""
+    token = settings.METRICAS_TOKEN
+    autorizado = (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')) \
+        or request.user.is_staff
+    if not autorizado:
+        return HttpResponse(status=401 if token else 403)
+    return HttpResponse(metricas_desempenho.texto_prometheus(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
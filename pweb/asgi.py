@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pweb.settings')
+# Sem o WhiteNoise (só síncrono) na cadeia de middlewares: ver pweb/settings.py
+os.environ.setdefault('SERVIDOR_ASGI', '1')
 
 application = get_asgi_application()
@@ -5,7 +5,6 @@ Arquivo configurado para Deploy na Vercel com PostgreSQL.
 
 from pathlib import Path
 import os
-import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,8 +31,19 @@ INSTALLED_APPS = [
     'home', # Seu app principal
 ]
 
+# Inicialização a frio mais curta (home/inicializacao.py): admin montado só no
+# primeiro acesso a /admin/ e WeasyPrint carregado depois da primeira resposta.
+# Ligado por padrão na Vercel, onde cada instância nova paga a inicialização.
+INICIALIZACAO_RAPIDA = os.environ.get('INICIALIZACAO_RAPIDA', '1' if 'VERCEL' in os.environ else '0') == '1'
+if INICIALIZACAO_RAPIDA:
+    INSTALLED_APPS[INSTALLED_APPS.index('django.contrib.admin')] = 'django.contrib.admin.apps.SimpleAdminConfig'
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Estáticos pré-comprimidos (home/estaticos.py): respondidos antes de tudo o mais
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'home.metricas.MetricasMiddleware',  # antes dos demais: mede também sessão, CSRF etc.
+    'home.roteador.ReplicaMiddleware',  # réplica de leitura: antes de qualquer consulta da requisição
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +81,7 @@ postgres_url = os.environ.get("POSTGRES_URL")
 
 if postgres_url:
     # CONFIGURAÇÃO DE PRODUÇÃO (VERCEL)
+    import dj_database_url
     DATABASES = {
         'default': dj_database_url.parse(
             postgres_url,
@@ -88,6 +99,55 @@ else:
         }
     }
 
+# Réplica de leitura para relatórios (home/roteador.py). Sem POSTGRES_REPLICA_URL
+# o alias aponta para o próprio banco principal; nos testes vira um segundo
+# banco (SQLite em memória, ou test_replica no Postgres)
+postgres_replica_url = os.environ.get("POSTGRES_REPLICA_URL")
+if postgres_replica_url:
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(
+        postgres_replica_url,
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=True,
+    )
+else:
+    DATABASES['replica'] = dict(DATABASES['default'], TEST={'NAME': 'test_replica'} if postgres_url else {})
+
+# Pool de conexões no processo (home/banco/pool.py). Os backends de home.banco
+# são os do Django mais o pool, que só entra com a chave POOL. Com ele o
+# Django fecha a conexão no fim de cada requisição (CONN_MAX_AGE=0) e o close
+# a devolve ao pool; a verificação na retirada substitui CONN_HEALTH_CHECKS.
+BANCO_POOL = os.environ.get('BANCO_POOL', '1' if postgres_url else '0') == '1'
+for banco in DATABASES.values():
+    banco['ENGINE'] = {
+        'django.db.backends.postgresql': 'home.banco.postgresql',
+        'django.db.backends.sqlite3': 'home.banco.sqlite3',
+    }.get(banco['ENGINE'], banco['ENGINE'])
+    if BANCO_POOL:
+        banco.update({
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False,
+            'POOL': {
+                'MIN': int(os.environ.get('BANCO_POOL_MIN', 1)),
+                'MAX': int(os.environ.get('BANCO_POOL_MAX', 5)),
+                'TIMEOUT': float(os.environ.get('BANCO_POOL_TIMEOUT', 10)),
+                'MAX_VIDA': float(os.environ.get('BANCO_POOL_MAX_VIDA', 600)),
+                'OCIOSA': float(os.environ.get('BANCO_POOL_OCIOSA', 300)),
+                'VERIFICAR': os.environ.get('BANCO_POOL_VERIFICAR', '1') == '1',
+            },
+        })
+
+# Dashboard, lista de NFs, exportações, busca e relatório de orçamento leem da
+# réplica; o resto fica no primário. Depois de um POST o navegador lê do
+# primário por BANCO_REPLICA_GRUDE_S; réplica atrasada mais que
+# BANCO_REPLICA_ATRASO_MAX_S (medido a cada BANCO_REPLICA_VERIFICAR_S) ou fora do ar também.
+DATABASE_ROUTERS = ['home.roteador.RoteadorReplica']
+BANCO_REPLICA_ATIVA = os.environ.get('BANCO_REPLICA_ATIVA', '1' if postgres_replica_url else '0') == '1'
+BANCO_REPLICA_GRUDE_S = int(os.environ.get('BANCO_REPLICA_GRUDE_S', 10))
+BANCO_REPLICA_ATRASO_MAX_S = float(os.environ.get('BANCO_REPLICA_ATRASO_MAX_S', 5))
+BANCO_REPLICA_VERIFICAR_S = float(os.environ.get('BANCO_REPLICA_VERIFICAR_S', 5))
+
 
 # --- VALIDAÇÃO DE SENHA ---
 
@@ -126,13 +186,119 @@ STATICFILES_DIRS = [
 # Por isso, salvamos dentro de 'staticfiles_build/static'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles_build', 'static')
 
+# 4. Pacotes minificados (css/app.css, js/app.js) montados por home.estaticos.PacotesFinder
+ESTATICOS_PACOTES_DIR = os.path.join(BASE_DIR, 'staticfiles_pacotes')
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'home.estaticos.PacotesFinder',
+]
+# As cópias sem hash também vão para o deploy: na Vercel o staticfiles.json é
+# gerado no build estático e não entra no pacote do lambda, e sem ele o
+# {% static %} aponta para o nome sem hash (ver ArmazenamentoEstaticos.stored_name)
+WHITENOISE_KEEP_ONLY_HASHED_FILES = False
+# Sem o manifesto (testes, antes do collectstatic, lambda da Vercel) usa o nome sem hash
+WHITENOISE_MANIFEST_STRICT = os.environ.get('WHITENOISE_MANIFEST_STRICT') == '1'
+
 # --- ARQUIVOS DE MÍDIA (UPLOADS) ---
 # Nota: Na Vercel, arquivos de mídia (uploads) são temporários e somem após um tempo.
 # Para produção real, seria necessário usar AWS S3 ou similar.
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# --- CACHE DE PDFs (Ordens de Compra) ---
+# Na Vercel só /tmp é gravável; o cache sobrevive enquanto a lambda estiver quente.
+PDF_CACHE_DIR = os.environ.get(
+    'PDF_CACHE_DIR',
+    '/tmp/cache_pdf' if 'VERCEL' in os.environ else os.path.join(BASE_DIR, 'cache_pdf'),
+)
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Geração de PDF a partir das views async (home/utils.py:executor_pdf): 'threads'
+# (padrão, funciona na Vercel) ou 'processos', que tira o WeasyPrint do GIL do
+# servidor ao custo de um processo filho com a própria conexão ao banco
+PDF_EXECUTOR = os.environ.get('PDF_EXECUTOR', 'threads')
+PDF_EXECUTOR_LIMITE = int(os.environ.get('PDF_EXECUTOR_LIMITE', 2))
+# Pacote de PDFs (home/pacote_pdf.py): sem nenhum PDF pronto nesse tempo, as OCs
+# restantes saem como erro no manifesto em vez de o download ficar parado
+PDF_PACOTE_TEMPO_LIMITE_S = int(os.environ.get('PDF_PACOTE_TEMPO_LIMITE_S', 120))
+
+
+# --- ARMAZENAMENTO DE UPLOADS (orçamentos e NFs) ---
+# Deduplicado por SHA-256 (home/armazenamento.py). Em produção, aponte para o S3:
+# ARMAZENAMENTO_BACKEND=home.armazenamento_s3.ArmazenamentoS3Deduplicado (requer django-storages[s3])
+ARMAZENAMENTO_BACKEND = os.environ.get('ARMAZENAMENTO_BACKEND', 'home.armazenamento.ArmazenamentoLocalDeduplicado')
+ARMAZENAMENTO_OPCOES = {}
+if ARMAZENAMENTO_BACKEND.endswith('S3Deduplicado'):
+    ARMAZENAMENTO_OPCOES = {
+        'bucket_name': os.environ.get('ARMAZENAMENTO_S3_BUCKET', 'gestao-adm'),
+        'endpoint_url': os.environ.get('ARMAZENAMENTO_S3_ENDPOINT') or None,  # MinIO/LocalStack
+        'region_name': os.environ.get('ARMAZENAMENTO_S3_REGIAO') or None,
+        'querystring_expire': 300,
+    }
+STORAGES = {
+    'default': {'BACKEND': ARMAZENAMENTO_BACKEND, 'OPTIONS': ARMAZENAMENTO_OPCOES},
+    # Nome com hash do conteúdo + manifesto + .br/.gz (home/estaticos.py)
+    'staticfiles': {'BACKEND': 'home.estaticos.ArmazenamentoEstaticos'},
+}
+
+# Downloads de anexos (home/downloads.py): 'python' transmite pelo Django;
+# 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache) entregam pelo proxy.
+DOWNLOAD_MODO = os.environ.get('DOWNLOAD_MODO', 'python')
+# No nginx: location /protegido/ { internal; alias <MEDIA_ROOT>/; }
+DOWNLOAD_ACCEL_PREFIXO = os.environ.get('DOWNLOAD_ACCEL_PREFIXO', '/protegido/')
+
+
+# --- CACHE (páginas renderizadas: home/cache_paginas.py) ---
+# 'memoria' (padrão, por processo), 'arquivo' (compartilhado entre processos da
+# mesma máquina; na Vercel fica em /tmp) ou 'redis' (compartilhado entre instâncias).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')
+CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', 600))
+if CACHE_BACKEND == 'redis':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',  # requer o pacote redis
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'TIMEOUT': CACHE_TIMEOUT,
+    }}
+elif CACHE_BACKEND == 'arquivo':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/cache_paginas' if 'VERCEL' in os.environ
+                                   else os.path.join(BASE_DIR, 'cache_paginas')),
+        'TIMEOUT': CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    }}
+CACHE_PAGINAS = 'default'
+CACHE_PAGINAS_ATIVO = os.environ.get('CACHE_PAGINAS_ATIVO', '1') == '1'
+
+
+# --- MÉTRICAS DE DESEMPENHO (home/metricas.py) ---
+METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', '1') == '1'
+# Requisições acima deste tempo vão para o log com as consultas mais demoradas
+METRICAS_LIMITE_LENTO_MS = int(os.environ.get('METRICAS_LIMITE_LENTO_MS', 1000))
+# Se definido, /metrics aceita "Authorization: Bearer <token>" (Prometheus); senão só usuários staff
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+if not METRICAS_ATIVAS:
+    MIDDLEWARE.remove('home.metricas.MetricasMiddleware')
+
+
+# --- SERVIDOR ASGI (pweb/asgi.py: uvicorn pweb.asgi:application) ---
+# Consultas AJAX e downloads são views async. O WhiteNoise 6 só tem middleware
+# síncrono e obrigaria cada requisição a passar por uma thread: sob ASGI os
+# estáticos ficam com o CDN/proxy (ver home/estaticos.py).
+SERVIDOR_ASGI = os.environ.get('SERVIDOR_ASGI') == '1'
+if SERVIDOR_ASGI:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 
 # --- OUTROS ---
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Único login do sistema é o do admin
+LOGIN_URL = '/admin/login/'
@@ -14,10 +14,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
+if settings.INICIALIZACAO_RAPIDA:
+    # Mesmo formato de admin.site.urls, com as rotas montadas no primeiro acesso
+    from home.inicializacao import AdminSobDemanda
+    rotas_admin = (AdminSobDemanda(), 'admin', 'admin')
+else:
+    from django.contrib import admin
+    rotas_admin = admin.site.urls
+
 urlpatterns = [
     path('', include('home.urls')),
-    path('admin/', admin.site.urls),
+    path('admin/', rotas_admin),
 ]
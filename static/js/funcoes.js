@@ -25,6 +25,8 @@ function autoComplete(inputSelector) {
         },
         select: function(event, ui) {
             $(hiddenSelector).val(ui.item.id);  // Atualiza o campo hidden com o ID selecionado
+            // Dispara 'change' nativo para quem escuta o hidden via addEventListener
+            $(hiddenSelector).each(function() { this.dispatchEvent(new Event('change')); });
         }
     });
 }